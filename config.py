@@ -7,10 +7,27 @@ PLAYER_2_NAME = 'B'
 PLAYER_2_PATH = './python_skeleton'
 # GAME PROGRESS IS RECORDED HERE
 GAME_LOG_FILENAME = 'gamelog'
+# SET TO True TO RECORD EVERY MESSAGE EXCHANGED WITH EACH PLAYER IN <PLAYER_NAME>_transcript.txt
+RECORD_TRANSCRIPTS = False
+# SET TO True TO TIME EACH PHASE OF EVERY ROUND IN <GAME_LOG_FILENAME>_phases.csv
+PROFILE_ENGINE = False
+# SAVE <GAME_LOG_FILENAME>_checkpoint.json EVERY CHECKPOINT_ROUNDS ROUNDS, 0 TO DISABLE
+# A MATCH WITH A CHECKPOINT RESUMES FROM IT, WITH FRESHLY STARTED POKERBOTS
+CHECKPOINT_ROUNDS = 0
+# PORT TO SERVE LIVE MATCH METRICS ON AT http://localhost:<METRICS_PORT>/metrics, None TO DISABLE
+METRICS_PORT = None
 # PLAYER_LOG_SIZE_LIMIT IS IN BYTES
 PLAYER_LOG_SIZE_LIMIT = 524288
 # STARTING_GAME_CLOCK AND TIMEOUTS ARE IN SECONDS
 ENFORCE_GAME_CLOCK = True
+# GAME_CLOCK_MODE 'wall' CHARGES THE TIME EACH QUERY TAKES, 'cpu' THE CPU TIME THE POKERBOT'S PROCESS
+# TREE SPENDS ON IT, WHICH MATCHES RUNNING IN PARALLEL DO NOT INFLATE (LINUX ONLY, OTHERWISE WALL TIME)
+# THE KERNEL COUNTS CPU TIME IN CLOCK TICKS, USUALLY 10ms, SO A QUERY SHORTER THAN A TICK MAY BE
+# CHARGED 0 OR A WHOLE TICK; THE CHARGES EVEN OUT OVER A MATCH
+GAME_CLOCK_MODE = 'wall'
+# CPUS TO PIN EACH POKERBOT'S PROCESS TO, e.g. [2], OR None TO LEAVE IT UNPINNED (LINUX ONLY)
+PLAYER_1_CPUS = None
+PLAYER_2_CPUS = None
 STARTING_GAME_CLOCK = 30.
 BUILD_TIMEOUT = 10.
 CONNECT_TIMEOUT = 10.
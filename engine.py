@@ -10,9 +10,11 @@ import json
 import subprocess
 import socket
 import eval7
+from metrics import EngineMetrics, MetricsServer
 import sys
 import os
 import copy
+import random
 
 sys.path.append(os.getcwd())
 from config import *
@@ -215,20 +217,139 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'stacks', 'hands
         return state.proceed_street() if all(settled) else state
 
 
+class PhaseProfiler():
+    '''
+    Splits the engine's time into bot think time, protocol, state, validation and logging costs.
+    '''
+    PHASES = ['bot', 'protocol', 'validation', 'state', 'logging']
+
+    def __init__(self, filename):
+        self.round_times = dict.fromkeys(self.PHASES + ['query'], 0.)
+        self.match_times = dict.fromkeys(self.PHASES, 0.)
+        self.csv_file = open(filename, 'w')
+        self.csv_file.write(','.join(['round'] + self.PHASES) + '\n')
+
+    def lap(self, phase, since):
+        '''
+        Charges the time since a perf_counter reading to a phase and returns the current reading.
+        '''
+        now = time.perf_counter()
+        self.round_times[phase] += now - since
+        return now
+
+    def end_round(self, round_num, players, terminal_state):
+        '''
+        Round listener which writes the round's breakdown and adds it to the match totals.
+        '''
+        times = self.round_times
+        # whatever a query spends outside the socket exchange goes to parsing and validating the response
+        times['validation'] += times['query'] - times['bot'] - times['protocol']
+        self.csv_file.write(','.join([str(round_num)] + ['{:.6f}'.format(times[phase]) for phase in self.PHASES]) + '\n')
+        for phase in self.PHASES:
+            self.match_times[phase] += times[phase]
+        self.round_times = dict.fromkeys(self.PHASES + ['query'], 0.)
+        return False
+
+    def close(self):
+        '''
+        Writes the match totals, closes the breakdown file and returns a printable summary.
+        '''
+        self.csv_file.write(','.join(['total'] + ['{:.6f}'.format(self.match_times[phase]) for phase in self.PHASES]) + '\n')
+        self.csv_file.close()
+        total = sum(self.match_times.values())
+        return 'Engine time {:.3f}s: '.format(total) + ', '.join('{} {:.3f}s ({:.1f}%)'.format(
+            phase, self.match_times[phase], 100 * self.match_times[phase] / max(total, 1e-9)) for phase in self.PHASES)
+
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+# whether the kernel lists each thread's children in /proc/<pid>/task/<tid>/children
+PROC_CHILDREN = os.path.exists('/proc/self/task/{}/children'.format(os.getpid()))
+
+
+def read_stat(pid):
+    '''
+    Returns the fields of /proc/<pid>/stat after the command name, or None if the process is gone.
+    '''
+    try:
+        with open('/proc/{}/stat'.format(pid), 'rb') as stat_file:
+            return stat_file.read().rsplit(b')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+
+def process_cpu_time(pid):
+    '''
+    Returns the CPU seconds used by a process and all of its descendants, running or exited,
+    or None if the operating system does not report it in /proc.
+
+    A process's own stat only counts its children once it has waited for them, so a pokerbot
+    started through a wrapper such as bash run.sh would be charged next to nothing for the
+    process it runs. The whole live process tree is summed instead, read from the children
+    lists where the kernel has them and otherwise from the parent of every process in /proc.
+    '''
+    root = read_stat(pid)
+    if root is None:
+        return None
+    stats = {pid: root}
+    if PROC_CHILDREN:
+        pending = [pid]
+        while pending:
+            parent = pending.pop()
+            try:
+                tasks = os.listdir('/proc/{}/task'.format(parent))
+            except OSError:
+                continue
+            for task in tasks:
+                try:
+                    with open('/proc/{}/task/{}/children'.format(parent, task), 'rb') as children_file:
+                        children = [int(child) for child in children_file.read().split()]
+                except OSError:
+                    continue
+                for child in children:
+                    fields = read_stat(child)
+                    if fields is not None:
+                        stats[child] = fields
+                        pending.append(child)
+    else:
+        children = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit() and int(entry) != pid:
+                fields = read_stat(entry)
+                if fields is not None:
+                    children.setdefault(int(fields[1]), []).append((int(entry), fields))
+        pending = [pid]
+        while pending:
+            for child, fields in children.get(pending.pop(), []):
+                stats[child] = fields
+                pending.append(child)
+    # utime, stime, cutime, cstime
+    return sum(int(field) for fields in stats.values() for field in fields[11:15]) / CLOCK_TICKS
+
+
 class Player():
     '''
     Handles subprocess and socket interactions with one player's pokerbot.
     '''
 
-    def __init__(self, name, path):
+    def __init__(self, name, path, cpus=None):
         self.name = name
         self.path = path
+        self.cpus = cpus
         self.game_clock = STARTING_GAME_CLOCK
+        self.wall_time = 0.
+        self.cpu_time = None  # CPU seconds spent answering queries, when the game clock charges them
+        self.connect_time = None  # seconds from starting the pokerbot until it connected
+        self.opponent_name = None  # passed to the pokerbot in the POKERBOTS_OPPONENT environment variable
         self.bankroll = 0
         self.commands = None
         self.bot_subprocess = None
         self.socketfile = None
         self.bytes_queue = Queue()
+        self.transcript = None
+        self.phases = None
+        self.metrics = None
 
     def build(self):
         '''
@@ -275,10 +396,22 @@ class Player():
                     server_socket.settimeout(CONNECT_TIMEOUT)
                     server_socket.listen()
                     port = server_socket.getsockname()[1]
+                    pin = None
+                    if self.cpus is not None and hasattr(os, 'sched_setaffinity'):
+                        pin = lambda: os.sched_setaffinity(0, self.cpus)
+                    start_time = time.perf_counter()
+                    env = None
+                    if self.opponent_name is not None:
+                        env = dict(os.environ, POKERBOTS_OPPONENT=self.opponent_name)
                     proc = subprocess.Popen(self.commands['run'] + [str(port)],
                                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                            cwd=self.path)
+                                            cwd=self.path, preexec_fn=pin, env=env)
                     self.bot_subprocess = proc
+                    if GAME_CLOCK_MODE == 'cpu':
+                        if process_cpu_time(proc.pid) is None:
+                            print('CPU time is not available, charging', self.name, 'wall time')
+                        else:
+                            self.cpu_time = 0.
                     # function for bot listening
                     def enqueue_output(out, queue):
                         try:
@@ -290,11 +423,14 @@ class Player():
                     Thread(target=enqueue_output, args=(proc.stdout, self.bytes_queue), daemon=True).start()
                     # block until we timeout or the player connects
                     client_socket, _ = server_socket.accept()
+                    self.connect_time = time.perf_counter() - start_time
                     with client_socket:
                         client_socket.settimeout(CONNECT_TIMEOUT)
                         sock = client_socket.makefile('rw')
                         self.socketfile = sock
-                        print(self.name, 'connected successfully')
+                        if RECORD_TRANSCRIPTS:
+                            self.transcript = open(self.name + '_transcript.txt', 'w')
+                        print(self.name, 'connected successfully in {:.3f}s'.format(self.connect_time))
             except (TypeError, ValueError):
                 print(self.name, 'run command misformatted')
             except OSError:
@@ -310,10 +446,15 @@ class Player():
             try:
                 self.socketfile.write('Q\n')
                 self.socketfile.close()
+                if self.transcript is not None:
+                    self.transcript.write('S Q\n')
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to disconnect')
             except OSError:
                 print('Could not close socket connection with', self.name)
+        if self.transcript is not None:
+            self.transcript.close()
+            self.transcript = None
         if self.bot_subprocess is not None:
             try:
                 outs, _ = self.bot_subprocess.communicate(timeout=CONNECT_TIMEOUT)
@@ -323,6 +464,9 @@ class Player():
                 self.bot_subprocess.kill()
                 outs, _ = self.bot_subprocess.communicate()
                 self.bytes_queue.put(outs)
+        if self.cpu_time is not None:
+            print('{} used {:.3f}s of CPU time and {:.3f}s of wall time answering queries'.format(
+                self.name, self.cpu_time, self.wall_time))
         with open(self.name + '.txt', 'wb') as log_file:
             bytes_written = 0
             for output in self.bytes_queue.queue:
@@ -340,17 +484,39 @@ class Player():
         '''
         if self.socketfile is not None and self.game_clock > 0.:
             clauses = ''
+            phases = self.phases
             try:
+                if phases is not None:
+                    phase_time = time.perf_counter()
                 player_message[0] = 'T{:.3f}'.format(self.game_clock)
                 message = ' '.join(player_message) + '\n'
                 del player_message[1:]  # do not send redundant action history
+                if self.cpu_time is not None:
+                    start_cpu = process_cpu_time(self.bot_subprocess.pid)
                 start_time = time.perf_counter()
                 self.socketfile.write(message)
                 self.socketfile.flush()
+                if phases is not None:
+                    phase_time = phases.lap('protocol', phase_time)
                 clauses = self.socketfile.readline().strip()
                 end_time = time.perf_counter()
+                if phases is not None:
+                    phase_time = phases.lap('bot', phase_time)
+                if self.transcript is not None:
+                    self.transcript.write('S ' + message + 'R ' + clauses + '\n')
+                    if phases is not None:
+                        phase_time = phases.lap('protocol', phase_time)
+                used = end_time - start_time
+                self.wall_time += used
+                if self.metrics is not None:
+                    self.metrics.decision(self.name, used)
+                if self.cpu_time is not None:
+                    end_cpu = process_cpu_time(self.bot_subprocess.pid)
+                    # a bot which exited has no /proc entry left, and is caught reading its socket
+                    used = end_cpu - start_cpu if end_cpu is not None and start_cpu is not None else 0.
+                    self.cpu_time += used
                 if ENFORCE_GAME_CLOCK:
-                    self.game_clock -= end_time - start_time
+                    self.game_clock -= used
                 if self.game_clock <= 0.:
                     raise socket.timeout
                 assert_flag = (';' in clauses)
@@ -365,6 +531,7 @@ class Player():
                         return actions
                     #else: (assigned cards not in hand or some cards unassigned)
                     game_log.append(self.name + ' attempted illegal assignment')
+                    self.count_error('illegal')
                 else:
                     total_raise = 0
                     for action in actions:
@@ -375,23 +542,28 @@ class Player():
                         return actions
                     #else: (attempted negative net raise or net raise larger than bankroll)
                     game_log.append(self.name + " attempted net illegal RaiseAction's")
+                    self.count_error('illegal')
             except socket.timeout:
                 error_message = self.name + ' ran out of time'
                 game_log.append(error_message)
+                self.count_error('timeout')
                 print(error_message)
                 self.game_clock = 0.
             except AssertionError:
                 error_message = self.name + ' did not submit ' + str(NUM_BOARDS) + ' actions'
                 game_log.append(error_message)
+                self.count_error('misformatted')
                 print(error_message)
                 self.game_clock = 0.
             except OSError:
                 error_message = self.name + ' disconnected'
                 game_log.append(error_message)
+                self.count_error('disconnected')
                 print(error_message)
                 self.game_clock = 0.
             except (IndexError, KeyError, ValueError):
                 game_log.append(self.name + ' response misformatted: ' + str(clauses))
+                self.count_error('misformatted')
         default_actions = round_state.legal_actions() if isinstance(round_state, RoundState) else [{CheckAction} for i in range(NUM_BOARDS)]
         return [CheckAction() if CheckAction in default else FoldAction() for default in default_actions]
 
@@ -414,8 +586,16 @@ class Player():
             else:
                 return action()
         game_log.append(self.name + ' attempted illegal ' + action.__name__)
+        self.count_error('illegal')
         return CheckAction() if CheckAction in legal_actions else FoldAction()
 
+    def count_error(self, kind):
+        '''
+        Counts an illegal action, timeout or other error in the live metrics, if they are served.
+        '''
+        if self.metrics is not None:
+            self.metrics.error(self.name, kind)
+
 
 class Game():
     '''
@@ -425,6 +605,73 @@ class Game():
     def __init__(self):
         self.log = ['6.176 MIT Pokerbots - ' + PLAYER_1_NAME + ' vs ' + PLAYER_2_NAME]
         self.player_messages = [[], []]
+        self.phases = PhaseProfiler(GAME_LOG_FILENAME + '_phases.csv') if PROFILE_ENGINE else None
+        # called as listener(round_num, players, terminal_state) after every round, with players in
+        # the round's seat order, and returning True ends the game early
+        self.round_listeners = []
+        if self.phases is not None:
+            self.round_listeners.append(self.phases.end_round)
+        self.metrics = None
+        self.metrics_server = None
+        if METRICS_PORT is not None:
+            self.metrics = EngineMetrics()
+            try:
+                self.metrics_server = MetricsServer(METRICS_PORT, self.metrics.collect)
+                self.round_listeners.append(self.metrics.end_round)
+            except OSError as e:
+                print('Could not serve metrics on port {}: {}'.format(METRICS_PORT, e))
+                self.metrics = None
+        self.checkpoint_filename = GAME_LOG_FILENAME + '_checkpoint.json'
+
+    def write_log(self, log_file):
+        '''
+        Appends the log lines accumulated since the last write to the game log.
+        '''
+        if self.log:
+            log_file.write(('\n' if log_file.tell() > 0 else '') + '\n'.join(self.log))
+            log_file.flush()
+            del self.log[:]
+
+    def save_checkpoint(self, round_num, players, log_file):
+        '''
+        Saves the state needed to resume the game after round_num, with players in the next round's seat order.
+        '''
+        self.write_log(log_file)
+        checkpoint = {
+            'round_num': round_num,
+            'seats': [player.name for player in players],
+            'bankrolls': [player.bankroll for player in players],
+            'game_clocks': [player.game_clock for player in players],
+            'random_state': random.getstate(),
+            'log_size': log_file.tell()
+        }
+        with open(self.checkpoint_filename + '.tmp', 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(self.checkpoint_filename + '.tmp', self.checkpoint_filename)
+
+    def load_checkpoint(self, players):
+        '''
+        Restores the state saved by save_checkpoint, if any.
+
+        Returns:
+        The players in the saved seat order and the number of the round to resume from.
+        '''
+        try:
+            with open(self.checkpoint_filename, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return players, 1
+        by_name = {player.name: player for player in players}
+        players = [by_name[name] for name in checkpoint['seats']]
+        for player, bankroll, game_clock in zip(players, checkpoint['bankrolls'], checkpoint['game_clocks']):
+            player.bankroll = bankroll
+            player.game_clock = game_clock
+        version, state, gauss = checkpoint['random_state']
+        random.setstate((version, tuple(state), gauss))
+        os.truncate(GAME_LOG_FILENAME + '.txt', checkpoint['log_size'])
+        self.log = []
+        print('Resuming from round', checkpoint['round_num'] + 1)
+        return players, checkpoint['round_num'] + 1
 
     def log_round_state(self, players, round_state):
         '''
@@ -521,6 +768,9 @@ class Game():
         '''
         Runs one round of poker.
         '''
+        phases = self.phases
+        if phases is not None:
+            phase_time = time.perf_counter()
         deck = eval7.Deck()
         deck.shuffle()
         hands = [deck.deal(NUM_BOARDS*2), deck.deal(NUM_BOARDS*2)]
@@ -530,18 +780,33 @@ class Game():
         stacks = [STARTING_STACK - NUM_BOARDS*SMALL_BLIND, STARTING_STACK - NUM_BOARDS*BIG_BLIND]
         board_states = [BoardState((i+1)*BIG_BLIND, [SMALL_BLIND, BIG_BLIND], None, new_decks[i], None) for i in range(NUM_BOARDS)]
         round_state = RoundState(-2, 0, stacks, hands, board_states, None)
+        if phases is not None:
+            phase_time = phases.lap('state', phase_time)
         while not isinstance(round_state, TerminalState):
             self.log_round_state(players, round_state)
+            if phases is not None:
+                phase_time = phases.lap('logging', phase_time)
             active = round_state.button % 2
             player = players[active]
             actions = player.query(round_state, self.player_messages[active], self.log, active)
+            if phases is not None:
+                phase_time = phases.lap('query', phase_time)
             bet_overrides = [(round_state.board_states[i].pips == [0, 0]) if isinstance(round_state.board_states[i], BoardState) else None for i in range(NUM_BOARDS)]
             self.log_actions(player.name, actions, bet_overrides, active)
+            if phases is not None:
+                phase_time = phases.lap('logging', phase_time)
             round_state = round_state.proceed(actions)
+            if phases is not None:
+                phase_time = phases.lap('state', phase_time)
         self.log_terminal_state(players, round_state)
+        if phases is not None:
+            phase_time = phases.lap('logging', phase_time)
         for player, player_message, delta in zip(players, self.player_messages, round_state.deltas):
             player.query(round_state, player_message, self.log, None)
             player.bankroll += delta
+        if phases is not None:
+            phases.lap('query', phase_time)
+        return round_state
 
     def run(self):
         '''
@@ -554,25 +819,42 @@ class Game():
         print()
         print('Starting the Pokerbots engine...')
         players = [
-            Player(PLAYER_1_NAME, PLAYER_1_PATH),
-            Player(PLAYER_2_NAME, PLAYER_2_PATH)
+            Player(PLAYER_1_NAME, PLAYER_1_PATH, PLAYER_1_CPUS),
+            Player(PLAYER_2_NAME, PLAYER_2_PATH, PLAYER_2_CPUS)
         ]
-        for player in players:
+        name = GAME_LOG_FILENAME + '.txt'
+        first_round = 1
+        if CHECKPOINT_ROUNDS > 0:
+            players, first_round = self.load_checkpoint(players)
+        for player, opponent in zip(players, players[::-1]):
+            player.opponent_name = opponent.name
+            player.phases = self.phases
+            player.metrics = self.metrics
             player.build()
             player.run()
-        for round_num in range(1, NUM_ROUNDS + 1):
+        with open(name, 'a' if first_round > 1 else 'w') as log_file:
+            for round_num in range(first_round, NUM_ROUNDS + 1):
+                self.log.append('')
+                self.log.append('Round #' + str(round_num) + STATUS(players))
+                terminal_state = self.run_round(players)
+                stop = any([listener(round_num, players, terminal_state) for listener in self.round_listeners])
+                players = players[::-1]
+                if stop:
+                    break
+                if CHECKPOINT_ROUNDS > 0 and round_num % CHECKPOINT_ROUNDS == 0:
+                    self.save_checkpoint(round_num, players, log_file)
             self.log.append('')
-            self.log.append('Round #' + str(round_num) + STATUS(players))
-            self.run_round(players)
-            players = players[::-1]
-        self.log.append('')
-        self.log.append('Final' + STATUS(players))
-        for player in players:
-            player.stop()
-        name = GAME_LOG_FILENAME + '.txt'
-        print('Writing', name)
-        with open(name, 'w') as log_file:
-            log_file.write('\n'.join(self.log))
+            self.log.append('Final' + STATUS(players))
+            for player in players:
+                player.stop()
+            if self.phases is not None:
+                print(self.phases.close())
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            print('Writing', name)
+            self.write_log(log_file)
+        if os.path.exists(self.checkpoint_filename):
+            os.remove(self.checkpoint_filename)
 
 
 if __name__ == '__main__':
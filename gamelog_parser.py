@@ -0,0 +1,306 @@
+'''
+Converts engine gamelogs into a columnar hand-history dataset.
+
+Each gamelog is parsed in one streaming pass into typed columns for four tables:
+    rounds: one row per round, with the blinds, bankrolls, dealt hands and deltas,
+    boards: one row per board of a round, with the assigned and revealed hands and board cards,
+    streets: one row per street dealt on a board, with the pot and both stacks,
+    actions: one row per action on a board, in the order the engine logged them.
+Players are numbered 0 and 1 in the order of the gamelog header, cards are encoded as
+rank*4 + suit with 2c as 0 and As as 51, and UNKNOWN marks cards which were never seen.
+Every table carries the file and round numbers, which join the tables together.
+
+The dataset is a directory with one NumPy .npy file per column, named <table>.<column>.npy,
+so numpy.load(path, mmap_mode='r') scans it without reading it into memory. The files are
+written with the standard library, so NumPy is only needed to read them that way.
+
+Run with python3 gamelog_parser.py --out DIRECTORY gamelog.txt [gamelog.txt ...]
+'''
+import argparse
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+from array import array
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+UNKNOWN = 255
+STREETS = {'Flop': 3, 'Turn': 4, 'River': 5}
+ACTION_CODES = {'folds': 0, 'calls': 1, 'checks': 2, 'bets': 3, 'raises to': 4, 'assigns': 5}
+
+# table -> list of (column, array typecode, width)
+SCHEMA = {
+    'rounds': [('file', 'i', 1), ('round', 'i', 1), ('small_blind', 'B', 1), ('bankrolls', 'i', 2),
+               ('hands', 'B', 12), ('deltas', 'i', 2), ('errors', 'H', 2)],
+    'boards': [('file', 'i', 1), ('round', 'i', 1), ('board', 'B', 1), ('holes', 'B', 4),
+               ('shown', 'B', 2), ('cards', 'B', 5), ('last_street', 'B', 1)],
+    'streets': [('file', 'i', 1), ('round', 'i', 1), ('board', 'B', 1), ('street', 'B', 1),
+                ('pot', 'i', 1), ('stacks', 'i', 2)],
+    'actions': [('file', 'i', 1), ('round', 'i', 1), ('board', 'B', 1), ('street', 'B', 1),
+                ('sequence', 'H', 1), ('player', 'B', 1), ('action', 'B', 1), ('amount', 'i', 1)],
+}
+DESCR = {'i': '<i4', 'H': '<u2', 'B': '|u1'}
+
+HEADER_PATTERN = re.compile(r'^6\.176 MIT Pokerbots - (.+) vs (.+)$')
+ROUND_PATTERN = re.compile(r'^Round #(\d+), (.+) \((-?\d+)\), (.+) \((-?\d+)\)$')
+DEALT_PATTERN = re.compile(r'^(.+) dealt \[(.*)\]$')
+ASSIGN_PATTERN = re.compile(r'^(.+) assigns \[(.*)\] to board (\d+)$')
+ACTION_PATTERN = re.compile(r'^(.+) (folds|calls|checks|bets|raises to) ?(\d*) on board (\d+)$')
+STREET_PATTERN = re.compile(r'^(Flop|Turn|River) \[(.*)\], \((\d+)\), (.+) \((-?\d+)\), (.+) \((-?\d+)\) on board (\d+)$')
+SHOWS_PATTERN = re.compile(r'^(.+) shows \[(.*)\] on board (\d+)$')
+AWARDED_PATTERN = re.compile(r'^(.+) awarded (-?\d+)$')
+ERROR_PATTERN = re.compile(r'^(.+?) (attempted|ran out of time|did not submit|disconnected|response misformatted)')
+
+
+def card_codes(cards):
+    '''
+    Encodes space separated card strings as integers.
+    '''
+    return [RANKS.index(card[0]) * 4 + SUITS.index(card[1]) for card in cards.split(' ') if card]
+
+
+def new_columns():
+    '''
+    Returns empty columns for every table in SCHEMA.
+    '''
+    return {table: {column: array(typecode) for column, typecode, _ in columns} for table, columns in SCHEMA.items()}
+
+
+class _Round():
+    '''
+    Accumulates one round while its lines are streamed.
+    '''
+
+    def __init__(self, file_id, round_num, small_blind, bankrolls):
+        self.file_id = file_id
+        self.round_num = round_num
+        self.small_blind = small_blind
+        self.bankrolls = bankrolls
+        self.hands = [UNKNOWN] * 12
+        self.deltas = [0, 0]
+        self.errors = [0, 0]
+        self.holes = [[UNKNOWN] * 4 for _ in range(3)]
+        self.shown = [[0, 0] for _ in range(3)]
+        self.cards = [[UNKNOWN] * 5 for _ in range(3)]
+        self.streets = [0, 0, 0]
+        self.sequence = 0
+
+    def flush(self, columns):
+        '''
+        Appends the round's rounds and boards rows to the columns.
+        '''
+        rounds = columns['rounds']
+        rounds['file'].append(self.file_id)
+        rounds['round'].append(self.round_num)
+        rounds['small_blind'].append(self.small_blind)
+        rounds['bankrolls'].extend(self.bankrolls)
+        rounds['hands'].extend(self.hands)
+        rounds['deltas'].extend(self.deltas)
+        rounds['errors'].extend(self.errors)
+        boards = columns['boards']
+        for i in range(3):
+            boards['file'].append(self.file_id)
+            boards['round'].append(self.round_num)
+            boards['board'].append(i + 1)
+            boards['holes'].extend(self.holes[i])
+            boards['shown'].extend(self.shown[i])
+            boards['cards'].extend(self.cards[i])
+            boards['last_street'].append(self.streets[i])
+
+
+def parse_gamelog(filename, file_id=0):
+    '''
+    Parses one gamelog into columns.
+
+    Arguments:
+    filename: the gamelog to parse.
+    file_id: the number stored in the file column of every row.
+
+    Returns:
+    A dict mapping each table to a dict mapping its columns to arrays.
+    '''
+    columns = new_columns()
+    players = {}
+    current = None
+    with open(filename, 'r') as log_file:
+        for line in log_file:
+            line = line.rstrip('\n')
+            match = ROUND_PATTERN.match(line)
+            if match:
+                if current is not None:
+                    current.flush(columns)
+                bankrolls = [0, 0]
+                bankrolls[players[match.group(2)]] = int(match.group(3))
+                bankrolls[players[match.group(4)]] = int(match.group(5))
+                current = _Round(file_id, int(match.group(1)), players[match.group(2)], bankrolls)
+                continue
+            match = ACTION_PATTERN.match(line)
+            if match and current is not None:
+                board = int(match.group(4))
+                actions = columns['actions']
+                actions['file'].append(file_id)
+                actions['round'].append(current.round_num)
+                actions['board'].append(board)
+                actions['street'].append(current.streets[board - 1])
+                actions['sequence'].append(current.sequence)
+                actions['player'].append(players[match.group(1)])
+                actions['action'].append(ACTION_CODES[match.group(2)])
+                actions['amount'].append(int(match.group(3)) if match.group(3) else 0)
+                current.sequence += 1
+                continue
+            match = STREET_PATTERN.match(line)
+            if match and current is not None:
+                board = int(match.group(8))
+                street = STREETS[match.group(1)]
+                current.streets[board - 1] = street
+                codes = card_codes(match.group(2))
+                current.cards[board - 1][:len(codes)] = codes
+                stacks = [0, 0]
+                stacks[players[match.group(4)]] = int(match.group(5))
+                stacks[players[match.group(6)]] = int(match.group(7))
+                streets = columns['streets']
+                streets['file'].append(file_id)
+                streets['round'].append(current.round_num)
+                streets['board'].append(board)
+                streets['street'].append(street)
+                streets['pot'].append(int(match.group(3)))
+                streets['stacks'].extend(stacks)
+                continue
+            match = ASSIGN_PATTERN.match(line)
+            if match and current is not None:
+                board = int(match.group(3))
+                player = players[match.group(1)]
+                codes = card_codes(match.group(2))
+                current.holes[board - 1][2*player:2*player + len(codes)] = codes
+                actions = columns['actions']
+                actions['file'].append(file_id)
+                actions['round'].append(current.round_num)
+                actions['board'].append(board)
+                actions['street'].append(0)
+                actions['sequence'].append(current.sequence)
+                actions['player'].append(player)
+                actions['action'].append(ACTION_CODES['assigns'])
+                actions['amount'].append(0)
+                current.sequence += 1
+                continue
+            match = SHOWS_PATTERN.match(line)
+            if match and current is not None:
+                board = int(match.group(3))
+                player = players[match.group(1)]
+                current.holes[board - 1][2*player:2*player + 2] = card_codes(match.group(2))
+                current.shown[board - 1][player] = 1
+                continue
+            match = DEALT_PATTERN.match(line)
+            if match and current is not None:
+                player = players[match.group(1)]
+                current.hands[6*player:6*player + 6] = card_codes(match.group(2))
+                continue
+            match = AWARDED_PATTERN.match(line)
+            if match and current is not None:
+                current.deltas[players[match.group(1)]] = int(match.group(2))
+                continue
+            match = ERROR_PATTERN.match(line)
+            if match and current is not None and match.group(1) in players:
+                current.errors[players[match.group(1)]] += 1
+                continue
+            match = HEADER_PATTERN.match(line)
+            if match:
+                players = {match.group(1): 0, match.group(2): 1}
+    if current is not None:
+        current.flush(columns)
+    return columns
+
+
+def _parse_job(job):
+    '''
+    Parses one gamelog in a worker process, returning its columns as bytes.
+    '''
+    file_id, filename = job
+    columns = parse_gamelog(filename, file_id)
+    return {table: {column: values.tobytes() for column, values in table_columns.items()}
+            for table, table_columns in columns.items()}
+
+
+def write_npy(path, values, typecode, width):
+    '''
+    Writes an array as a NumPy .npy file without needing NumPy.
+    '''
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values = array(typecode, values)
+        values.byteswap()
+    rows = len(values) // width
+    shape = '({},)'.format(rows) if width == 1 else '({}, {})'.format(rows, width)
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(DESCR[typecode], shape)
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + ' ' * padding + '\n').encode('latin1')
+    with open(path, 'wb') as npy_file:
+        npy_file.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header)
+        values.tofile(npy_file)
+
+
+def build_dataset(filenames, out, workers=None):
+    '''
+    Parses gamelogs in parallel and writes their concatenated columns to the directory out.
+
+    Returns:
+    The number of rows written to each table.
+    '''
+    columns = new_columns()
+    with multiprocessing.Pool(workers) as pool:
+        for parsed in pool.imap(_parse_job, enumerate(filenames), chunksize=8):
+            for table, table_columns in parsed.items():
+                for column, data in table_columns.items():
+                    columns[table][column].frombytes(data)
+    os.makedirs(out, exist_ok=True)
+    rows = {}
+    for table, schema in SCHEMA.items():
+        for column, typecode, width in schema:
+            write_npy(os.path.join(out, '{}.{}.npy'.format(table, column)), columns[table][column], typecode, width)
+        rows[table] = len(columns[table][schema[0][0]])
+    return rows
+
+
+def load_dataset(directory):
+    '''
+    Memory-maps a dataset written by build_dataset.
+
+    Returns:
+    A dict mapping each table to a dict mapping its columns to arrays. These are NumPy
+    memmaps if NumPy is installed, and flat memoryviews of the mapped files otherwise.
+    '''
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    dataset = {}
+    for table, schema in SCHEMA.items():
+        dataset[table] = {}
+        for column, typecode, _ in schema:
+            path = os.path.join(directory, '{}.{}.npy'.format(table, column))
+            if numpy is not None:
+                dataset[table][column] = numpy.load(path, mmap_mode='r')
+            else:
+                with open(path, 'rb') as npy_file:
+                    mapped = mmap.mmap(npy_file.fileno(), 0, access=mmap.ACCESS_READ)
+                offset = 10 + int.from_bytes(mapped[8:10], 'little')
+                dataset[table][column] = memoryview(mapped)[offset:].cast(typecode)
+    return dataset
+
+
+def main():
+    '''
+    Builds a dataset from the gamelogs given on the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 gamelog_parser.py')
+    parser.add_argument('--out', type=str, required=True, help='Directory to write the dataset to')
+    parser.add_argument('--workers', type=int, default=None, help='Number of parser processes')
+    parser.add_argument('gamelogs', nargs='+', help='Gamelogs to parse')
+    args = parser.parse_args()
+    rows = build_dataset(args.gamelogs, args.out, args.workers)
+    print(', '.join('{} {}'.format(count, table) for table, count in rows.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+Benchmarks a pokerbot against the reference bots in reference_bots.
+
+The candidate plays every reference bot once per seed, with the seed fixing the engine's
+deals, so every run of the gauntlet deals the same cards. Matches run in parallel, each in
+a fresh process and its own directory under --out, and the report gives per opponent the
+share of matches won, the candidate's bankroll per 100 rounds, and the mean and 99th
+percentile of the wall time the candidate took to answer each of the engine's queries.
+
+Run with python3 gauntlet.py CANDIDATE_PATH from the directory containing engine.py.
+'''
+import argparse
+import multiprocessing
+import os
+from tournament import play_match_process
+
+OPPONENTS = ['random_legal', 'calling_station', 'raise_max', 'pot_odds', 'tight_preflop']
+REFERENCE_BOTS_PATH = 'reference_bots'
+CANDIDATE_NAME = 'candidate'
+SEEDS = [1, 2, 3, 4]
+NUM_ROUNDS = 200
+OUT_DIRECTORY = 'gauntlet'
+
+
+def gauntlet_specs(candidate_path, seeds=SEEDS, num_rounds=NUM_ROUNDS):
+    '''
+    Returns the match specs, in the format of tournament.py, of the candidate against
+    every reference bot with every seed.
+    '''
+    return [{'id': '{}-{}'.format(opponent, seed), 'seed': seed, 'config': {'NUM_ROUNDS': num_rounds},
+             'players': [[CANDIDATE_NAME, candidate_path], [opponent, os.path.join(REFERENCE_BOTS_PATH, opponent)]]}
+            for opponent in OPPONENTS for seed in seeds]
+
+
+def _gauntlet_job(job):
+    '''
+    Plays one gauntlet match in a pool process.
+    '''
+    spec, root, out = job
+    result = play_match_process(spec, root, os.path.join(out, spec['id']))
+    result['opponent'] = spec['players'][1][0]
+    return result
+
+
+def run_gauntlet(candidate_path, seeds=SEEDS, num_rounds=NUM_ROUNDS, out=OUT_DIRECTORY, workers=None):
+    '''
+    Plays the gauntlet in parallel.
+
+    Returns:
+    A dict mapping each opponent to a list of match results from play_match.
+    '''
+    root = os.getcwd()
+    out = os.path.abspath(out)
+    jobs = [(spec, root, out) for spec in gauntlet_specs(candidate_path, seeds, num_rounds)]
+    results = {opponent: [] for opponent in OPPONENTS}
+    # a fresh process per match, since play_match patches the engine and changes directory
+    with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(_gauntlet_job, jobs):
+            results[result['opponent']].append(result)
+    return results
+
+
+def latency(decision_times):
+    '''
+    Returns the mean and 99th percentile of a list of decision times, in milliseconds.
+    '''
+    if not decision_times:
+        return 0., 0.
+    ordered = sorted(decision_times)
+    return 1000 * sum(ordered) / len(ordered), 1000 * ordered[min(int(0.99 * len(ordered)), len(ordered) - 1)]
+
+
+def report(results):
+    '''
+    Returns lines summarizing the candidate's results against each opponent and overall.
+    '''
+    row = '{:<16} {:>8} {:>10.2f} {:>14.1f} {:>15.3f} {:>14.3f}'
+    lines = ['{:<16} {:>8} {:>10} {:>14} {:>15} {:>14}'.format('opponent', 'matches', 'win rate', 'bankroll/100', 'query mean ms', 'query p99 ms')]
+    totals = [0, 0, 0, 0, []]  # matches, wins, rounds, bankroll, decision times
+    for opponent, matches in results.items():
+        wins = sum(1 for match in matches if match['bankrolls'][CANDIDATE_NAME] > match['bankrolls'][opponent])
+        rounds = sum(match['rounds'] for match in matches)
+        bankroll = sum(match['bankrolls'][CANDIDATE_NAME] for match in matches)
+        decision_times = [seconds for match in matches for seconds in match['decision_times'].get(CANDIDATE_NAME, [])]
+        for i, value in enumerate((len(matches), wins, rounds, bankroll, decision_times)):
+            totals[i] += value
+        lines.append(row.format(opponent, len(matches), wins / max(len(matches), 1), 100 * bankroll / max(rounds, 1), *latency(decision_times)))
+    matches, wins, rounds, bankroll, decision_times = totals
+    lines.append(row.format('all', matches, wins / max(matches, 1), 100 * bankroll / max(rounds, 1), *latency(decision_times)))
+    return lines
+
+
+def main():
+    '''
+    Runs the gauntlet from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 gauntlet.py')
+    parser.add_argument('candidate', type=str, help='Path of the pokerbot to benchmark')
+    parser.add_argument('--seeds', type=int, nargs='+', default=SEEDS, help='Seeds of the deals against each opponent')
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS, help='Rounds per match')
+    parser.add_argument('--workers', type=int, default=None, help='Matches to play at once')
+    parser.add_argument('--out', type=str, default=OUT_DIRECTORY, help='Directory for the match logs')
+    args = parser.parse_args()
+    results = run_gauntlet(args.candidate, args.seeds, args.rounds, args.out, args.workers)
+    print('\n'.join(report(results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+'''
+Indexed hand-history database built from engine gamelogs.
+
+Gamelogs are parsed with gamelog_parser in worker processes and bulk inserted into a
+local SQLite database in batches, one transaction per gamelog, so ingesting hundreds of
+matches takes seconds and each gamelog is only ingested once. The database has a row per
+player per board in hands, and a row per betting action in actions. Every action carries
+the acting player and their opponent, the street, the board, the pot before the action and
+the bet size bucket, and the indexes cover exactly those columns, so questions like "what
+did this opponent show down after a river overbet on board 3?" are answered from an index
+in milliseconds. The queries are fixed SQL strings which SQLite prepares once per
+connection and caches.
+
+Run with python3 hand_history.py --db hands.db gamelog.txt [gamelog.txt ...] to ingest,
+and python3 hand_history.py --db hands.db --player NAME [--street 5] [--board 3]
+[--size overbet] to list that player's showdowns after such a bet.
+'''
+import argparse
+import multiprocessing
+import os
+import sqlite3
+from config import BIG_BLIND, SMALL_BLIND
+from gamelog_parser import ACTION_CODES, HEADER_PATTERN, RANKS, SUITS, UNKNOWN, parse_gamelog
+
+DATABASE_FILENAME = 'hands.db'
+BATCH_SIZE = 10000
+SIZE_EDGES = [0.34, 0.67, 1.0]  # upper edges of the bet size buckets, as fractions of the pot
+SIZE_BUCKETS = ['none', 'small', 'medium', 'pot', 'overbet']
+BETTING_ACTIONS = {code: action for action, code in ACTION_CODES.items() if action != 'assigns'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS players (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS matches (id INTEGER PRIMARY KEY, filename TEXT UNIQUE NOT NULL,
+    player0 INTEGER NOT NULL, player1 INTEGER NOT NULL, rounds INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS hands (match INTEGER NOT NULL, round INTEGER NOT NULL, board INTEGER NOT NULL,
+    player INTEGER NOT NULL, opponent INTEGER NOT NULL, hole TEXT, shown INTEGER NOT NULL,
+    board_cards TEXT, last_street INTEGER NOT NULL, PRIMARY KEY (match, round, board, player)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS actions (match INTEGER NOT NULL, round INTEGER NOT NULL, board INTEGER NOT NULL,
+    street INTEGER NOT NULL, sequence INTEGER NOT NULL, player INTEGER NOT NULL, opponent INTEGER NOT NULL,
+    action INTEGER NOT NULL, amount INTEGER NOT NULL, pot INTEGER NOT NULL, size_bucket INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS actions_by_player ON actions (player, street, board, action, size_bucket);
+CREATE INDEX IF NOT EXISTS actions_by_opponent ON actions (opponent, street, board, action, size_bucket);
+CREATE INDEX IF NOT EXISTS actions_by_size ON actions (size_bucket, street, board);
+'''
+
+INSERT_PLAYER = 'INSERT OR IGNORE INTO players (name) VALUES (?)'
+SELECT_PLAYER = 'SELECT id FROM players WHERE name = ?'
+SELECT_MATCH = 'SELECT id FROM matches WHERE filename = ?'
+INSERT_MATCH = 'INSERT INTO matches (filename, player0, player1, rounds) VALUES (?, ?, ?, ?)'
+INSERT_HAND = 'INSERT INTO hands VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+INSERT_ACTION = 'INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+SHOWDOWNS = '''SELECT hands.hole, hands.board_cards, actions.amount, actions.pot, hands.match, hands.round
+FROM actions JOIN hands ON hands.match = actions.match AND hands.round = actions.round
+    AND hands.board = actions.board AND hands.player = actions.player
+WHERE actions.player = ? AND actions.street = ? AND actions.board = ? AND actions.size_bucket = ? AND hands.shown = 1'''
+ACTION_COUNTS = '''SELECT action, size_bucket, COUNT(*) FROM actions
+WHERE player = ? AND street = ? GROUP BY action, size_bucket'''
+
+
+def card_names(codes):
+    '''
+    Decodes gamelog_parser card codes into a space separated string, skipping unknown cards.
+    '''
+    return ' '.join(RANKS[code // 4] + SUITS[code % 4] for code in codes if code != UNKNOWN)
+
+
+def size_bucket(fraction):
+    '''
+    Returns the index in SIZE_BUCKETS of a bet or raise of a fraction of the pot.
+    '''
+    return 1 + sum(1 for edge in SIZE_EDGES if fraction > edge)
+
+
+def read_players(filename):
+    '''
+    Returns the two player names in the order of the gamelog header.
+    '''
+    with open(filename, 'r') as log_file:
+        for line in log_file:
+            match = HEADER_PATTERN.match(line.rstrip('\n'))
+            if match:
+                return [match.group(1), match.group(2)]
+    raise ValueError('{} has no gamelog header'.format(filename))
+
+
+def gamelog_rows(filename):
+    '''
+    Parses a gamelog into hands and actions rows, numbering players 0 and 1 and leaving the
+    match column out.
+
+    Returns:
+    The player names, the number of rounds, the hands rows and the actions rows.
+    '''
+    players = read_players(filename)
+    columns = parse_gamelog(filename)
+    rounds = columns['rounds']
+    small_blinds = dict(zip(rounds['round'], rounds['small_blind']))
+    streets = columns['streets']
+    pots = {key: pot for key, pot in zip(zip(streets['round'], streets['board'], streets['street']), streets['pot'])}
+    boards = columns['boards']
+    hands = []
+    for j, (round_num, board) in enumerate(zip(boards['round'], boards['board'])):
+        holes = boards['holes'][4*j:4*j + 4]
+        board_cards = card_names(boards['cards'][5*j:5*j + 5])
+        for player in range(2):
+            hole = card_names(holes[2*player:2*player + 2])
+            hands.append((round_num, board, player, 1 - player, hole or None,
+                          boards['shown'][2*j + player], board_cards or None, boards['last_street'][j]))
+    actions = columns['actions']
+    betting = {}  # (round, board) -> [street, pot, pips]
+    rows = []
+    for row in zip(actions['round'], actions['board'], actions['street'], actions['sequence'],
+                   actions['player'], actions['action'], actions['amount']):
+        round_num, board, street, sequence, player, action, amount = row
+        if action not in BETTING_ACTIONS:
+            continue
+        state = betting.get((round_num, board))
+        if state is None or state[0] != street:
+            if street == 0:
+                pips = [0, 0]
+                pips[small_blinds[round_num]] = SMALL_BLIND
+                pips[1 - small_blinds[round_num]] = BIG_BLIND
+                state = [street, board * BIG_BLIND, pips]
+            else:
+                state = [street, pots.get((round_num, board, street), 0), [0, 0]]
+            betting[(round_num, board)] = state
+        pot = state[1] + sum(state[2])
+        pips = state[2]
+        bucket = 0
+        if BETTING_ACTIONS[action] in ('bets', 'raises to'):
+            bucket = size_bucket((amount - pips[1 - player]) / max(pot, 1))
+            pips[player] = amount
+        elif BETTING_ACTIONS[action] == 'calls':
+            pips[player] = pips[1 - player]
+        rows.append((round_num, board, street, sequence, player, 1 - player, action, amount, pot, bucket))
+    return players, len(rounds['round']), hands, rows
+
+
+def _rows_job(filename):
+    '''
+    Parses one gamelog in a worker process.
+    '''
+    return filename, gamelog_rows(filename)
+
+
+class HandHistory():
+    '''
+    A connection to the hand-history database.
+    '''
+
+    def __init__(self, path=DATABASE_FILENAME, readonly=False):
+        if readonly:
+            self.connection = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True, cached_statements=64)
+        else:
+            self.connection = sqlite3.connect(path, cached_statements=64)
+            self.connection.execute('PRAGMA journal_mode = WAL')
+            self.connection.execute('PRAGMA synchronous = NORMAL')
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        '''
+        Closes the connection.
+        '''
+        self.connection.close()
+
+    def player_id(self, name, create=False):
+        '''
+        Returns the id of the player called name, or None if they were never ingested.
+        '''
+        if create:
+            self.connection.execute(INSERT_PLAYER, (name,))
+        row = self.connection.execute(SELECT_PLAYER, (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def ingest(self, filenames, workers=None):
+        '''
+        Parses gamelogs in parallel and inserts those which are not in the database yet.
+
+        Returns:
+        The number of gamelogs ingested.
+        '''
+        filenames = [os.path.abspath(filename) for filename in filenames]
+        filenames = [filename for filename in filenames
+                     if self.connection.execute(SELECT_MATCH, (filename,)).fetchone() is None]
+        if not filenames:
+            return 0
+        with multiprocessing.Pool(workers) as pool:
+            for filename, (players, num_rounds, hands, actions) in pool.imap_unordered(_rows_job, filenames):
+                with self.connection:  # one transaction per gamelog
+                    ids = [self.player_id(name, create=True) for name in players]
+                    match = self.connection.execute(INSERT_MATCH, (filename, ids[0], ids[1], num_rounds)).lastrowid
+                    hands = [(match, round_num, board, ids[player], ids[opponent]) + tuple(rest)
+                             for round_num, board, player, opponent, *rest in hands]
+                    actions = [(match, round_num, board, street, sequence, ids[player], ids[opponent]) + tuple(rest)
+                               for round_num, board, street, sequence, player, opponent, *rest in actions]
+                    for start in range(0, len(hands), BATCH_SIZE):
+                        self.connection.executemany(INSERT_HAND, hands[start:start + BATCH_SIZE])
+                    for start in range(0, len(actions), BATCH_SIZE):
+                        self.connection.executemany(INSERT_ACTION, actions[start:start + BATCH_SIZE])
+        self.connection.execute('ANALYZE')
+        return len(filenames)
+
+    def showdowns(self, name, street=5, board=3, size='overbet'):
+        '''
+        Returns what a player showed down after betting or raising a size bucket on a street and board.
+
+        Returns:
+        A list of (hole cards, board cards, amount raised to, pot before the bet, match id, round) rows.
+        '''
+        player = self.player_id(name)
+        if player is None:
+            return []
+        return self.connection.execute(SHOWDOWNS, (player, street, board, SIZE_BUCKETS.index(size))).fetchall()
+
+    def action_counts(self, name, street):
+        '''
+        Returns how often a player took each action at each bet size bucket on a street.
+
+        Returns:
+        A dict mapping (action, size bucket) to counts.
+        '''
+        player = self.player_id(name)
+        if player is None:
+            return {}
+        return {(BETTING_ACTIONS[action], SIZE_BUCKETS[bucket]): count
+                for action, bucket, count in self.connection.execute(ACTION_COUNTS, (player, street))}
+
+
+def main():
+    '''
+    Ingests the gamelogs given on the command line, or queries a player's showdowns.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 hand_history.py')
+    parser.add_argument('--db', type=str, default=DATABASE_FILENAME, help='Database file')
+    parser.add_argument('--workers', type=int, default=None, help='Number of parser processes')
+    parser.add_argument('--player', type=str, default=None, help='Player whose showdowns to list')
+    parser.add_argument('--street', type=int, default=5, choices=[0, 3, 4, 5], help='Street of the bet')
+    parser.add_argument('--board', type=int, default=3, choices=[1, 2, 3], help='Board of the bet')
+    parser.add_argument('--size', type=str, default='overbet', choices=SIZE_BUCKETS[1:], help='Size bucket of the bet')
+    parser.add_argument('gamelogs', nargs='*', help='Gamelogs to ingest')
+    args = parser.parse_args()
+    history = HandHistory(args.db)
+    if args.gamelogs:
+        print('Ingested {} of {} gamelogs'.format(history.ingest(args.gamelogs, args.workers), len(args.gamelogs)))
+    if args.player is not None:
+        for hole, board_cards, amount, pot, match, round_num in history.showdowns(args.player, args.street, args.board, args.size):
+            print('match {} round {}: [{}] on [{}] after raising to {} into {}'.format(match, round_num, hole, board_cards, amount, pot))
+    history.close()
+
+
+if __name__ == '__main__':
+    main()
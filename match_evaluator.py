@@ -0,0 +1,128 @@
+'''
+Luck-adjusted match evaluation in the style of AIVAT.
+
+Card luck dominates raw bankroll deltas. Since the engine knows both players' hands, every
+deal of board cards is a chance node with a known distribution, and we can subtract the
+luck of each deal from the realized payoffs. With the value of a history taken as a player's
+showdown equity times the pot, the correction at a deal on a board is
+    pot * (equity before the deal - equity after the deal)
+which has zero mean whatever the players do, so the adjusted bankroll remains an unbiased
+estimate of the true win rate while most of the variance from the cards cancels out.
+In particular, an all in before the river is valued at its all-in equity.
+
+Run with python3 match_evaluator.py from the directory containing config.py to play a
+match and report raw and adjusted bankrolls per player.
+'''
+import itertools
+import math
+import random
+import eval7
+import engine
+
+PREFLOP_SAMPLES = 1000
+
+
+def showdown_equity(hands, board, deck_cards, rng, samples=PREFLOP_SAMPLES):
+    '''
+    Returns player 0's showdown equity on a board, counting ties as half.
+
+    Arguments:
+    hands: both players' two hole cards on the board.
+    board: the board cards dealt so far.
+    deck_cards: the cards the rest of the board can be dealt from.
+    rng: the random number generator used when the runouts are sampled.
+    samples: the number of sampled runouts used when more than two cards are to come.
+    '''
+    remaining = [card for card in deck_cards if card not in board]
+    to_come = 5 - len(board)
+    if to_come <= 2:
+        runouts = itertools.combinations(remaining, to_come)
+    else:
+        runouts = (rng.sample(remaining, to_come) for _ in range(samples))
+    score = 0
+    total = 0
+    for runout in runouts:
+        full_board = board + list(runout)
+        score0 = eval7.evaluate(full_board + hands[0])
+        score1 = eval7.evaluate(full_board + hands[1])
+        score += 2 if score0 > score1 else 1 if score0 == score1 else 0
+        total += 1
+    return score / (2 * total)
+
+
+def luck_corrections(terminal_state, rng=None):
+    '''
+    Computes the luck of a round's board deals for each seat.
+
+    Arguments:
+    terminal_state: the engine's TerminalState at the end of a round.
+    rng: the random number generator for sampled preflop equities.
+
+    Returns:
+    A list [correction0, correction1] to add to the seats' realized deltas.
+    '''
+    rng = rng if rng is not None else random.Random()
+    round_states = []
+    state = terminal_state.previous_state
+    while state is not None:
+        round_states.append(state)
+        state = state.previous_state
+    round_states.reverse()
+    correction = 0.
+    equities = {}  # (board, street) -> player 0's equity once that street's cards are out
+    for previous, current in zip(round_states, round_states[1:]):
+        if current.street <= previous.street:
+            continue
+        for i, board_state in enumerate(current.board_states):
+            if not isinstance(board_state, engine.BoardState):  # no deal on boards which were folded
+                continue
+            hands = board_state.hands
+            deck_cards = board_state.deck.cards
+            for street in (previous.street, current.street):
+                if (i, street) not in equities:
+                    equities[(i, street)] = showdown_equity(hands, deck_cards[:street], deck_cards, rng)
+            correction += board_state.pot * (equities[(i, previous.street)] - equities[(i, current.street)])
+    return [correction, -correction]
+
+
+class LuckEvaluator():
+    '''
+    Round listener for engine.Game which accumulates raw and luck-adjusted results per player.
+    '''
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.raw = {}
+        self.adjusted = {}
+
+    def on_round(self, round_num, players, terminal_state):
+        '''
+        Records one round's raw and adjusted deltas.
+        '''
+        corrections = luck_corrections(terminal_state, self.rng)
+        for seat, player in enumerate(players):
+            self.raw.setdefault(player.name, []).append(terminal_state.deltas[seat])
+            self.adjusted.setdefault(player.name, []).append(terminal_state.deltas[seat] + corrections[seat])
+        return False
+
+    def report(self):
+        '''
+        Returns lines summarizing each player's raw and adjusted win rates with standard errors.
+        '''
+        lines = []
+        for name in self.raw:
+            for label, deltas in (('raw', self.raw[name]), ('adjusted', self.adjusted[name])):
+                count = len(deltas)
+                mean = sum(deltas) / count
+                variance = sum((delta - mean) ** 2 for delta in deltas) / max(count - 1, 1)
+                lines.append('{} {}: bankroll {:.1f}, {:.3f} per round, standard error {:.3f}'.format(
+                    name, label, sum(deltas), mean, math.sqrt(variance / count)))
+        return lines
+
+
+if __name__ == '__main__':
+    game = engine.Game()
+    evaluator = LuckEvaluator()
+    game.round_listeners.append(evaluator.on_round)
+    game.run()
+    print('\n'.join(evaluator.report()))
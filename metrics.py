@@ -0,0 +1,199 @@
+'''
+Live metrics for running matches and tournaments, served over HTTP in the Prometheus text
+exposition format.
+
+With METRICS_PORT set in config.py, the engine serves http://localhost:METRICS_PORT/metrics
+while a match runs, with
+    pokerbots_rounds_total: rounds completed,
+    pokerbots_rounds_per_second: rounds completed per second over the last RATE_WINDOW seconds,
+    pokerbots_bankroll, pokerbots_game_clock_seconds: each player's bankroll and remaining clock,
+    pokerbots_decision_seconds: quantiles of each player's last LATENCY_WINDOW decision times,
+    pokerbots_errors_total: each player's illegal actions, timeouts, misformatted responses
+        and disconnects.
+The tournament coordinator started with --metrics-port serves the state of its matches and
+the bankrolls of their results in the same way.
+
+Updates are a few dict and deque operations under a lock, and all formatting happens when
+the endpoint is scraped, so a match which nobody watches pays next to nothing. Watch a
+match with
+    curl -s localhost:9180/metrics
+or point a Prometheus scrape job at the port.
+'''
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RATE_WINDOW = 10.  # seconds
+LATENCY_WINDOW = 1000  # decisions per player
+QUANTILES = [0.5, 0.9, 0.99]
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def exposition(families):
+    '''
+    Formats metric families in the Prometheus text format.
+
+    Arguments:
+    families: a list of (name, type, help, samples) tuples, where samples is a list of
+    (labels, value) pairs and labels is a dict, or of (suffix, labels, value) triples for
+    samples named with a suffix, such as the _sum and _count of a summary.
+    '''
+    lines = []
+    for name, metric_type, help_text, samples in families:
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ('',) + tuple(sample)
+            label_text = ','.join('{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for key, label in labels.items())
+            lines.append('{}{}{} {}'.format(name, suffix, '{' + label_text + '}' if label_text else '', repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer():
+    '''
+    Serves the text of collect() at /metrics from a daemon thread.
+    '''
+
+    def __init__(self, port, collect, host='localhost'):
+        '''
+        Binds the server, raising OSError if the port is taken.
+
+        Arguments:
+        port: the port to listen on.
+        collect: a function returning the metric families to serve, as for exposition.
+        host: the address to listen on, only the local machine by default.
+        '''
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exposition(collect()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # scrapes would flood the engine's output
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        '''
+        Stops serving and releases the port.
+        '''
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RateMeter():
+    '''
+    Counts events per second over the last RATE_WINDOW seconds.
+    '''
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now=None):
+        '''
+        Records an event.
+        '''
+        self.times.append(time.perf_counter() if now is None else now)
+
+    def rate(self, now=None):
+        '''
+        Returns the events per second over the window, or since the first event if it is shorter.
+        '''
+        now = time.perf_counter() if now is None else now
+        while self.times and self.times[0] < now - self.window:
+            self.times.popleft()
+        if not self.times:
+            return 0.
+        return len(self.times) / max(min(self.window, now - self.times[0]), 1e-3)
+
+
+class EngineMetrics():
+    '''
+    Live counters of one match, updated by the engine and served by a MetricsServer.
+    '''
+
+    def __init__(self, latency_window=LATENCY_WINDOW):
+        '''
+        Arguments:
+        latency_window: the decisions per player kept for the quantiles, or None to keep all.
+        '''
+        self.lock = threading.Lock()
+        self.latency_window = latency_window
+        self.rounds = 0
+        self.round_rate = RateMeter()
+        self.bankrolls = {}
+        self.game_clocks = {}
+        self.decisions = {}  # player name -> deque of the latest decision times
+        self.decision_totals = Counter()  # player name -> total seconds of all decisions
+        self.decision_counts = Counter()
+        self.errors = Counter()  # (player name, kind) -> count
+
+    def end_round(self, round_num, players, terminal_state):
+        '''
+        Round listener which records the round and the players' bankrolls and clocks.
+        '''
+        with self.lock:
+            self.rounds = round_num
+            self.round_rate.tick()
+            for player in players:
+                self.bankrolls[player.name] = player.bankroll
+                self.game_clocks[player.name] = player.game_clock
+        return False
+
+    def decision(self, name, seconds):
+        '''
+        Records the time a player took to answer a query.
+        '''
+        with self.lock:
+            if name not in self.decisions:
+                self.decisions[name] = deque(maxlen=self.latency_window)
+            self.decisions[name].append(seconds)
+            self.decision_totals[name] += seconds
+            self.decision_counts[name] += 1
+
+    def error(self, name, kind):
+        '''
+        Counts an error of a kind, such as 'illegal' or 'timeout', by a player.
+        '''
+        with self.lock:
+            self.errors[(name, kind)] += 1
+
+    def collect(self):
+        '''
+        Returns the metric families for exposition.
+        '''
+        with self.lock:
+            quantiles = []
+            for name, latest in self.decisions.items():
+                ordered = sorted(latest)
+                for quantile in QUANTILES:
+                    quantiles.append(({'player': name, 'quantile': quantile},
+                                      ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]))
+                quantiles.append(('_sum', {'player': name}, self.decision_totals[name]))
+                quantiles.append(('_count', {'player': name}, self.decision_counts[name]))
+            return [
+                ('pokerbots_rounds_total', 'counter', 'Rounds completed.', [({}, self.rounds)]),
+                ('pokerbots_rounds_per_second', 'gauge', 'Rounds completed per second over the last {:g}s.'.format(RATE_WINDOW),
+                 [({}, self.round_rate.rate())]),
+                ('pokerbots_bankroll', 'gauge', 'Bankroll of each player.',
+                 [({'player': name}, value) for name, value in self.bankrolls.items()]),
+                ('pokerbots_game_clock_seconds', 'gauge', 'Game clock each player has left.',
+                 [({'player': name}, value) for name, value in self.game_clocks.items()]),
+                ('pokerbots_decision_seconds', 'summary',
+                 'Time each player took to answer a query, over its last {} answers.'.format(LATENCY_WINDOW), quantiles),
+                ('pokerbots_errors_total', 'counter', 'Illegal actions, timeouts and other errors of each player.',
+                 [({'player': name, 'kind': kind}, value) for (name, kind), value in sorted(self.errors.items())]),
+            ]
@@ -0,0 +1,248 @@
+'''
+Parallel evolutionary search over the strategy parameters of week-2-bot.
+
+Each generation samples POPULATION parameter sets around the current mean, always
+including the mean itself. Every candidate is written to a pokerbot directory of its own
+under --out, holding its params.json and a commands.json which runs week-2-bot/player.py.
+Each candidate plays every opponent on every seed, and all candidates share those seeds,
+so they all see the same deals (common random numbers). Fitness is the candidate's
+bankroll per 100 rounds.
+
+The mean and per-parameter step sizes are updated like a separable CMA-ES without
+covariance terms. Parameters are scaled to [0, 1] within their bounds. The mean moves to a
+log-weighted average of the best half of the population, and each step size moves toward
+the weighted spread of that half around the old mean.
+
+Every evaluated candidate, and the search state after each generation, is appended to
+<out>/archive.jsonl. A search restarted with the same --out resumes after the last
+completed generation. The best parameters found so far are kept in <out>/best_params.json,
+ready to copy over week-2-bot/params.json.
+
+Run with python3 param_search.py [--generations 10] [--opponents week-2-bot] from the
+directory containing engine.py.
+'''
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+from tournament import play_match_process
+
+BOT_PATH = 'week-2-bot'
+# name -> (lower bound, upper bound, whether the parameter is an integer), only for
+# parameters the bot's strategy reads; the others, such as MONTE_CARLO_ITERS, which trades
+# accuracy for game clock that the fitness does not see, keep their params.json values
+PARAMETER_SPACE = {
+    'PREFLOP_RAISE': (0.1, 1.5, False),
+    'POSTFLOP_RAISE': (0.2, 2.0, False),
+    'INTIMIDATION': (0., 0.4, False),
+    'INTIMIDATION_COST': (1, 40, True),
+}
+POPULATION = 8
+GENERATIONS = 10
+SIGMA = 0.2  # initial step size, as a fraction of each parameter's range
+MIN_SIGMA = 0.01
+SIGMA_LEARNING_RATE = 0.5
+OPPONENTS = ['week-2-bot']
+SEEDS = [1, 2, 3, 4]
+NUM_ROUNDS = 200
+SEED = 0
+OUT_DIRECTORY = 'search'
+ARCHIVE_FILENAME = 'archive.jsonl'
+BEST_FILENAME = 'best_params.json'
+
+
+def normalize(parameters):
+    '''
+    Scales parameters to [0, 1] within their bounds, in PARAMETER_SPACE order.
+    '''
+    return [(parameters[name] - low) / (high - low) for name, (low, high, _) in PARAMETER_SPACE.items()]
+
+
+def denormalize(point):
+    '''
+    Maps a point of [0, 1] coordinates back to parameters, rounding integer ones.
+    '''
+    parameters = {}
+    for x, (name, (low, high, integer)) in zip(point, PARAMETER_SPACE.items()):
+        value = low + min(max(x, 0.), 1.) * (high - low)
+        parameters[name] = int(round(value)) if integer else round(value, 4)
+    return parameters
+
+
+def default_parameters(bot_path=BOT_PATH):
+    '''
+    Returns the parameters in the bot's params.json.
+    '''
+    with open(os.path.join(bot_path, 'params.json'), 'r') as parameters_file:
+        return json.load(parameters_file)
+
+
+def write_candidate(directory, parameters, bot_path=BOT_PATH):
+    '''
+    Writes a pokerbot directory which runs the bot with the given parameters.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'commands.json'), 'w') as commands_file:
+        json.dump({'build': [], 'run': ['python3', os.path.abspath(os.path.join(bot_path, 'player.py'))]}, commands_file)
+    with open(os.path.join(directory, 'params.json'), 'w') as parameters_file:
+        json.dump(parameters, parameters_file, indent=4)
+
+
+def _match_job(job):
+    '''
+    Plays one match in a pool process, returning None if the match fails.
+    '''
+    spec, root, directory = job
+    try:
+        return play_match_process(spec, root, directory)
+    except Exception as e:
+        sys.stderr.write('match {} failed: {!r}\n'.format(spec['id'], e))
+        return None
+
+
+class Search():
+    '''
+    The state of a search, archived in out as it goes.
+    '''
+
+    def __init__(self, out=OUT_DIRECTORY, opponents=OPPONENTS, seeds=SEEDS, num_rounds=NUM_ROUNDS,
+                 population=POPULATION, seed=SEED):
+        self.root = os.getcwd()
+        self.out = os.path.abspath(out)
+        self.opponents = opponents
+        self.seeds = seeds
+        self.num_rounds = num_rounds
+        self.population = population
+        self.seed = seed
+        self.generation = 0
+        self.fixed = default_parameters()  # values of the parameters left out of the search
+        self.mean = normalize(self.fixed)
+        self.sigma = [SIGMA] * len(PARAMETER_SPACE)
+        self.best = None  # (fitness, parameters)
+        os.makedirs(self.out, exist_ok=True)
+        self.archive_filename = os.path.join(self.out, ARCHIVE_FILENAME)
+        if os.path.exists(self.archive_filename):
+            self.resume()
+
+    def resume(self):
+        '''
+        Restores the state after the last generation recorded in the archive.
+        '''
+        with open(self.archive_filename, 'r') as archive:
+            for line in archive:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # a line cut short by an interrupted search
+                    continue
+                if record.get('type') == 'state':
+                    self.generation = record['generation'] + 1
+                    self.mean = record['mean']
+                    self.sigma = record['sigma']
+                    self.best = (record['best_fitness'], record['best'])
+
+    def archive(self, record):
+        '''
+        Appends a record to the archive.
+        '''
+        with open(self.archive_filename, 'a') as archive:
+            archive.write(json.dumps(record) + '\n')
+
+    def sample(self):
+        '''
+        Returns the points of this generation, the mean first.
+        '''
+        rng = random.Random('{}-{}'.format(self.seed, self.generation))
+        points = [list(self.mean)]
+        while len(points) < self.population:
+            points.append([min(max(m + s * rng.gauss(0., 1.), 0.), 1.) for m, s in zip(self.mean, self.sigma)])
+        return points
+
+    def evaluate(self, candidates, workers=None):
+        '''
+        Plays every candidate against every opponent on every seed in parallel.
+
+        Returns:
+        A list of per candidate lists of match results, leaving out failed matches.
+        '''
+        jobs = []
+        for i, parameters in enumerate(candidates):
+            directory = os.path.join(self.out, 'generation_{}'.format(self.generation), 'candidate_{}'.format(i))
+            write_candidate(os.path.join(directory, 'bot'), parameters)
+            for opponent in self.opponents:
+                for seed in self.seeds:
+                    spec = {'id': '{}-{}-{}'.format(i, os.path.basename(opponent), seed), 'seed': seed,
+                            'config': {'NUM_ROUNDS': self.num_rounds},
+                            'players': [['candidate', os.path.join(directory, 'bot')], ['opponent', opponent]]}
+                    jobs.append((spec, self.root, os.path.join(directory, spec['id'])))
+        results = [[] for _ in candidates]
+        # a fresh process per match, since play_match patches the engine and changes directory
+        with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+            for result in pool.imap_unordered(_match_job, jobs):
+                if result is not None:
+                    results[int(result['id'].split('-', 1)[0])].append(result)
+        return results
+
+    def step(self, workers=None):
+        '''
+        Evaluates one generation, archives it and updates the search state.
+        '''
+        points = self.sample()
+        candidates = [dict(self.fixed, **denormalize(point)) for point in points]
+        scored = []
+        for i, (point, parameters, matches) in enumerate(zip(points, candidates, self.evaluate(candidates, workers))):
+            rounds = sum(match['rounds'] for match in matches)
+            fitness = 100 * sum(match['bankrolls']['candidate'] for match in matches) / rounds if rounds else None
+            self.archive({'type': 'candidate', 'generation': self.generation, 'candidate': i, 'parameters': parameters,
+                          'fitness': fitness, 'matches': {match['id']: match['bankrolls']['candidate'] for match in matches}})
+            if fitness is not None:
+                scored.append((fitness, point, parameters))
+        if scored:
+            scored.sort(key=lambda item: -item[0])
+            if self.best is None or scored[0][0] > self.best[0]:
+                self.best = (scored[0][0], scored[0][2])
+                with open(os.path.join(self.out, BEST_FILENAME), 'w') as best_file:
+                    json.dump(self.best[1], best_file, indent=4)
+            elite = scored[:max(len(scored) // 2, 1)]
+            weights = [math.log(len(elite) + 0.5) - math.log(rank + 1) for rank in range(len(elite))]
+            weights = [weight / sum(weights) for weight in weights]
+            old_mean = self.mean
+            self.mean = [sum(w * point[j] for w, (_, point, _) in zip(weights, elite)) for j in range(len(old_mean))]
+            spread = [math.sqrt(sum(w * (point[j] - old_mean[j]) ** 2 for w, (_, point, _) in zip(weights, elite)))
+                      for j in range(len(old_mean))]
+            self.sigma = [max((1 - SIGMA_LEARNING_RATE) * s + SIGMA_LEARNING_RATE * d, MIN_SIGMA)
+                          for s, d in zip(self.sigma, spread)]
+        self.archive({'type': 'state', 'generation': self.generation, 'mean': self.mean, 'sigma': self.sigma,
+                      'best_fitness': self.best[0] if self.best else None, 'best': self.best[1] if self.best else None,
+                      'generation_best': scored[0][0] if scored else None})
+        self.generation += 1
+        return scored
+
+
+def main():
+    '''
+    Runs the search from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 param_search.py')
+    parser.add_argument('--generations', type=int, default=GENERATIONS, help='Generations to run, counting resumed ones')
+    parser.add_argument('--population', type=int, default=POPULATION, help='Candidates per generation')
+    parser.add_argument('--opponents', nargs='+', default=OPPONENTS, help='Paths of the pokerbots to evaluate against')
+    parser.add_argument('--seeds', type=int, nargs='+', default=SEEDS, help='Seeds of the deals shared by every candidate')
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS, help='Rounds per match')
+    parser.add_argument('--seed', type=int, default=SEED, help='Seed of the search itself')
+    parser.add_argument('--workers', type=int, default=None, help='Matches to play at once')
+    parser.add_argument('--out', type=str, default=OUT_DIRECTORY, help='Directory for candidates, logs and the archive')
+    args = parser.parse_args()
+    search = Search(args.out, args.opponents, args.seeds, args.rounds, args.population, args.seed)
+    while search.generation < args.generations:
+        scored = search.step(args.workers)
+        print('generation {}: best {}, mean {}'.format(
+            search.generation - 1, '{:.1f}'.format(scored[0][0]) if scored else 'none', denormalize(search.mean)))
+    if search.best is not None:
+        print('best {:.1f} chips/100 rounds with {}'.format(*search.best))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,14 @@ from skeleton.states import GameState, TerminalState, RoundState, BoardState
 from skeleton.states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
 from skeleton.bot import Bot
 from skeleton.runner import parse_args, run_bot
+from skeleton.equity import monte_carlo_strength
+from skeleton.equity_cache import open_cache
+from skeleton.sizing import plan_actions
+from skeleton.search import search_actions, time_budget
 
-import eval7
 from constants import hand_to_strength
 
+MIN_SEARCH_BUDGET = 0.005  # seconds per decision below which the tree search is skipped
 
 
 class Player(Bot):
@@ -28,6 +32,7 @@ class Player(Bot):
         Nothing.
         '''
         self.board_allocations = [[], [], []]
+        self.equity_cache = open_cache() # shared across matches and bots, None without a usable file, see skeleton/equity_cache.py
 
     def allocate(self, cards): 
         card_ranks = [c[0] for c in cards]
@@ -81,6 +86,7 @@ class Player(Bot):
         iters: a integer that determines how many Monte Carlo samples to take
         '''
 
+        import eval7 #imported on first use rather than at the top, so the bot connects sooner
         deck = eval7.Deck() #eval7 object!
         hole_cards = [eval7.Card(card) for card in hole] #card objects, used to evaliate hands
 
@@ -169,6 +175,7 @@ class Player(Bot):
         net_upper_raise_bound = round_state.raise_bounds()[1] # max raise across 3 boards
         net_cost = 0 # keep track of the net additional amount you are spending across boards this round
         my_actions = [None] * NUM_BOARDS
+        equities = [0.] * NUM_BOARDS
 
         for i in range(NUM_BOARDS):
             print("bot reached street", street)
@@ -180,18 +187,15 @@ class Player(Bot):
                     my_actions[i] = CheckAction()
                 elif CallAction in legal_actions[i]:
                     my_actions[i] = CallAction()
-            else: 
-                #self.calculate_strength(self.board_allocations[i], board_cards, 100)
-                if RaiseAction(stacks[0]/3) in legal_actions[i]:
-                    my_actions[i] = RaiseAction(stacks[0]/3)
-                elif CallAction in legal_actions[i]:
-                    my_actions[i] = CallAction()
-                elif RaiseAction(stacks[0]) in legal_actions[i]:
-                    my_actions[i] = RaiseActions(stack[0])
-                elif CheckAction in legal_actions[i]:
-                    my_actions[i] = CheckAction()
+            elif isinstance(round_state.board_states[i], BoardState):
+                if self.equity_cache is not None:  # Monte Carlo only on a cache miss
+                    equities[i] = self.equity_cache.strength(self.board_allocations[i], board_cards[i], 100)
                 else:
-                    my_actions[i] = FoldAction()
+                    equities[i] = monte_carlo_strength(self.board_allocations[i], board_cards[i], 100)
+        if street >= 3 and time_budget(game_state) >= MIN_SEARCH_BUDGET:  # look ahead on each board within the game clock's budget
+            my_actions = search_actions(game_state, round_state, active, equities)
+        elif street >= 3:  # size bets on all boards together so they share our stack sensibly
+            my_actions, _ = plan_actions(round_state, active, equities)
 
         return my_actions
 
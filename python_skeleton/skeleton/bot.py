@@ -2,6 +2,7 @@ from constants import hand_to_strength
 '''
 This file contains the base class that you should implement for your pokerbot.
 '''
+from .actions import FoldAction, CheckAction, AssignAction
 
 
 class Bot():
@@ -9,6 +10,15 @@ class Bot():
     The base class for a pokerbot.
     '''
 
+    # When the runner enforces decision deadlines (--deadline), the time.perf_counter()
+    # value by which get_actions should return. The runner can not interrupt get_actions,
+    # so long computations must poll it and return once it has passed; a call which misses
+    # it is abandoned, and later callbacks wait for it or are skipped.
+    deadline = None
+    # When the runner passes states without history (--compact), the states.ActionLog of
+    # the actions taken so far in the round.
+    action_log = None
+
     def handle_new_round(self, game_state, round_state, active):
         '''
         Called when a new round starts. Called NUM_ROUNDS times.
@@ -51,3 +61,27 @@ class Bot():
         '''
         raise NotImplementedError('get_actions')
 
+    def fallback_actions(self, game_state, round_state, active):
+        '''
+        Called when get_actions misses the runner's deadline, to get the actions to send instead.
+        Override it to return the best actions found so far by a get_actions call still running.
+
+        Arguments:
+        game_state: the GameState object.
+        round_state: the RoundState object.
+        active: your player's index.
+
+        Returns:
+        Your actions, by default the safest legal action on each board: the hole cards in the
+        order dealt when assigning, and otherwise a check if possible or else a fold.
+        '''
+        hand = round_state.hands[active]
+        actions = []
+        for i, legal_actions in enumerate(round_state.legal_actions()):
+            if AssignAction in legal_actions:
+                actions.append(AssignAction(hand[2*i:2*i + 2]))
+            elif CheckAction in legal_actions:
+                actions.append(CheckAction())
+            else:
+                actions.append(FoldAction())
+        return actions
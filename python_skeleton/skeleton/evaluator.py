@@ -0,0 +1,335 @@
+'''
+Table-driven evaluator for five to seven card hands over compact integer cards.
+
+Cards are encoded as rank*4 + suit, as in skeleton/equity.py, and hand values are exactly
+the integers eval7.evaluate returns, so they compare and print (with eval7.handtype) the
+same way. Each card has a key packing a count of its suit into a 4 bit field per suit, and
+its rank as a power of 5, counting the six lowest and seven highest ranks in separate
+fields, so the sum of a hand's card keys holds its suit counts and its rank counts in base 5.
+Two tables are built on first use:
+    FLUSH_VALUES maps the 13 bit rank mask of a suit holding five or more cards to its best
+    flush or straight flush, which always beats the rest of a hand of seven cards or fewer,
+    RANK_VALUES maps the rank counts of every other hand to its value.
+A hand is then a sum of per-card keys and one or two lookups. evaluate_many runs the same
+lookups over a whole array of hands at once with NumPy when it is installed, through dense
+tables indexed by the high rank counts plus the position of the low rank counts among those
+with as many cards, and falls back to evaluate otherwise.
+
+The scalar evaluate runs in pure Python and is somewhat slower than the compiled
+eval7.evaluate, about 1.4us against 1.1us per seven card hand, so it only pays where cards
+are already integers. The speed is in evaluate_many, which values a NumPy array of seven
+card hands at about 100ns each, or about twice as fast as eval7 per hand when it first has
+to convert Python lists. The engine keeps eval7.evaluate for its showdowns.
+
+Set CROSS_CHECK = True to compare every value with eval7.evaluate and raise an
+AssertionError on the first disagreement, or run python3 -m skeleton.evaluator to
+cross-check random hands and time both evaluators.
+
+Building the tables takes over a second. A bot can load them from a snapshot file instead
+(see skeleton/snapshot.py), which passes them to install_tables as the export_tables
+arrays mapped from the file.
+'''
+import random
+import time
+from array import array
+
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+LOW_RANKS = 6  # ranks 2 to 7 are counted in the low field, 8 to A in the high field
+LOW_BITS = 14  # 5 ** 6 < 2 ** 14
+SUIT_SHIFT = 32
+RANK_MASK = (1 << SUIT_SHIFT) - 1
+LOW_MASK = (1 << LOW_BITS) - 1
+CARD_KEYS = [(1 << (SUIT_SHIFT + 4 * (card % 4))) |
+             (5 ** (card // 4) if card // 4 < LOW_RANKS else 5 ** (card // 4 - LOW_RANKS) << LOW_BITS) for card in range(52)]
+CROSS_CHECK = False
+TABLES_VERSION = 1  # bump whenever the layout or contents of the tables change
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+
+FLUSH_VALUES = None
+RANK_VALUES = None  # rank fields of the summed card keys -> value
+FLUSH_SUITS = None  # suit fields of the summed card keys -> the suit with five or more cards, or -1
+_dense_tables = None
+_installed_tables = None  # tables from install_tables, holding the NumPy tables of some hand sizes
+
+
+def _straight_top(mask):
+    '''
+    Returns the top rank of the highest straight in a rank mask, or -1.
+    '''
+    for top in range(12, 3, -1):
+        if (mask >> (top - 4)) & 0x1f == 0x1f:
+            return top
+    if mask & 0x100f == 0x100f:  # five high, with the ace low
+        return 3
+    return -1
+
+
+def _pack(hand_type, ranks):
+    '''
+    Packs a hand type and up to five ranks, most significant first, as eval7 does.
+    '''
+    value = hand_type << 24
+    for i, rank in enumerate(ranks):
+        value |= rank << (16 - 4 * i)
+    return value
+
+
+def _flush_value(mask):
+    '''
+    Returns the value of the best five card flush in a rank mask of five or more ranks.
+    '''
+    top = _straight_top(mask)
+    if top >= 0:
+        return _pack(STRAIGHT_FLUSH, [top])
+    return _pack(FLUSH, [rank for rank in range(12, -1, -1) if mask >> rank & 1][:5])
+
+
+def _rank_value(counts):
+    '''
+    Returns the value of the best hand without a flush given the count of each rank.
+    '''
+    ranks = [rank for rank in range(12, -1, -1) if counts[rank]]
+    quads = [rank for rank in ranks if counts[rank] == 4]
+    trips = [rank for rank in ranks if counts[rank] == 3]
+    pairs = [rank for rank in ranks if counts[rank] == 2]
+    if quads:
+        return _pack(QUADS, [quads[0], max(rank for rank in ranks if rank != quads[0])])
+    if trips and len(trips) + len(pairs) >= 2:
+        return _pack(FULL_HOUSE, [trips[0], max(rank for rank in trips[1:] + pairs)])
+    top = _straight_top(sum(1 << rank for rank in ranks))
+    if top >= 0:
+        return _pack(STRAIGHT, [top])
+    if trips:
+        return _pack(TRIPS, [trips[0]] + [rank for rank in ranks if rank != trips[0]][:2])
+    if len(pairs) >= 2:
+        return _pack(TWO_PAIR, pairs[:2] + [[rank for rank in ranks if rank not in pairs[:2]][0]])
+    if pairs:
+        return _pack(PAIR, pairs[:1] + [rank for rank in ranks if rank != pairs[0]][:3])
+    return _pack(HIGH_CARD, ranks[:5])
+
+
+def _rank_counts(num_cards, num_ranks):
+    '''
+    Yields every list of num_ranks counts, each at most 4, which sums to num_cards.
+    '''
+    if num_ranks == 1:
+        if num_cards <= 4:
+            yield [num_cards]
+        return
+    for count in range(min(num_cards, 4) + 1):
+        for rest in _rank_counts(num_cards - count, num_ranks - 1):
+            yield [count] + rest
+
+
+def _rank_key(counts):
+    '''
+    Returns the rank fields of the summed card keys of a hand with counts of each rank.
+    '''
+    low = sum(count * 5 ** rank for rank, count in enumerate(counts[:LOW_RANKS]))
+    high = sum(count * 5 ** rank for rank, count in enumerate(counts[LOW_RANKS:]))
+    return (high << LOW_BITS) | low
+
+
+def build_tables():
+    '''
+    Builds the lookup tables, which takes about a second, if they have not been built yet.
+    '''
+    global FLUSH_VALUES, RANK_VALUES, FLUSH_SUITS
+    if RANK_VALUES is not None:
+        return
+    FLUSH_VALUES = [_flush_value(mask) if bin(mask).count('1') >= 5 else 0 for mask in range(1 << 13)]
+    FLUSH_SUITS = [-1] * 0x8000
+    for suit_counts in range(0x8000):
+        for suit in range(4):
+            if (suit_counts >> (4 * suit)) & 0xf >= 5:
+                FLUSH_SUITS[suit_counts] = suit
+    rank_values = {}
+    for num_cards in (5, 6, 7):
+        for counts in _rank_counts(num_cards, 13):
+            rank_values[_rank_key(counts)] = _rank_value(counts)
+    RANK_VALUES = rank_values
+
+
+def export_tables(hand_sizes=(5, 6, 7)):
+    '''
+    Returns every table, including the NumPy ones for each hand size if NumPy is installed,
+    as a dict of name -> array.array for saving in a snapshot.
+    '''
+    build_tables()
+    rank_keys = sorted(RANK_VALUES)
+    tables = {'version': array('q', [TABLES_VERSION]), 'flush_values': array('q', FLUSH_VALUES),
+              'flush_suits': array('b', FLUSH_SUITS), 'rank_keys': array('q', rank_keys),
+              'rank_values': array('q', [RANK_VALUES[key] for key in rank_keys])}
+    for num_cards in hand_sizes:
+        dense = _numpy_tables(num_cards)
+        if dense is not None:
+            for name, table in zip(('bases', 'low_index', 'values'), dense[4:]):
+                tables['{}_{}'.format(name, num_cards)] = array('q', table.tolist())
+    return tables
+
+
+def install_tables(tables):
+    '''
+    Installs tables saved from export_tables, in place of building them.
+
+    Arguments:
+    tables: a dict of name -> sequence of ints, such as memoryviews of a snapshot file, which
+    must stay valid as long as the evaluator is used.
+    '''
+    global FLUSH_VALUES, RANK_VALUES, FLUSH_SUITS, _installed_tables
+    if tables['version'][0] != TABLES_VERSION:
+        raise ValueError('tables of version {} instead of {}'.format(tables['version'][0], TABLES_VERSION))
+    FLUSH_VALUES = tables['flush_values']
+    FLUSH_SUITS = tables['flush_suits']
+    RANK_VALUES = dict(zip(tables['rank_keys'], tables['rank_values']))
+    _installed_tables = tables
+
+
+def evaluate(cards):
+    '''
+    Returns the value of a hand of five to seven integer cards, as eval7.evaluate would.
+    '''
+    if RANK_VALUES is None:
+        build_tables()
+    key = 0
+    for card in cards:
+        key += CARD_KEYS[card]
+    suit = FLUSH_SUITS[key >> SUIT_SHIFT]
+    if suit >= 0:
+        mask = 0
+        for card in cards:
+            if card % 4 == suit:
+                mask |= 1 << (card // 4)
+        value = FLUSH_VALUES[mask]
+    else:
+        value = RANK_VALUES[key & RANK_MASK]
+    if CROSS_CHECK:
+        _cross_check(cards, value)
+    return value
+
+
+def evaluate_many(hands):
+    '''
+    Returns the values of many hands of the same number of cards.
+
+    Arguments:
+    hands: a NumPy integer array of shape (hands, cards), or any sequence of card lists.
+
+    Returns:
+    A NumPy int64 array of values if NumPy is installed, and a list otherwise.
+    '''
+    tables = _numpy_tables(len(hands[0]) if len(hands) else 5)
+    if tables is None:
+        return [evaluate(hand) for hand in hands]
+    numpy, card_keys, flush_suits, flush_values, bases, low_index, values = tables
+    hands = numpy.asarray(hands, dtype=numpy.intp)
+    keys = card_keys[hands].sum(axis=1)
+    result = values[bases[(keys & RANK_MASK) >> LOW_BITS] + low_index[keys & LOW_MASK]]
+    suits = flush_suits[keys >> SUIT_SHIFT]
+    flushes = numpy.flatnonzero(suits >= 0)
+    if len(flushes):
+        flush_hands = hands[flushes]
+        in_suit = (flush_hands % 4) == suits[flushes, None]
+        masks = numpy.where(in_suit, 1 << (flush_hands // 4), 0).sum(axis=1)
+        result[flushes] = flush_values[masks]
+    if CROSS_CHECK:
+        for hand, value in zip(hands.tolist(), result.tolist()):
+            _cross_check(hand, value)
+    return result
+
+
+def _numpy_tables(num_cards):
+    '''
+    Returns the NumPy tables for hands of num_cards cards, or None if NumPy is not installed.
+    '''
+    global _dense_tables
+    if _dense_tables is None:
+        try:
+            import numpy
+        except ImportError:
+            _dense_tables = False
+        else:
+            build_tables()
+            _dense_tables = {None: numpy}
+    if _dense_tables is False:
+        return None
+    if num_cards not in _dense_tables and _installed_tables is not None and 'values_{}'.format(num_cards) in _installed_tables:
+        numpy = _dense_tables[None]
+        bases, low_index, values = (numpy.frombuffer(_installed_tables['{}_{}'.format(name, num_cards)], dtype=numpy.int64)
+                                    for name in ('bases', 'low_index', 'values'))
+        _dense_tables[num_cards] = (numpy, numpy.array(CARD_KEYS, dtype=numpy.int64), numpy.array(FLUSH_SUITS, dtype=numpy.intp),
+                                    numpy.array(FLUSH_VALUES, dtype=numpy.int64), bases.astype(numpy.intp, copy=False),
+                                    low_index.astype(numpy.intp, copy=False), values)
+    if num_cards not in _dense_tables:
+        numpy = _dense_tables[None]
+        # number the low rank counts among those with the same number of cards
+        low_index = numpy.zeros(5 ** LOW_RANKS, dtype=numpy.intp)
+        low_keys = {}  # number of cards -> low rank fields in order
+        for low_cards in range(num_cards + 1):
+            low_keys[low_cards] = [_rank_key(counts) for counts in _rank_counts(low_cards, LOW_RANKS)]
+            low_index[low_keys[low_cards]] = numpy.arange(len(low_keys[low_cards]))
+        # lay out a block of values per high rank count, one per low rank count completing the hand
+        bases = numpy.zeros(5 ** (13 - LOW_RANKS), dtype=numpy.intp)
+        values = []
+        for high_cards in range(num_cards + 1):
+            for counts in _rank_counts(high_cards, 13 - LOW_RANKS):
+                high_key = _rank_key([0] * LOW_RANKS + counts)
+                bases[high_key >> LOW_BITS] = len(values)
+                values.extend(RANK_VALUES.get(high_key | low_key, 0) for low_key in low_keys[num_cards - high_cards])
+        _dense_tables[num_cards] = (numpy, numpy.array(CARD_KEYS, dtype=numpy.int64), numpy.array(FLUSH_SUITS, dtype=numpy.intp),
+                                    numpy.array(FLUSH_VALUES, dtype=numpy.int64), bases, low_index,
+                                    numpy.array(values, dtype=numpy.int64))
+    return _dense_tables[num_cards]
+
+
+def _card_name(card):
+    '''
+    Decodes an integer card into a card string such as 'Ah'.
+    '''
+    return RANKS[card // 4] + SUITS[card % 4]
+
+
+def _cross_check(cards, value):
+    '''
+    Raises an AssertionError if eval7 values a hand differently.
+    '''
+    import eval7
+    expected = eval7.evaluate([eval7.Card(_card_name(card)) for card in cards])
+    assert value == expected, 'evaluator gives {} for {} but eval7 gives {}'.format(
+        value, [_card_name(card) for card in cards], expected)
+
+
+def cross_check(num_hands=100000, seed=0):
+    '''
+    Compares the evaluator with eval7 on random hands of five, six and seven cards, and
+    times both.
+
+    Returns:
+    Lines describing the comparison and the timings.
+    '''
+    import eval7
+    rng = random.Random(seed)
+    lines = []
+    for num_cards in (5, 6, 7):
+        hands = [rng.sample(range(52), num_cards) for _ in range(num_hands)]
+        eval7_hands = [[eval7.Card(_card_name(card)) for card in hand] for hand in hands]
+        start = time.perf_counter()
+        expected = [eval7.evaluate(hand) for hand in eval7_hands]
+        eval7_time = time.perf_counter() - start
+        build_tables()
+        start = time.perf_counter()
+        scalar = [evaluate(hand) for hand in hands]
+        scalar_time = time.perf_counter() - start
+        evaluate_many(hands[:1])  # build the tables for this number of cards outside the timing
+        start = time.perf_counter()
+        batch = list(evaluate_many(hands))
+        batch_time = time.perf_counter() - start
+        mismatches = sum(1 for a, b, c in zip(expected, scalar, batch) if not a == b == c)
+        lines.append('{} cards: {} mismatches in {} hands; eval7 {:.0f}ns, evaluate {:.0f}ns, evaluate_many {:.0f}ns per hand'.format(
+            num_cards, mismatches, num_hands, 1e9 * eval7_time / num_hands, 1e9 * scalar_time / num_hands, 1e9 * batch_time / num_hands))
+    return lines
+
+
+if __name__ == '__main__':
+    print('\n'.join(cross_check()))
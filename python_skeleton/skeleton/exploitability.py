@@ -0,0 +1,417 @@
+'''
+Approximate best-response exploitability of a pokerbot, driven in-process.
+
+The bot plays sampled deals against a best responder which contests one board at a time.
+The responder folds every other board at its first chance, so each board is an abstract
+heads-up game. The responder raises only by the BET_FRACTIONS of the pot, at most
+MAX_RAISES times a street. It knows its own hole cards only through the bucket of its
+equity on the board so far, and sees every action. Deals are dealt like the engine deals
+them, with each board's runout drawn from its own shuffle of the cards left after the
+hole cards, and each deal is played with the bot in both seats.
+
+For every deal, board and seat, the whole tree of the responder's abstract actions is
+played against the bot's get_actions, with the bot's state restored between lines. This
+is the expensive part, and it runs in parallel over the deals. Every line ends in a fold
+or an exact showdown. The best response is then read off the recorded trees. At each of
+the responder's information sets, which are the betting history together with the
+buckets seen so far, it picks the action with the most chips summed over the deals that
+reach that set. Equities for the buckets are cached per process by canonical (hole, board)
+key, and sampled with a generator seeded by the key, so they leave the random draws of the
+bot alone and do not depend on which deals a process played before.
+
+The exploitability is the responder's average winnings in chips per board and per round
+of three boards. Picking the best action per sampled information set overfits to the
+deals, so the responder is fit on half of the deals and valued on the other half, where
+information sets it never saw fall back to checking or calling. Both numbers are printed:
+the held out one is a conservative estimate, and the fitted one is biased up. Restricting
+the responder to one board and a few sizes also biases both down. It is an approximation
+for comparing bot versions on the same deals rather than an exact value.
+
+Only handle_new_round and get_actions are called. Bot attributes which are lists, dicts
+or sets are copied between lines, and other attributes, such as open files, are shared.
+
+Run from a pokerbot's directory with
+    python3 -m skeleton.exploitability player:Player [--deals 50] [--workers N]
+'''
+import argparse
+import copy
+import importlib
+import multiprocessing
+import random
+import time
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction, AssignAction
+from .states import GameState, TerminalState, RoundState, BoardState
+from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
+from .runner import parse_multi_code
+from .search import TreeSearch
+from .equity import canonical_key, card_to_int, int_to_card, stratified_strength
+from .evaluator import evaluate
+
+BET_FRACTIONS = [0.5, 1.0]  # the responder's raise sizes as fractions of the pot after calling
+MAX_RAISES = 1  # responder raises per street
+NUM_EQUITY_BUCKETS = 5
+EQUITY_ITERS = 200
+NUM_DEALS = 200
+SEED = 0
+GAME_CLOCK = 30.
+
+_bot = None  # the bot of a worker process
+_equities = {}  # canonical key -> equity, per process
+
+
+def load_bot(spec):
+    '''
+    Instantiates the bot class named by a 'module:Class' spec.
+    '''
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)()
+
+
+def deal(seed):
+    '''
+    Deals integer hole cards for both seats and a five card runout per board, like the engine.
+    '''
+    rng = random.Random(seed)
+    deck = list(range(52))
+    rng.shuffle(deck)
+    holes = [deck[:2 * NUM_BOARDS], deck[2 * NUM_BOARDS:4 * NUM_BOARDS]]
+    runouts = []
+    for _ in range(NUM_BOARDS):
+        rest = deck[4 * NUM_BOARDS:]
+        rng.shuffle(rest)
+        runouts.append(rest[:5])
+    return holes, runouts
+
+
+def encode(actions):
+    '''
+    Encodes actions the way Runner.send does.
+    '''
+    codes = []
+    for i, action in enumerate(actions):
+        if isinstance(action, AssignAction):
+            codes.append(str(i+1) + 'A' + ','.join(action.cards))
+        elif isinstance(action, FoldAction):
+            codes.append(str(i+1) + 'F')
+        elif isinstance(action, CallAction):
+            codes.append(str(i+1) + 'C')
+        elif isinstance(action, CheckAction):
+            codes.append(str(i+1) + 'K')
+        else:
+            codes.append(str(i+1) + 'R' + str(action.amount))
+    return ';'.join(codes)
+
+
+def legalize(round_state, actions, hand):
+    '''
+    Replaces illegal actions the way the engine does, keeping the dealt order for an
+    illegal assignment.
+    '''
+    legal_actions = round_state.legal_actions()
+    if AssignAction in legal_actions[0]:
+        if (all(isinstance(action, AssignAction) for action in actions) and
+                sorted(card for action in actions for card in action.cards) == sorted(hand)):
+            return list(actions)
+        return [AssignAction(hand[2*i:2*i + 2]) for i in range(NUM_BOARDS)]
+    defaults = [CheckAction() if CheckAction in legal else FoldAction() for legal in legal_actions]
+    checked = []
+    for i, (action, legal) in enumerate(zip(actions, legal_actions)):
+        board_state = round_state.board_states[i]
+        if type(action) not in legal:
+            action = defaults[i]
+        elif isinstance(action, RaiseAction):
+            min_raise, max_raise = board_state.raise_bounds(round_state.button, round_state.stacks)
+            if not min_raise <= action.amount <= max_raise:
+                action = defaults[i]
+        checked.append(action)
+    total_raise = sum(action.amount for action in checked if isinstance(action, RaiseAction))
+    if not total_raise <= round_state.raise_bounds()[1]:
+        return defaults
+    return checked
+
+
+def equity_bucket(hole, board):
+    '''
+    Returns the bucket of a hole's equity against a random hand, caching equities.
+
+    The equity is sampled with its own generator, seeded by the key, since drawing from the
+    shared random module would shift the bot's draws by whether the key was already cached.
+    '''
+    hole = [int_to_card(card) for card in hole]
+    board = [int_to_card(card) for card in board]
+    key = canonical_key(hole, board)
+    equity = _equities.get(key)
+    if equity is None:
+        equity = _equities[key] = stratified_strength(hole, board, EQUITY_ITERS, rng=random.Random(key))[0]
+    return min(int(equity * NUM_EQUITY_BUCKETS), NUM_EQUITY_BUCKETS - 1)
+
+
+def snapshot(bot):
+    '''
+    Copies the bot's attributes, copying lists, dicts and sets one level deep.
+    '''
+    return {name: copy.copy(value) if isinstance(value, (list, dict, set)) else value
+            for name, value in vars(bot).items()}
+
+
+def restore(bot, state):
+    '''
+    Restores attributes saved by snapshot, leaving the snapshot reusable.
+    '''
+    bot.__dict__.clear()
+    bot.__dict__.update((name, copy.copy(value) if isinstance(value, (list, dict, set)) else value)
+                        for name, value in state.items())
+
+
+class Line():
+    '''
+    Plays the tree of the responder's abstract actions against the bot for one deal,
+    board and seat, recording each node of the tree.
+    '''
+
+    def __init__(self, bot, holes, runouts, board, me):
+        '''
+        Arguments:
+        bot: the bot, which plays seat 1 - me.
+        holes: the integer hole cards of both seats.
+        runouts: the five integer runout cards of each board.
+        board: the index of the board the responder contests.
+        me: the responder's seat.
+        '''
+        self.bot = bot
+        self.holes = holes
+        self.runouts = runouts
+        self.board = board
+        self.me = me
+        self.hand = [int_to_card(card) for card in holes[1-me]]
+        self.bot_hole = None  # the bot's integer hole cards on the contested board, once assigned
+        self.game_state = GameState(0, 0, GAME_CLOCK, 1)
+        self.tree = {}  # history -> ('bot', code), ('us', bucket, codes) or ('end', chips)
+        self.search = TreeSearch(me, 0., BET_FRACTIONS)
+
+    def play(self):
+        '''
+        Starts the round from the bot's point of view as the Runner does, and plays every line.
+
+        Returns:
+        The recorded tree.
+        '''
+        bot_seat = 1 - self.me
+        hands = [[], []]
+        hands[bot_seat] = self.hand
+        hands[self.me] = [''] * (2 * NUM_BOARDS)
+        pips = [SMALL_BLIND, BIG_BLIND]
+        board_states = [BoardState((i+1)*BIG_BLIND, pips, [[]]*2, [''] * 5, None) for i in range(NUM_BOARDS)]
+        stacks = [STARTING_STACK - NUM_BOARDS*SMALL_BLIND, STARTING_STACK - NUM_BOARDS*BIG_BLIND]
+        round_state = RoundState(-2, 0, stacks, hands, board_states, None)
+        self.bot.handle_new_round(self.game_state, round_state, bot_seat)
+        self.explore(round_state, (), pips[self.me], 0)
+        return self.tree
+
+    def payoff(self, board_state, invested):
+        '''
+        Returns the responder's net chips on its board once the board is over.
+        '''
+        if isinstance(board_state, TerminalState) and sum(board_state.deltas) > 0:  # someone folded
+            return board_state.deltas[self.me] - invested
+        pot = board_state.previous_state.pot if isinstance(board_state, TerminalState) else board_state.pot + sum(board_state.pips)
+        ours = evaluate(self.holes[self.me][2*self.board:2*self.board + 2] + self.runouts[self.board])
+        theirs = evaluate(self.bot_hole + self.runouts[self.board])
+        share = 1. if ours > theirs else 0.5 if ours == theirs else 0.
+        return share * pot - invested
+
+    def our_actions(self, round_state):
+        '''
+        Returns the responder's abstract actions on its board, with every other board folded
+        or checked, as lists of actions.
+        '''
+        legal_actions = round_state.legal_actions()
+        if AssignAction in legal_actions[0]:
+            return [[AssignAction(['', ''])] * NUM_BOARDS]
+        others = [FoldAction() if FoldAction in legal else CheckAction() for legal in legal_actions]
+        board_state = round_state.board_states[self.board]
+        if not isinstance(board_state, BoardState):
+            return [others]
+        choices = self.search.abstract_actions(board_state, round_state.button, round_state.stacks)
+        lines = []
+        for choice in choices:
+            actions = list(others)
+            actions[self.board] = choice
+            lines.append(actions)
+        return lines
+
+    def explore(self, round_state, history, invested, raises):
+        '''
+        Records the node at history and plays every line below it.
+
+        Arguments:
+        round_state: the state from the bot's point of view.
+        history: the codes of the actions so far.
+        invested: the chips the responder has put on its board.
+        raises: the responder's raises this street.
+        '''
+        board_state = (round_state.previous_state.board_states[self.board] if isinstance(round_state, TerminalState)
+                       else round_state.board_states[self.board])
+        if isinstance(board_state, TerminalState) or isinstance(round_state, TerminalState):
+            self.tree[history] = ('end', self.payoff(board_state, invested))
+            return
+        active = round_state.button % 2
+        if active != self.me:
+            actions = self.bot.get_actions(self.game_state, round_state, active)
+            actions = legalize(round_state, actions, self.hand)
+            if isinstance(actions[self.board], AssignAction):
+                self.bot_hole = [card_to_int(card) for card in actions[self.board].cards]
+                code = encode([AssignAction([])] * NUM_BOARDS)  # the responder does not see the cards
+            else:
+                code = encode(actions)
+            self.tree[history] = ('bot', code)
+            self.advance(round_state, actions, history + (code,), invested, raises)
+            return
+        lines = self.our_actions(round_state)
+        if raises >= MAX_RAISES and len(lines) > 1:
+            lines = [actions for actions in lines if not isinstance(actions[self.board], RaiseAction)]
+        codes = [encode(actions) for actions in lines]
+        street = round_state.street
+        board = self.runouts[self.board][:street] if street > 0 else []
+        bucket = equity_bucket(self.holes[self.me][2*self.board:2*self.board + 2], board) if round_state.button >= 0 else None
+        self.tree[history] = ('us', bucket, codes)
+        state = snapshot(self.bot) if len(lines) > 1 else None
+        for actions, code in zip(lines, codes):
+            if state is not None:
+                restore(self.bot, state)
+            board_state = round_state.board_states[self.board]
+            contribution = 0
+            if isinstance(board_state, BoardState) and not isinstance(actions[self.board], AssignAction):
+                next_state = board_state.proceed(actions[self.board], round_state.button, street)
+                if isinstance(next_state, BoardState):
+                    contribution = next_state.pips[self.me] - board_state.pips[self.me]
+            self.advance(round_state, actions, history + (code,), invested + contribution,
+                         raises + isinstance(actions[self.board], RaiseAction))
+
+    def advance(self, round_state, actions, history, invested, raises):
+        '''
+        Applies the active player's actions, deals the next street's cards if it starts, and
+        explores from there.
+        '''
+        next_state = round_state.proceed(actions)
+        if isinstance(next_state, RoundState) and next_state.street != round_state.street:
+            clause = ';'.join(str(i+1) + 'B' + ','.join(int_to_card(card) for card in runout[:next_state.street])
+                              for i, runout in enumerate(self.runouts))
+            next_state = parse_multi_code(clause, next_state, 1 - self.me)
+            raises = 0
+        self.explore(next_state, history, invested, raises)
+
+
+def _play_deals(job):
+    '''
+    Plays every board and seat of some deals in a worker process, returning their trees.
+    '''
+    bot_spec, seeds = job
+    global _bot
+    if _bot is None:
+        _bot = load_bot(bot_spec)
+    trees = []
+    for seed in seeds:
+        holes, runouts = deal(seed)
+        for board in range(NUM_BOARDS):
+            for me in range(2):
+                random.seed(seed)  # the same draws for bots which play randomly
+                trees.append(((board, me), seed, Line(_bot, holes, runouts, board, me).play()))
+    return trees
+
+
+def best_response(trees, history=(), buckets=(), policy=None):
+    '''
+    Returns the responder's total chips over the trees, choosing the best action at each
+    of its information sets, and stores the choices in policy if it is given.
+    '''
+    node = trees[0][history]
+    if node[0] == 'end':
+        return sum(tree[history][1] for tree in trees)
+    groups = {}
+    for tree in trees:
+        groups.setdefault(tree[history][1], []).append(tree)
+    if node[0] == 'bot':
+        return sum(best_response(group, history + (code,), buckets, policy) for code, group in groups.items())
+    total = 0.
+    for bucket, group in groups.items():
+        values = [best_response(group, history + (code,), buckets + (bucket,), policy) for code in node[2]]
+        best = max(range(len(values)), key=values.__getitem__)
+        if policy is not None:
+            policy[(history, buckets + (bucket,))] = node[2][best]
+        total += values[best]
+    return total
+
+
+def policy_value(trees, policy, board, history=(), buckets=()):
+    '''
+    Returns the responder's total chips over the trees when it follows a policy from
+    best_response, checking or calling at information sets the policy never saw.
+    '''
+    node = trees[0][history]
+    if node[0] == 'end':
+        return sum(tree[history][1] for tree in trees)
+    groups = {}
+    for tree in trees:
+        groups.setdefault(tree[history][1], []).append(tree)
+    if node[0] == 'bot':
+        return sum(policy_value(group, policy, board, history + (code,), buckets) for code, group in groups.items())
+    total = 0.
+    for bucket, group in groups.items():
+        passive = [code for code in node[2] if code.split(';')[board][1] in 'AKC']
+        code = policy.get((history, buckets + (bucket,)), passive[0] if passive else node[2][0])
+        total += policy_value(group, policy, board, history + (code,), buckets + (bucket,))
+    return total
+
+
+def exploitability(bot_spec, num_deals=NUM_DEALS, seed=SEED, workers=None):
+    '''
+    Computes the best response's winnings against a bot.
+
+    The best response is fit on every other deal and also valued on the deals it was not fit
+    on, which removes the bias of fitting it to the deals and leaves a conservative value.
+
+    Returns:
+    A tuple of the held out and the fitted winnings, each a tuple of the chips per board for
+    each board and per round of NUM_BOARDS boards.
+    '''
+    seeds = [seed * 1000003 + i for i in range(num_deals)]
+    num_chunks = min(4 * (workers or multiprocessing.cpu_count()), num_deals)
+    chunks = [(bot_spec, seeds[i::num_chunks]) for i in range(num_chunks)]
+    trees = {}  # (board, responder's seat, whether the deal is held out) -> trees
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.imap_unordered(_play_deals, chunks):
+            for (board, me), deal_seed, tree in chunk:
+                trees.setdefault((board, me, deal_seed % 2), []).append(tree)
+    held_out = [0.] * NUM_BOARDS
+    fitted = [0.] * NUM_BOARDS
+    # the seats are separate games, so the responder's information sets never span both
+    for (board, me, test), games in trees.items():
+        if not test:
+            policy = {}
+            fitted[board] += best_response(games, policy=policy) / len(games) / 2
+            if (board, me, 1) in trees:
+                held_out[board] += policy_value(trees[(board, me, 1)], policy, board) / len(trees[(board, me, 1)]) / 2
+    return (held_out, sum(held_out)), (fitted, sum(fitted))
+
+
+def main():
+    '''
+    Prints a bot's exploitability from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 -m skeleton.exploitability')
+    parser.add_argument('bot', type=str, help='The bot class as module:Class, e.g. player:Player')
+    parser.add_argument('--deals', type=int, default=NUM_DEALS, help='Deals to play, each on every board in both seats, half of them held out')
+    parser.add_argument('--seed', type=int, default=SEED, help='Seed of the deals')
+    parser.add_argument('--workers', type=int, default=None, help='Processes to play deals in')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    (held_out, per_round), (fitted, fitted_per_round) = exploitability(args.bot, args.deals, args.seed, args.workers)
+    for i, (value, fitted_value) in enumerate(zip(held_out, fitted)):
+        print('board {}: {:.2f} chips held out, {:.2f} fitted'.format(i + 1, value, fitted_value))
+    print('exploitability: {:.2f} chips per round held out, {:.2f} fitted ({:.0f}s)'.format(
+        per_round, fitted_per_round, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+'''
+Opt-in profiling of the pokerbot callbacks called by the Runner.
+
+Every callback is timed with perf_counter and aggregated by callback and street. The game
+clock reported by the engine is tracked to attribute the clock burned by each response to
+its street. Calls which run longer than a threshold are profiled by a sampler thread which
+only wakes up once a call has exceeded the threshold, so fast calls cost next to nothing.
+The summary is printed, and so written to the pokerbot's log, when the game ends.
+
+Enable it by adding --profile (and optionally --profile-threshold SECONDS) to the run
+command in commands.json, before the port which the engine appends.
+'''
+import sys
+import threading
+import time
+from collections import Counter
+
+STREET_NAMES = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+THRESHOLD = 0.05  # seconds
+SAMPLE_INTERVAL = 0.001  # seconds
+MAX_SLOW_CALLS = 10
+STACK_DEPTH = 8
+
+
+class CallbackProfiler():
+    '''
+    Collects timings, game clock usage and stack samples of slow calls.
+    '''
+
+    def __init__(self, threshold=THRESHOLD, interval=SAMPLE_INTERVAL, max_slow_calls=MAX_SLOW_CALLS):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_slow_calls = max_slow_calls
+        self.timings = {}  # (callback, street) -> [calls, total seconds, max seconds]
+        self.clock_burn = Counter()  # street -> seconds of game clock
+        self.slow_calls = []  # the slowest (callback, street, seconds, stack samples)
+        self.last_label = None
+        self.last_clock = None
+        self.call = None
+        self.call_start = 0.
+        self.token = 0  # identifies the current call, so a call the runner abandoned can not stop a later one
+        self.samples = Counter()
+        self.thread_id = threading.get_ident()
+        self.call_started = threading.Event()
+        self.call_ended = threading.Event()
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        '''
+        Samples the calling thread's stack during calls which exceed the threshold.
+        '''
+        while True:
+            self.call_started.wait()
+            if self.call_ended.wait(self.threshold):
+                continue
+            samples = self.samples
+            while not self.call_ended.wait(self.interval):
+                frame = sys._current_frames().get(self.thread_id)
+                stack = []
+                while frame is not None and len(stack) < STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append('{}:{} {}'.format(code.co_filename.split('/')[-1], frame.f_lineno, code.co_name))
+                    frame = frame.f_back
+                if not self.call_ended.is_set():  # the call may have ended while we sampled
+                    samples[tuple(stack)] += 1
+
+    def start(self, callback, street):
+        '''
+        Marks the start of a callback on a street.
+
+        Returns:
+        The token to pass to stop when the call ends.
+        '''
+        self.token += 1
+        self.call = (callback, STREET_NAMES.get(street, str(street)))
+        self.thread_id = threading.get_ident()  # the runner's watchdog calls from a worker thread
+        self.samples = Counter()
+        self.call_ended.clear()
+        self.call_start = time.perf_counter()
+        self.call_started.set()
+        return self.token
+
+    def stop(self, token):
+        '''
+        Marks the end of the callback which start returned token for, ignoring it if another
+        call has started since.
+        '''
+        if token != self.token:
+            return
+        elapsed = time.perf_counter() - self.call_start
+        self.call_started.clear()
+        self.call_ended.set()
+        timing = self.timings.setdefault(self.call, [0, 0., 0.])
+        timing[0] += 1
+        timing[1] += elapsed
+        timing[2] = max(timing[2], elapsed)
+        if elapsed > self.threshold:  # keep the slowest calls
+            self.slow_calls.append(self.call + (elapsed, self.samples))
+            if len(self.slow_calls) > self.max_slow_calls:
+                self.slow_calls.remove(min(self.slow_calls, key=lambda call: call[2]))
+
+    def responded(self, street):
+        '''
+        Marks that a response for a street, or an ack if street is None, was sent.
+        '''
+        self.last_label = 'ack' if street is None else STREET_NAMES.get(street, str(street))
+
+    def clock(self, game_clock):
+        '''
+        Records the game clock sent by the engine, charging the clock burned to the last response.
+        '''
+        if self.last_clock is not None and self.last_label is not None:
+            self.clock_burn[self.last_label] += self.last_clock - game_clock
+        self.last_clock = game_clock
+
+    def summary(self):
+        '''
+        Returns the profile as a printable string.
+        '''
+        lines = ['Callback profile:']
+        for (callback, street), (calls, total, longest) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            lines.append('  {} on {}: {} calls, {:.4f}s total, {:.2f}ms mean, {:.2f}ms max'.format(
+                callback, street, calls, total, 1000 * total / calls, 1000 * longest))
+        lines.append('Game clock used: ' + ', '.join('{} {:.4f}s'.format(label, burn) for label, burn in self.clock_burn.most_common()))
+        for callback, street, elapsed, samples in sorted(self.slow_calls, key=lambda call: -call[2]):
+            lines.append('Slow call: {} on {} took {:.2f}ms'.format(callback, street, 1000 * elapsed))
+            for stack, count in samples.most_common(3):
+                lines.append('  {} samples: {}'.format(count, ' <- '.join(stack)))
+        return '\n'.join(lines)
@@ -0,0 +1,113 @@
+'''
+Chooses actions on all boards jointly, so that the shared stack goes where it earns the most.
+
+Each board contributes a few candidate actions, with raises drawn from a grid of pot
+fractions and clipped to the board's raise bounds. The search picks one candidate per
+board, maximizing the summed expected value while the chips committed stay within our
+stack and the summed raise amounts stay within RoundState.raise_bounds, which is what
+the engine enforces across boards.
+'''
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction, AssignAction
+from .states import BoardState
+
+POT_FRACTIONS = [0.5, 1.0, 2.0]  # raise sizes as fractions of the pot after calling
+FOLD_SCALE = 0.5
+
+
+def fold_probability(pot, bet):
+    '''
+    A simple opponent model: the chance that the opponent folds to a bet of size bet into pot.
+    '''
+    return FOLD_SCALE * bet / (pot + bet)
+
+
+def board_options(board_state, button, stacks, equity, pot_fractions=POT_FRACTIONS, fold_model=fold_probability):
+    '''
+    Lists the candidate actions on one board with their costs and expected values.
+
+    Arguments:
+    board_state: the BoardState or TerminalState of the board.
+    button: the RoundState's button.
+    stacks: the RoundState's stacks.
+    equity: our probability of winning the board at showdown.
+    pot_fractions: the grid of raise sizes as fractions of the pot after calling.
+    fold_model: a function of (pot, bet) returning the opponent's fold probability.
+
+    Returns:
+    A list of tuples (action, cost, raise amount, expected value), where cost is the number
+    of chips the action takes from our stack and the expected value counts the chips we end
+    the board with from its pot, minus the cost.
+    '''
+    if not isinstance(board_state, BoardState):
+        return [(CheckAction(), 0, 0, 0.)]
+    legal_actions = board_state.legal_actions(button, stacks)
+    active = button % 2
+    if AssignAction in legal_actions:
+        raise ValueError('cards must be assigned before sizing bets')
+    if board_state.settled:
+        return [(CheckAction(), 0, 0, 0.)]
+    pot = board_state.pot + sum(board_state.pips)
+    my_pip = board_state.pips[active]
+    opp_pip = board_state.pips[1-active]
+    continue_cost = opp_pip - my_pip
+    options = []
+    if FoldAction in legal_actions:
+        options.append((FoldAction(), 0, 0, 0.))
+    if CheckAction in legal_actions:
+        options.append((CheckAction(), 0, 0, equity * pot))
+    if CallAction in legal_actions:
+        options.append((CallAction(), continue_cost, 0, equity * (pot + continue_cost) - continue_cost))
+    if RaiseAction in legal_actions:
+        min_raise, max_raise = board_state.raise_bounds(button, stacks)
+        amounts = set()
+        for fraction in pot_fractions:
+            amount = int(opp_pip + fraction * (pot + continue_cost))
+            amounts.add(min(max(amount, min_raise), max_raise))
+        for amount in sorted(amounts):
+            cost = amount - my_pip
+            bet = amount - opp_pip  # what the opponent must add to continue
+            fold = fold_model(pot, bet)
+            called = equity * (pot + cost + bet) - cost
+            options.append((RaiseAction(amount), cost, amount, fold * pot + (1 - fold) * called))
+    return options
+
+
+def plan_actions(round_state, active, equities, pot_fractions=POT_FRACTIONS, fold_model=fold_probability):
+    '''
+    Chooses one action per board, maximizing total expected value under the net raise constraint.
+
+    Arguments:
+    round_state: the RoundState object, after cards have been assigned.
+    active: your player's index.
+    equities: our probability of winning each board at showdown.
+    pot_fractions: the grid of raise sizes as fractions of the pot after calling.
+    fold_model: a function of (pot, bet) returning the opponent's fold probability.
+
+    Returns:
+    A tuple (actions, expected value).
+    '''
+    options = [board_options(round_state.board_states[i], round_state.button, round_state.stacks,
+                             equities[i], pot_fractions, fold_model) for i in range(len(round_state.board_states))]
+    budget = round_state.stacks[active]
+    max_raise = round_state.raise_bounds()[1]
+    memo = {}
+
+    def search(i, spent, raised):
+        # best (value, choices) over boards i onwards given what earlier boards committed
+        if i == len(options):
+            return 0., ()
+        key = (i, spent, raised)
+        if key not in memo:
+            best = None
+            for k, (_, cost, amount, value) in enumerate(options[i]):
+                if spent + cost > budget or raised + amount > max_raise:
+                    continue
+                rest_value, rest = search(i + 1, spent + cost, raised + amount)
+                if best is None or value + rest_value > best[0]:
+                    best = (value + rest_value, (k,) + rest)
+            memo[key] = best
+        return memo[key]
+
+    # every board offers a free check or fold, so some plan is always feasible
+    value, choices = search(0, 0, 0)
+    return [options[i][k][0] for i, k in enumerate(choices)], value
@@ -0,0 +1,28 @@
+strengths = [
+    #A	 K	 Q	 J	 T	 9	 8	 7	 6	 5	 4 	 3	 2
+	[85, 68, 67, 66, 66, 64, 63, 63, 62, 62, 61, 60, 59], 
+	[66, 83, 64, 64, 63, 61, 60, 59, 58, 58, 57, 56, 55], 
+	[65, 62, 80, 61, 61, 59, 58, 56, 55, 55, 54, 53, 52], 
+	[65, 62, 59, 78, 59, 57, 56, 54, 53, 52, 51, 50, 50], 
+	[64, 61, 59, 57, 75, 56, 54, 53, 51, 49, 49, 48, 47], 
+	[62, 59, 57, 55, 53, 72, 53, 51, 50, 48, 46, 46, 45], 
+	[61, 58, 55, 53, 52, 50, 69, 50, 49, 47, 45, 43, 43], 
+	[60, 57, 54, 52, 50, 48, 47, 67, 48, 46, 45, 43, 41], 
+	[59, 56, 53, 50, 48, 47, 46, 45, 64, 46, 44, 42, 40], 
+	[60, 55, 52, 49, 47, 45, 44, 43, 43, 61, 44, 43, 41], 
+	[59, 54, 51, 48, 46, 43, 42, 41, 41, 41, 58, 42, 40], 
+	[58, 54, 50, 48, 45, 43, 40, 39, 39, 39, 38, 55, 39], 
+	[57, 53, 49, 47, 44, 42, 40, 37, 37, 37, 36, 35, 51]
+]
+
+char_to_ord = dict(zip(list("23456789TJQKA"), list(range(0, 13))))
+MAX_ORD = 12
+
+def hand_to_strength(card1, card2): 
+    #my table is assymetric and I don't know why 
+    idxes = [MAX_ORD - char_to_ord[card1], MAX_ORD - char_to_ord[card2]]
+    #only use one half of my assymetric table
+    idxes = sorted(idxes)
+    return strengths[idxes[0]][idxes[1]]
+
+
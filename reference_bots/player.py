@@ -0,0 +1,192 @@
+'''
+Cheap reference pokerbots for benchmarking, written in Python.
+
+Every subdirectory of reference_bots is a pokerbot directory whose commands.json runs this
+file with the name of one of the bots in REFERENCE_BOTS, so the engine and gauntlet.py can
+play against each bot by its path, e.g. reference_bots/calling_station.
+'''
+from skeleton.actions import FoldAction, CallAction, CheckAction, RaiseAction, AssignAction
+from skeleton.states import GameState, TerminalState, RoundState, BoardState
+from skeleton.states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
+from skeleton.bot import Bot
+from skeleton.runner import parse_args, run_bot
+from skeleton.equity import monte_carlo_strength
+from skeleton.equity_cache import open_cache
+
+import random
+import sys
+from constants import hand_to_strength
+
+SEED = 0
+POT_ODDS_ITERS = 100
+RAISE_EQUITY = 0.75  # equity above which the pot odds bot bets the pot
+TIGHT_STRENGTH = 64  # preflop table strength from which the tight bot plays a hand
+
+
+def allocate(cards):
+    '''
+    Pairs six cards into the three strongest preflop holdings, strongest first.
+    '''
+    strengths = {}
+    for i in range(len(cards) - 1):
+        for j in range(i + 1, len(cards)):
+            strengths[(i, j)] = hand_to_strength(cards[i][0], cards[j][0])
+    cards_put = set()
+    holes = []
+    for (i, j), _ in sorted(strengths.items(), key=lambda item: item[1], reverse=True):
+        if i not in cards_put and j not in cards_put:
+            cards_put.update((i, j))
+            holes.append([cards[i], cards[j]])
+    return holes
+
+
+class ReferenceBot(Bot):
+    '''
+    Base class for the reference bots, which decide each board on its own.
+
+    At most one board is raised per decision and calls are skipped once they would cost
+    more chips than are left, so the combined actions are always legal.
+    '''
+
+    def assign(self, cards):
+        '''
+        Returns the hole cards to play on each board, in board order.
+        '''
+        return [cards[0:2], cards[2:4], cards[4:6]]
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        '''
+        Returns the action to take on board i.
+        '''
+        raise NotImplementedError('board_action')
+
+    def get_actions(self, game_state, round_state, active):
+        '''
+        Assigns the hole cards at the start of the round, then decides each board in turn.
+        '''
+        legal_actions = round_state.legal_actions()
+        if AssignAction in legal_actions[0]:
+            return [AssignAction(hole) for hole in self.assign(round_state.hands[active])]
+        budget = round_state.stacks[active]  # chips left for this decision's calls and raises
+        raised = False
+        actions = []
+        for i, (board_state, legal) in enumerate(zip(round_state.board_states, legal_actions)):
+            if not isinstance(board_state, BoardState) or legal == {CheckAction}:
+                actions.append(CheckAction())
+                continue
+            continue_cost = board_state.pips[1-active] - board_state.pips[active]
+            action = self.board_action(i, board_state, legal, round_state, active)
+            if isinstance(action, RaiseAction):
+                min_raise, max_raise = board_state.raise_bounds(round_state.button, round_state.stacks)
+                amount = min(max(action.amount, min_raise), max_raise, board_state.pips[active] + budget)
+                if raised or amount < min_raise:
+                    action = CallAction() if CallAction in legal else CheckAction()
+                else:
+                    action = RaiseAction(amount)
+                    raised = True
+                    budget -= amount - board_state.pips[active]
+            if isinstance(action, CallAction):
+                if continue_cost > budget:
+                    action = FoldAction()
+                else:
+                    budget -= continue_cost
+            actions.append(action)
+        return actions
+
+
+class RandomLegal(ReferenceBot):
+    '''
+    Plays a uniformly random legal action on every board, raising a random legal amount.
+    '''
+
+    def assign(self, cards):
+        cards = list(cards)
+        random.shuffle(cards)
+        return super().assign(cards)
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        action = random.choice(sorted(legal_actions, key=lambda action: action.__name__))
+        if action is RaiseAction:
+            min_raise, max_raise = board_state.raise_bounds(round_state.button, round_state.stacks)
+            return RaiseAction(random.randint(min_raise, max_raise))
+        return action()
+
+
+class CallingStation(ReferenceBot):
+    '''
+    Checks or calls every board to showdown.
+    '''
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        return CheckAction() if CheckAction in legal_actions else CallAction()
+
+
+class RaiseMax(ReferenceBot):
+    '''
+    Raises the most it can whenever it may, checking or calling otherwise.
+    '''
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        if RaiseAction in legal_actions:
+            return RaiseAction(board_state.raise_bounds(round_state.button, round_state.stacks)[1])
+        return CheckAction() if CheckAction in legal_actions else CallAction()
+
+
+class PotOdds(ReferenceBot):
+    '''
+    Calls when its Monte Carlo equity beats the pot odds and bets the pot with strong hands,
+    like week-2-bot.
+    '''
+
+    def __init__(self):
+        self.equity_cache = open_cache()  # in the bot's directory, reference_bots/pot_odds
+
+    def assign(self, cards):
+        return allocate(cards)
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        hole, board = board_state.hands[active], board_state.deck[:round_state.street]
+        if self.equity_cache is not None:
+            equity = self.equity_cache.strength(hole, board, POT_ODDS_ITERS)
+        else:
+            equity = monte_carlo_strength(hole, board, POT_ODDS_ITERS)
+        continue_cost = board_state.pips[1-active] - board_state.pips[active]
+        pot = board_state.pot + sum(board_state.pips)
+        if RaiseAction in legal_actions and equity > RAISE_EQUITY:
+            return RaiseAction(board_state.pips[1-active] + pot + continue_cost)
+        if continue_cost == 0:
+            return CheckAction()
+        return CallAction() if equity >= continue_cost / (pot + continue_cost) else FoldAction()
+
+
+class TightPreflop(ReferenceBot):
+    '''
+    Only plays holdings at or above TIGHT_STRENGTH in the preflop table, raising them
+    preflop and checking or calling them down, and gives up on every other board.
+    '''
+
+    def assign(self, cards):
+        return allocate(cards)
+
+    def board_action(self, i, board_state, legal_actions, round_state, active):
+        hole = board_state.hands[active]
+        if hand_to_strength(hole[0][0], hole[1][0]) < TIGHT_STRENGTH:
+            return CheckAction() if CheckAction in legal_actions else FoldAction()
+        if round_state.street == 0 and RaiseAction in legal_actions:
+            return RaiseAction(board_state.pips[1-active] + 2 * BIG_BLIND)
+        return CheckAction() if CheckAction in legal_actions else CallAction()
+
+
+REFERENCE_BOTS = {
+    'random_legal': RandomLegal,
+    'calling_station': CallingStation,
+    'raise_max': RaiseMax,
+    'pot_odds': PotOdds,
+    'tight_preflop': TightPreflop,
+}
+
+
+if __name__ == '__main__':
+    bot_name = sys.argv.pop(1)  # the remaining arguments are the Runner's
+    random.seed(SEED)
+    run_bot(REFERENCE_BOTS[bot_name](), parse_args())
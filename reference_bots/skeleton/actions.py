@@ -0,0 +1,11 @@
+'''
+The actions that the player is allowed to take.
+'''
+from collections import namedtuple
+
+FoldAction = namedtuple('FoldAction', [])
+CallAction = namedtuple('CallAction', [])
+CheckAction = namedtuple('CheckAction', [])
+# we coalesce BetAction and RaiseAction for convenience
+RaiseAction = namedtuple('RaiseAction', ['amount'])
+AssignAction = namedtuple('AssignAction', ['cards'])
@@ -0,0 +1,248 @@
+'''
+Card encoding and equity estimation helpers shared by the pokerbot and its offline jobs.
+'''
+import itertools
+import math
+import random
+from .evaluator import evaluate_many
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+# Cards are encoded compactly as rank*4 + suit, so 0 is 2c and 51 is As.
+# Keys pack the sorted hole cards and sorted board cards into 6 bit fields,
+# with EMPTY_CARD marking board cards which have not been dealt yet.
+EMPTY_CARD = 63
+SAMPLE_BATCH = 32  # runouts sampled between checks of the standard error
+# opponent hole cards scored against each sampled runout, by the number of board cards dealt,
+# chosen to minimize the error for a given number of hand evaluations
+OPPONENTS_PER_RUNOUT = {0: 3, 3: 1, 4: 3, 5: 6}
+
+
+def card_to_int(card):
+    '''
+    Encodes a card string such as 'Ah' as an integer between 0 and 51.
+    '''
+    return RANKS.index(card[0]) * 4 + SUITS.index(card[1])
+
+
+def int_to_card(code):
+    '''
+    Decodes an integer between 0 and 51 back into a card string.
+    '''
+    return RANKS[code // 4] + SUITS[code % 4]
+
+
+def canonicalize(hole, board):
+    '''
+    Maps a (hole, board) pair to its suit-isomorphic canonical form.
+
+    Arguments:
+    hole: a list of two card strings.
+    board: a list of up to five card strings, empty strings are ignored.
+
+    Returns:
+    A tuple (hole, board) of sorted integer card codes under the suit relabeling
+    which gives the smallest encoding, so that equivalent situations share a key.
+    '''
+    hole = [card_to_int(card) for card in hole]
+    board = [card_to_int(card) for card in board if card]
+    best = None
+    for perm in SUIT_PERMUTATIONS:
+        candidate = (tuple(sorted(c - c % 4 + perm[c % 4] for c in hole)),
+                     tuple(sorted(c - c % 4 + perm[c % 4] for c in board)))
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def canonical_key(hole, board):
+    '''
+    Packs the canonical form of a (hole, board) pair into a nonzero 64 bit integer.
+    '''
+    canonical_hole, canonical_board = canonicalize(hole, board)
+    cards = list(canonical_hole) + list(canonical_board) + [EMPTY_CARD] * (5 - len(canonical_board))
+    key = 1  # leading sentinel bit keeps every key nonzero
+    for card in cards:
+        key = (key << 6) | card
+    return key
+
+
+def monte_carlo_strength(hole, board, iters):
+    '''
+    Estimates the probability that our hole cards win at showdown against a random hand.
+
+    Arguments:
+    hole: a list of our two hole cards as strings.
+    board: a list of the board cards dealt so far as strings, empty strings are ignored.
+    iters: the number of Monte Carlo samples to take.
+
+    Returns:
+    Our win probability, counting ties as half a win.
+    '''
+    import eval7  # imported on first use, as it takes most of the time the skeleton takes to import
+    deck = eval7.Deck()
+    hole_cards = [eval7.Card(card) for card in hole]
+    board_cards = [eval7.Card(card) for card in board if card]
+    for card in hole_cards + board_cards:
+        deck.cards.remove(card)
+    comm = 5 - len(board_cards)
+    score = 0
+    for _ in range(iters):
+        deck.shuffle()
+        draw = deck.peek(comm + 2)
+        community = draw[2:] + board_cards
+        our_value = eval7.evaluate(hole_cards + community)
+        opp_value = eval7.evaluate(draw[:2] + community)
+        if our_value > opp_value:
+            score += 2
+        elif our_value == opp_value:
+            score += 1
+    return score / (2 * iters)
+
+
+def batch_strength(hole, board, iters):
+    '''
+    Estimates the same probability as monte_carlo_strength, evaluating every sample at once
+    with evaluator.evaluate_many, which is much faster when NumPy is installed.
+
+    The samples are drawn with a NumPy generator seeded from the random module, so seeding
+    random makes the estimate reproducible either way.
+    '''
+    hole = [card_to_int(card) for card in hole]
+    board = [card_to_int(card) for card in board if card]
+    deck = [card for card in range(52) if card not in hole and card not in board]
+    comm = 5 - len(board)
+    try:
+        import numpy
+    except ImportError:
+        draws = [random.sample(deck, comm + 2) for _ in range(iters)]
+        ours = evaluate_many([hole + draw[2:] + board for draw in draws])
+        theirs = evaluate_many([draw + board for draw in draws])
+        score = sum(2 if ours[i] > theirs[i] else ours[i] == theirs[i] for i in range(iters))
+        return score / (2 * iters)
+    rng = numpy.random.default_rng(random.getrandbits(64))
+    draws = numpy.array(deck)[numpy.argpartition(rng.random((iters, len(deck))), comm + 2, axis=1)[:, :comm + 2]]
+    community = numpy.hstack([draws[:, 2:], numpy.broadcast_to(numpy.array(board, dtype=draws.dtype), (iters, len(board)))])
+    ours = evaluate_many(numpy.hstack([numpy.broadcast_to(numpy.array(hole, dtype=draws.dtype), (iters, 2)), community]))
+    theirs = evaluate_many(numpy.hstack([draws[:, :2], community]))
+    return (2 * numpy.count_nonzero(ours > theirs) + numpy.count_nonzero(ours == theirs)) / (2 * iters)
+
+
+def stratified_strength(hole, board, iters, target_error=None, rng=random):
+    '''
+    Estimates the same probability as monte_carlo_strength with fewer hand evaluations, and
+    reports the precision reached.
+
+    Each runout is scored against a few opponent hole cards dealt from the rest of the deck
+    without overlap, as many as OPPONENTS_PER_RUNOUT gives for the street, so our hand is evaluated once for several samples and
+    the opponent's cards are spread evenly over the deck. The first runout card cycles
+    through the deck in a random order, so every card comes first equally often (stratified
+    sampling). On the river, where there is no runout, the opponent's hole cards are dealt
+    in full passes through the shuffled deck instead.
+
+    Arguments:
+    hole: a list of our two hole cards as strings.
+    board: a list of the board cards dealt so far as strings, empty strings are ignored.
+    iters: the largest number of samples, opponent hole cards scored, to take.
+    target_error: stop as soon as the standard error is at most this, if given.
+    rng: the random.Random to shuffle with, the random module's shared generator by default.
+
+    Returns:
+    A tuple of our win probability, counting ties as half a win, its standard error,
+    estimated from the spread of the runouts, and the number of samples taken.
+    '''
+    hole = [card_to_int(card) for card in hole]
+    board = [card_to_int(card) for card in board if card]
+    deck = [card for card in range(52) if card not in hole and card not in board]
+    comm = 5 - len(board)
+    per_runout = OPPONENTS_PER_RUNOUT[len(board)]
+    strata = list(deck)
+    rng.shuffle(strata)
+    num_runouts = max(iters // per_runout, 2)
+    total = 0.
+    squares = 0.
+    runouts = 0
+    river_deck = []  # the cards left in the current pass through the deck, on the river
+    while runouts < num_runouts:
+        hands = []
+        for k in range(runouts, min(runouts + SAMPLE_BATCH, num_runouts)):
+            if comm:
+                first = strata[k % len(strata)]
+                rest = [card for card in deck if card != first]
+                rng.shuffle(rest)
+                community = [first] + rest[:comm - 1] + board
+                rest = rest[comm - 1:]
+            else:
+                if len(river_deck) < 2 * per_runout:
+                    river_deck = list(deck)
+                    rng.shuffle(river_deck)
+                community = board
+                rest, river_deck = river_deck[:2 * per_runout], river_deck[2 * per_runout:]
+            hands.append(hole + community)
+            hands.extend(rest[2*j:2*j + 2] + community for j in range(per_runout))
+        values = evaluate_many(hands)
+        for j in range(0, len(hands), per_runout + 1):
+            ours = values[j]
+            score = sum(1. if ours > theirs else 0.5 if ours == theirs else 0. for theirs in values[j + 1:j + 1 + per_runout])
+            score /= per_runout
+            total += score
+            squares += score * score
+            runouts += 1
+        mean = total / runouts
+        standard_error = math.sqrt(max(squares / runouts - mean * mean, 0.) / max(runouts - 1, 1))
+        if target_error is not None and runouts >= SAMPLE_BATCH and standard_error <= target_error:
+            break
+    return mean, standard_error, runouts * per_runout
+
+
+def joint_strengths(holes, boards, iters):
+    '''
+    Estimates our win probability on every board at once, sampling the opponent's cards
+    jointly the way the engine deals them.
+
+    The engine deals both players' six hole cards from one deck and every board's runout
+    from its own shuffle of the forty cards left, so the boards can share runout cards but
+    never hole cards. Each sample deals the opponent six cards in random order, with our six
+    cards and every board card dealt so far dead, gives the opponent consecutive pairs of them
+    on the boards in turn, and then draws each board's runout from the cards left by both
+    players' hole cards. One draw of the
+    opponent's cards serves all three boards, and all of a sample's hands are evaluated in
+    one batch.
+
+    Arguments:
+    holes: a list of our two hole cards as strings on each board.
+    boards: a list of the board cards dealt so far as strings on each board, empty strings
+    are ignored, or None for a board which is over.
+    iters: the number of Monte Carlo samples to take.
+
+    Returns:
+    A list of our win probability on each board, counting ties as half a win, or None for
+    boards which are over.
+    '''
+    holes = [[card_to_int(card) for card in hole] for hole in holes]
+    boards = [[card_to_int(card) for card in board if card] if board is not None else None for board in boards]
+    ours = set(card for hole in holes for card in hole)
+    seen = set(card for board in boards if board is not None for card in board)
+    pool = [card for card in range(52) if card not in ours and card not in seen]
+    live = [i for i, board in enumerate(boards) if board is not None]
+    if not live:
+        return [None] * len(boards)
+    scores = [0] * len(boards)
+    for start in range(0, iters, SAMPLE_BATCH):
+        hands = []
+        for _ in range(min(SAMPLE_BATCH, iters - start)):
+            opponent = random.sample(pool, 2 * len(holes))
+            remaining = [card for card in range(52) if card not in ours and card not in opponent]
+            for i in live:
+                board = boards[i]
+                left = [card for card in remaining if card not in board]
+                community = random.sample(left, 5 - len(board)) + board
+                hands.append(holes[i] + community)
+                hands.append(opponent[2*i:2*i + 2] + community)
+        values = [int(value) for value in evaluate_many(hands)]
+        for j in range(0, len(hands), 2):
+            i = live[(j // 2) % len(live)]
+            scores[i] += 2 if values[j] > values[j + 1] else values[j] == values[j + 1]
+    return [scores[i] / (2 * iters) if boards[i] is not None else None for i in range(len(boards))]
@@ -0,0 +1,309 @@
+'''
+The infrastructure for interacting with the engine.
+'''
+import argparse
+import socket
+import threading
+import time
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction, AssignAction
+from .states import GameState, TerminalState, RoundState, BoardState, ActionLog, detach
+from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
+from .bot import Bot
+from .profiler import CallbackProfiler
+
+DEADLINE_RESERVE = 0.05  # seconds of game clock the watchdog never lets a decision spend
+
+
+class Runner():
+    '''
+    Interacts with the engine.
+    '''
+
+    def __init__(self, pokerbot, socketfile, profiler=None, deadline_fraction=None, compact=False):
+        self.pokerbot = pokerbot
+        self.socketfile = socketfile
+        self.profiler = profiler
+        self.deadline_fraction = deadline_fraction
+        self.abandoned = None  # worker thread of a get_actions call which missed its deadline
+        # in compact mode the states passed to the pokerbot carry no history, which is
+        # logged in action_log instead, so their size does not grow along the round; in
+        # exchange every action clause copies the round state and its board states
+        self.compact = compact
+        self.action_log = ActionLog() if compact else None
+        if compact:
+            self.pokerbot.action_log = self.action_log
+
+    def invoke(self, street, callback, *args):
+        '''
+        Calls a pokerbot callback, timing it if profiling is enabled.
+        '''
+        if self.profiler is None:
+            return callback(*args)
+        token = self.profiler.start(callback.__name__, street)
+        try:
+            return callback(*args)
+        finally:
+            self.profiler.stop(token)
+
+    def notify(self, street, callback, game_state, *args):
+        '''
+        Calls handle_new_round or handle_round_over, once any abandoned get_actions call has
+        returned, so that the two never change the pokerbot's state at the same time. If the
+        abandoned call does not return within a decision's deadline, the callback is skipped.
+        '''
+        if self.abandoned is not None and not self.wait_abandoned(self.next_deadline(game_state)):
+            print('Skipped {} while an abandoned get_actions call is still running'.format(callback.__name__))
+            return
+        self.invoke(street, callback, game_state, *args)
+
+    def next_deadline(self, game_state):
+        '''
+        Returns the perf_counter time by which the next call should return.
+        '''
+        budget = min(self.deadline_fraction * game_state.game_clock, game_state.game_clock - DEADLINE_RESERVE)
+        return time.perf_counter() + max(budget, 0.)
+
+    def wait_abandoned(self, deadline):
+        '''
+        Waits for an abandoned get_actions call until a perf_counter deadline, leaving the
+        pokerbot's deadline attribute at the one the call already missed.
+
+        Returns:
+        True if no abandoned call is running any more.
+        '''
+        if self.abandoned is None:
+            return True
+        self.abandoned.join(max(deadline - time.perf_counter(), 0.))
+        if self.abandoned.is_alive():
+            return False
+        self.abandoned = None
+        return True
+
+    def decide(self, game_state, round_state, active):
+        '''
+        Calls get_actions, under a watchdog if a deadline fraction was given.
+
+        The watchdog gives each decision deadline_fraction of the remaining game clock, never
+        leaving less than DEADLINE_RESERVE, so the clock can not run out however slow the bot
+        is. get_actions runs in a worker thread and the pokerbot's deadline attribute is set
+        to the perf_counter time by which it should return. If it misses the deadline, or
+        raises, the runner sends fallback_actions instead and abandons the call. Python can
+        not stop a thread, so the call keeps running until it returns by itself, and only a
+        pokerbot which polls its deadline attribute in long computations returns soon after
+        missing it. Later decisions and round callbacks wait for the abandoned call within
+        their own deadline; a decision falls back and a callback is skipped if it still has
+        not returned, so only fallback_actions ever runs alongside an abandoned call.
+        '''
+        if self.deadline_fraction is None:
+            return self.invoke(round_state.street, self.pokerbot.get_actions, game_state, round_state, active)
+        deadline = self.next_deadline(game_state)
+        if not self.wait_abandoned(deadline):
+            return self.fallback(game_state, round_state, active)
+        self.pokerbot.deadline = deadline
+        result = []
+        worker = threading.Thread(target=lambda: result.append(self.invoke(
+            round_state.street, self.pokerbot.get_actions, game_state, round_state, active)), daemon=True)
+        worker.start()
+        worker.join(max(deadline - time.perf_counter(), 0.))
+        if worker.is_alive():
+            self.abandoned = worker
+            return self.fallback(game_state, round_state, active)
+        if not result:  # get_actions raised, and the thread printed the traceback
+            return self.fallback(game_state, round_state, active)
+        return result[0]
+
+    def fallback(self, game_state, round_state, active):
+        '''
+        Returns the pokerbot's fallback actions, or the default ones if its fallback_actions raises.
+        '''
+        try:
+            actions = self.pokerbot.fallback_actions(game_state, round_state, active)
+            if len(actions) == NUM_BOARDS:
+                return actions
+        except Exception as e:
+            print('fallback_actions raised {!r}'.format(e))
+        return Bot.fallback_actions(self.pokerbot, game_state, round_state, active)
+
+    def receive(self):
+        '''
+        Generator for incoming messages from the engine.
+        '''
+        while True:
+            packet = self.socketfile.readline().strip().split(' ')
+            if not packet:
+                break
+            yield packet
+
+    def send(self, actions):
+        '''
+        Encodes actions and sends it to the engine.
+        '''
+        codes = [''] * NUM_BOARDS
+        for i in range(NUM_BOARDS):
+            if isinstance(actions[i], AssignAction):
+                codes[i] = str(i+1) + 'A' + ','.join(actions[i].cards)
+            elif isinstance(actions[i], FoldAction):
+                codes[i] = str(i+1) + 'F'
+            elif isinstance(actions[i], CallAction):
+                codes[i] = str(i+1) + 'C'
+            elif isinstance(actions[i], CheckAction):
+                codes[i] = str(i+1) + 'K'
+            else:  # isinstance(action, RaiseAction)
+                codes[i] = str(i+1) + 'R' + str(actions[i].amount)
+        code = ';'.join(codes)
+        self.socketfile.write(code + '\n')
+        self.socketfile.flush()
+       
+    def run(self):
+        '''
+        Reconstructs the game tree based on the action history received from the engine.
+        '''
+        game_state = GameState(0, 0, 0., 1)
+        round_state = None
+        active = 0
+        round_flag = True
+        for packet in self.receive():
+            for clause in packet:
+                if clause[0] == 'T':
+                    game_state = GameState(game_state.bankroll, game_state.opp_bankroll, float(clause[1:]), game_state.round_num)
+                    if self.profiler is not None:
+                        self.profiler.clock(game_state.game_clock)
+                elif clause[0] == 'P':
+                    active = int(clause[1:])
+                elif clause[0] == 'H':
+                    cards = clause[1:].split(',')
+                    hands = [[], []]
+                    hands[active] = cards
+                    hands[1-active] = ['']*(2*NUM_BOARDS)
+                    deck = ["", "", "", "", ""]
+                    pips = [SMALL_BLIND, BIG_BLIND]
+                    board_states = [BoardState((i+1)*BIG_BLIND, pips, [[]]*2, deck, None) for i in range(NUM_BOARDS)]
+                    stacks = [STARTING_STACK - NUM_BOARDS*SMALL_BLIND, STARTING_STACK - NUM_BOARDS*BIG_BLIND]
+                    round_state = RoundState(-2, 0, stacks, hands, board_states, None)
+                    if self.compact:
+                        self.action_log.clear()
+                    if round_flag:
+                        self.notify(0, self.pokerbot.handle_new_round, game_state, round_state, active)
+                        round_flag = False
+                elif clause[0] == 'D':
+                    assert isinstance(round_state, TerminalState)
+                    subclauses = clause.split(';')
+                    delta = int(subclauses[0][1:])
+                    opp_delta = int(subclauses[1][1:])
+                    deltas = [delta, opp_delta]
+                    deltas[active] = delta
+                    deltas[1-active] = opp_delta
+                    round_state = TerminalState(deltas, round_state.previous_state)
+                    game_state = GameState(game_state.bankroll + delta, game_state.opp_bankroll + opp_delta, game_state.game_clock, game_state.round_num)
+                    self.notify(round_state.previous_state.street, self.pokerbot.handle_round_over, game_state, round_state, active)
+                    game_state = GameState(game_state.bankroll, game_state.opp_bankroll, game_state.game_clock, game_state.round_num + 1)
+                    round_flag = True
+                elif clause[0] == 'Q':
+                    if self.profiler is not None:
+                        print(self.profiler.summary())
+                    return
+                elif clause[0] == '1':
+                    round_state = parse_multi_code(clause, round_state, active, self.action_log)
+                    if self.compact:
+                        round_state = detach(round_state)
+            if round_flag:  # ack the engine
+                self.send([CheckAction()]*NUM_BOARDS)
+                if self.profiler is not None:
+                    self.profiler.responded(None)
+            else:
+                assert active == round_state.button % 2
+                actions = self.decide(game_state, round_state, active)
+                self.send(actions)
+                if self.profiler is not None:
+                    self.profiler.responded(round_state.street)
+
+
+def parse_multi_code(clause, round_state, active, action_log=None):
+    '''
+    Applies one clause of board cards, revealed hands or actions to the round state, logging
+    actions in action_log if it is given.
+    '''
+    subclauses = clause.split(';')
+    if 'B' in clause:
+        new_board_states = [None] * NUM_BOARDS
+        for i in range(NUM_BOARDS):
+            leftover = subclauses[i][2:]
+            cards = leftover.split(',')
+            revised_deck = ["", "", "", "", ""]
+            for j in range(len(cards)):
+                revised_deck[j] = cards[j]
+            if isinstance(round_state.board_states[i], BoardState):
+                maker = round_state.board_states[i]
+                new_board_states[i] = maker._replace(deck=revised_deck)
+            else:
+                terminal = round_state.board_states[i]
+                new_board_states[i] = TerminalState(terminal.deltas, terminal.previous_state._replace(deck=revised_deck))
+        return RoundState(round_state.button, round_state.street, round_state.stacks, round_state.hands, new_board_states, round_state.previous_state)
+    elif 'O' in clause:
+        new_board_states = [None] * NUM_BOARDS
+        round_state = round_state.previous_state
+        for i in range(NUM_BOARDS):
+            leftover = subclauses[i][2:]
+            if leftover == "":
+                new_board_states[i] = round_state.board_states[i]
+            else:
+                cards = leftover.split(',')
+                terminal = round_state.board_states[i]
+                maker = terminal.previous_state
+                revised_hands = list(maker.hands)  # the hands list is shared with earlier states
+                revised_hands[1-active] = cards
+                new_board_states[i] = TerminalState(terminal.deltas, maker._replace(hands=revised_hands))
+        round_state = RoundState(round_state.button, round_state.street, round_state.stacks, round_state.hands, new_board_states, round_state.previous_state)
+        return TerminalState([0, 0], round_state)
+    else:
+        actions = [None] * NUM_BOARDS
+        for i in range(NUM_BOARDS):
+            subclause = subclauses[i]
+            leftover = subclause[2:]
+            if subclause[1] == 'F':
+                actions[i] = FoldAction()
+            elif subclause[1] == 'C':
+                actions[i] = CallAction()
+            elif subclause[1] == 'K':
+                actions[i] = CheckAction()
+            elif subclause[1] == 'R':
+                actions[i] = RaiseAction(int(leftover))
+            elif subclause[1] == 'A':
+                cards = leftover.split(',')
+                if leftover == "":
+                    actions[i] = AssignAction(["", ""])
+                else:
+                    actions[i] = AssignAction(cards)
+        if action_log is not None:
+            action_log.append(round_state.street, round_state.button, actions)
+        return round_state.proceed(actions)
+
+def parse_args():
+    '''
+    Parses arguments corresponding to socket connection information.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 player.py')
+    parser.add_argument('--host', type=str, default='localhost', help='Host to connect to, defaults to localhost')
+    parser.add_argument('--profile', action='store_true', help='Profile callbacks and write a summary to the log at game end')
+    parser.add_argument('--profile-threshold', type=float, default=0.05, help='Seconds after which a callback is stack sampled')
+    parser.add_argument('--deadline', type=float, default=None, help='Fraction of the remaining game clock after which a decision falls back to a safe action')
+    parser.add_argument('--compact', action='store_true', help='Pass states without history and log the round\'s actions in the pokerbot\'s action_log')
+    parser.add_argument('port', type=int, help='Port on host to connect to')
+    return parser.parse_args()
+
+def run_bot(pokerbot, args):
+    '''
+    Runs the pokerbot.
+    '''
+    assert isinstance(pokerbot, Bot)
+    try:
+        sock = socket.create_connection((args.host, args.port))
+    except OSError:
+        print('Could not connect to {}:{}'.format(args.host, args.port))
+        return
+    socketfile = sock.makefile('rw')
+    profiler = CallbackProfiler(args.profile_threshold) if getattr(args, 'profile', False) else None
+    runner = Runner(pokerbot, socketfile, profiler, getattr(args, 'deadline', None), getattr(args, 'compact', False))
+    runner.run()
+    socketfile.close()
+    sock.close()
@@ -0,0 +1,214 @@
+'''
+Depth-limited lookahead over the betting tree of a single board.
+
+The search expands the board's tree with BoardState.proceed using an abstraction of the
+bet sizes. Our nodes take the best abstract action; opponent nodes average over a simple
+opponent policy. Showdowns and cut-off nodes are valued with our equity on the board. A
+node's value is the expected number of chips we collect from the board's pot, minus what we
+put in from that node on, so it depends only on the node and a transposition table keyed by
+(street, pot, pips, stacks, button) shares work between transposed lines and deepening
+iterations. Iterative deepening stops at a deadline derived from the game clock.
+'''
+import time
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction
+from .states import BoardState, TerminalState, NUM_ROUNDS, NUM_BOARDS
+from .sizing import fold_probability
+
+BET_FRACTIONS = [0.5, 1.0]  # raise sizes as fractions of the pot after calling
+MAX_DEPTH = 16
+DECISIONS_PER_ROUND = 4
+MAX_BUDGET = 0.05  # seconds
+
+
+class SearchTimeout(Exception):
+    '''
+    Raised inside a deepening iteration when the search deadline passes.
+    '''
+
+
+def time_budget(game_state, max_budget=MAX_BUDGET):
+    '''
+    Returns how many seconds one decision may search for, spreading the game clock evenly
+    over the decisions expected in the remaining rounds.
+    '''
+    rounds_left = max(NUM_ROUNDS - game_state.round_num + 1, 1)
+    return min(max_budget, game_state.game_clock / (rounds_left * DECISIONS_PER_ROUND))
+
+
+def opponent_policy(board_state, button, stacks):
+    '''
+    The default opponent model: fold to bets as often as fold_probability says, otherwise call, and check when not facing a bet.
+
+    Returns:
+    A list of (action, probability) pairs.
+    '''
+    active = button % 2
+    continue_cost = board_state.pips[1-active] - board_state.pips[active]
+    if continue_cost == 0:
+        return [(CheckAction(), 1.)]
+    fold = fold_probability(board_state.pot + sum(board_state.pips) - continue_cost, continue_cost)
+    return [(FoldAction(), fold), (CallAction(), 1. - fold)]
+
+
+class TreeSearch():
+    '''
+    Searches one board's betting tree from our point of view.
+    '''
+
+    def __init__(self, me, equity, bet_fractions=BET_FRACTIONS, policy=opponent_policy):
+        '''
+        Arguments:
+        me: our player's index.
+        equity: our probability of winning the board at showdown.
+        bet_fractions: the abstraction of raise sizes as fractions of the pot after calling.
+        policy: a function of (board_state, button, stacks) returning the opponent's (action, probability) pairs.
+        '''
+        self.me = me
+        self.equity = equity
+        self.bet_fractions = bet_fractions
+        self.policy = policy
+        self.table = {}
+        self.deadline = None
+        self.nodes = 0
+        self.cutoff = False
+
+    def abstract_actions(self, board_state, button, stacks):
+        '''
+        Returns the legal actions of the abstraction at a node.
+        '''
+        legal_actions = board_state.legal_actions(button, stacks)
+        actions = [action() for action in (FoldAction, CheckAction, CallAction) if action in legal_actions]
+        if RaiseAction in legal_actions:
+            active = button % 2
+            min_raise, max_raise = board_state.raise_bounds(button, stacks)
+            continue_cost = board_state.pips[1-active] - board_state.pips[active]
+            pot = board_state.pot + sum(board_state.pips) + continue_cost
+            amounts = {min(max(int(board_state.pips[1-active] + fraction * pot), min_raise), max_raise)
+                       for fraction in self.bet_fractions}
+            actions += [RaiseAction(amount) for amount in sorted(amounts)]
+        return actions
+
+    def child(self, board_state, button, street, stacks, action):
+        '''
+        Applies an action, returning (next state, button, street, stacks, chips we put in).
+        '''
+        active = button % 2
+        next_state = board_state.proceed(action, button, street)
+        if isinstance(next_state, TerminalState):
+            return next_state, button, street, stacks, 0
+        contribution = next_state.pips[active] - board_state.pips[active]
+        next_stacks = list(stacks)
+        next_stacks[active] -= contribution
+        if next_state.settled and street < 5 and next_stacks[0] > 0 and next_stacks[1] > 0:
+            # move on to the next street like RoundState.proceed_street
+            pot = next_state.pot + sum(next_state.pips)
+            next_state = BoardState(pot, [0, 0], next_state.hands, next_state.deck, None)
+            button, street = 0, (3 if street == 0 else street + 1)
+        return next_state, button + 1, street, next_stacks, contribution if active == self.me else 0
+
+    def value(self, board_state, button, street, stacks, depth):
+        '''
+        Returns the value of a node, searching depth more actions deep.
+        '''
+        if isinstance(board_state, TerminalState):
+            return board_state.deltas[self.me]
+        pot = board_state.pot + sum(board_state.pips)
+        if board_state.settled:  # showdown, possibly after an all in
+            return self.equity * pot
+        if depth == 0:
+            self.cutoff = True
+            return self.equity * pot
+        key = (street, board_state.pot, tuple(board_state.pips), tuple(stacks), button)
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            if entry[0] <= MAX_DEPTH:  # the stored subtree was cut off somewhere
+                self.cutoff = True
+            return entry[1]
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        outer_cutoff, self.cutoff = self.cutoff, False
+        if button % 2 == self.me:
+            best, best_action = None, None
+            for action in self.abstract_actions(board_state, button, stacks):
+                next_state, next_button, next_street, next_stacks, cost = self.child(board_state, button, street, stacks, action)
+                action_value = self.value(next_state, next_button, next_street, next_stacks, depth - 1) - cost
+                if best is None or action_value > best:
+                    best, best_action = action_value, action
+        else:
+            best, best_action = 0., None
+            for action, probability in self.policy(board_state, button, stacks):
+                next_state, next_button, next_street, next_stacks, _ = self.child(board_state, button, street, stacks, action)
+                best += probability * self.value(next_state, next_button, next_street, next_stacks, depth - 1)
+        # exact values hold at any depth, so they are stored as if searched beyond MAX_DEPTH
+        self.table[key] = (depth if self.cutoff else MAX_DEPTH + 1, best, best_action)
+        self.cutoff = outer_cutoff or self.cutoff
+        return best
+
+    def search(self, board_state, button, street, stacks, budget):
+        '''
+        Runs iterative deepening from a node where we are to act until the budget runs out.
+
+        Arguments:
+        board_state: the BoardState of the board.
+        button: the RoundState's button.
+        street: the RoundState's street.
+        stacks: the RoundState's stacks.
+        budget: the number of seconds the search may take.
+
+        Returns:
+        A tuple (best action, value, depth of the last completed iteration).
+        '''
+        self.deadline = time.perf_counter() + budget
+        key = (street, board_state.pot, tuple(board_state.pips), tuple(stacks), button)
+        legal_actions = board_state.legal_actions(button, stacks)
+        fallback = CheckAction() if CheckAction in legal_actions else FoldAction()
+        result = (fallback, self.equity * (board_state.pot + sum(board_state.pips)), 0)
+        for depth in range(1, MAX_DEPTH + 1):
+            self.cutoff = False
+            try:
+                value = self.value(board_state, button, street, stacks, depth)
+            except SearchTimeout:
+                break
+            result = (self.table[key][2], value, depth)
+            if not self.cutoff:  # the whole abstract tree fit within this depth
+                break
+        self.deadline = None
+        return result
+
+
+def search_actions(game_state, round_state, active, equities, max_budget=MAX_BUDGET):
+    '''
+    Searches every contested board and returns one action per board.
+
+    The searches treat boards independently, so if their raises add up to more than
+    RoundState.raise_bounds allows, later boards fall back to checking or calling.
+
+    Arguments:
+    game_state: the GameState object.
+    round_state: the RoundState object, after cards have been assigned.
+    active: your player's index.
+    equities: our probability of winning each board at showdown.
+    max_budget: the most seconds to spend on this decision.
+
+    Returns:
+    Your actions.
+    '''
+    contested = [isinstance(board_state, BoardState) and not board_state.settled for board_state in round_state.board_states]
+    budget = time_budget(game_state, max_budget) / max(sum(contested), 1)
+    actions = [CheckAction()] * NUM_BOARDS
+    for i in range(NUM_BOARDS):
+        if contested[i]:
+            tree = TreeSearch(active, equities[i])
+            action, _, _ = tree.search(round_state.board_states[i], round_state.button, round_state.street, round_state.stacks, budget)
+            actions[i] = action
+    max_raise = round_state.raise_bounds()[1]
+    total_raise = 0
+    for i in range(NUM_BOARDS):
+        if isinstance(actions[i], RaiseAction):
+            if total_raise + actions[i].amount <= max_raise:
+                total_raise += actions[i].amount
+            else:
+                legal_actions = round_state.board_states[i].legal_actions(round_state.button, round_state.stacks)
+                actions[i] = CheckAction() if CheckAction in legal_actions else CallAction()
+    return actions
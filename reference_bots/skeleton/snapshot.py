@@ -0,0 +1,131 @@
+'''
+A single memory-mapped snapshot of the precomputed tables a pokerbot needs at startup.
+
+The engine gives a pokerbot CONNECT_TIMEOUT seconds to connect, and building tables such
+as the evaluator's takes over a second of it, or of the first round's game clock when they
+are built on first use. The snapshot file holds every table as a flat array. load() maps
+the file instead of reading it, so startup costs milliseconds however large the tables
+grow, and the pages are shared through the page cache by every pokerbot on the machine.
+
+The file is a header, a directory of named arrays and the arrays themselves, each aligned
+to 8 bytes so that it can be viewed in place as a memoryview or NumPy array. Its tables
+are those of evaluator.export_tables. A missing or stale snapshot is not an error: load()
+returns False and the tables are built on first use as before.
+
+Build the snapshot offline with
+    python3 -m skeleton.snapshot [--out PATH]
+and call load() in the pokerbot's __init__.
+'''
+import argparse
+import mmap
+import os
+import struct
+import time
+from . import evaluator
+
+SNAPSHOT_PATH = 'snapshot.bin'
+
+MAGIC = b'SNP1'
+HEADER = struct.Struct('<4sII')  # magic, format version, number of arrays
+HEADER_SIZE = 16
+ENTRY = struct.Struct('<24s4sQQ')  # name, array typecode, byte offset, number of items
+ALIGNMENT = 8
+
+_snapshot = None  # the loaded snapshot, kept open while its arrays are in use
+
+
+class Snapshot():
+    '''
+    A read-only mapping of a snapshot file, from array names to memoryviews of the file.
+    '''
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        '''
+        Maps the snapshot file at path, raising OSError if it can not be opened and
+        ValueError if it is not a snapshot.
+        '''
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self.mm = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, _, num_arrays = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC:
+                raise ValueError('{} is not a snapshot file'.format(path))
+            entries = []
+            for i in range(num_arrays):
+                name, typecode, offset, length = ENTRY.unpack_from(self.mm, HEADER_SIZE + i * ENTRY.size)
+                typecode = typecode.rstrip(b'\0').decode()
+                end = offset + length * struct.calcsize(typecode)
+                if end > len(self.mm):
+                    raise ValueError('{} is truncated'.format(path))
+                entries.append((name.rstrip(b'\0').decode(), typecode, offset, end))
+        except (struct.error, ValueError):
+            self.mm.close()
+            raise
+        view = memoryview(self.mm)
+        self.arrays = {name: view[offset:end].cast(typecode) for name, typecode, offset, end in entries}
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+
+def write_snapshot(arrays, path=SNAPSHOT_PATH):
+    '''
+    Writes a snapshot of arrays, a dict of name -> array.array, replacing the file at path
+    atomically so that pokerbots starting meanwhile map either the old or the new file.
+    '''
+    offset = HEADER_SIZE + len(arrays) * ENTRY.size
+    entries = []
+    for name, values in arrays.items():
+        offset += -offset % ALIGNMENT
+        entries.append((name, values, offset))
+        offset += len(values) * values.itemsize
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, 1, len(arrays)).ljust(HEADER_SIZE, b'\0'))
+        for name, values, offset in entries:
+            snapshot_file.write(ENTRY.pack(name.encode(), values.typecode.encode(), offset, len(values)))
+        for name, values, offset in entries:
+            snapshot_file.write(b'\0' * (offset - snapshot_file.tell()))
+            values.tofile(snapshot_file)
+    os.replace(temporary_path, path)
+
+
+def load(path=SNAPSHOT_PATH):
+    '''
+    Maps the snapshot at path, if it has not been loaded yet, and installs its tables.
+
+    Returns:
+    True if the tables were installed, and False if there is no valid snapshot at path.
+    '''
+    global _snapshot
+    if _snapshot is not None:
+        return True
+    try:
+        snapshot = Snapshot(path)
+        evaluator.install_tables(snapshot)
+    except (OSError, ValueError, KeyError):
+        return False
+    _snapshot = snapshot
+    return True
+
+
+def main():
+    '''
+    Builds the snapshot from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 -m skeleton.snapshot')
+    parser.add_argument('--out', type=str, default=SNAPSHOT_PATH, help='Location of the snapshot file')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    arrays = evaluator.export_tables()
+    write_snapshot(arrays, args.out)
+    print('wrote {} arrays, {} bytes, to {} in {:.1f}s'.format(
+        len(arrays), os.path.getsize(args.out), args.out, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
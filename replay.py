@@ -0,0 +1,144 @@
+'''
+Replays a transcript recorded by the engine into a Python pokerbot, without an engine or opponent.
+
+With RECORD_TRANSCRIPTS = True in config.py, the engine writes every message it sends a
+player to <PLAYER_NAME>_transcript.txt as a line starting with 'S ', each followed by the
+player's response on a line starting with 'R '. This harness feeds the sent messages
+straight into the pokerbot's Runner.run through an in-memory socketfile, as fast as the
+pokerbot answers. It checks every response against the recorded one and times each call
+precisely, so profiling and benchmarking a bot no longer depend on a live match.
+
+Run with python3 replay.py BOT_PATH TRANSCRIPT from the directory containing engine.py,
+where BOT_PATH is a Python pokerbot directory containing player.py.
+'''
+import argparse
+import contextlib
+import importlib
+import os
+import random
+import sys
+import time
+
+
+class ReplaySocketFile():
+    '''
+    Stands in for the socketfile of the connection to the engine.
+    '''
+
+    def __init__(self, messages, responses):
+        self.messages = messages
+        self.responses = responses
+        self.position = 0
+        self.sent_at = None
+        self.latencies = []
+        self.mismatches = []
+        self.pending = ''
+
+    def readline(self):
+        '''
+        Returns the next recorded message, then Q once the transcript runs out.
+        '''
+        if self.position >= len(self.messages):
+            return 'Q\n'
+        message = self.messages[self.position]
+        self.position += 1
+        self.sent_at = time.perf_counter()
+        return message
+
+    def write(self, data):
+        '''
+        Collects the pokerbot's response, timing it and comparing it with the transcript.
+        '''
+        self.pending += data
+        while '\n' in self.pending:
+            line, self.pending = self.pending.split('\n', 1)
+            self.latencies.append(time.perf_counter() - self.sent_at)
+            index = self.position - 1
+            expected = self.responses[index] if index < len(self.responses) else None
+            if line != expected:
+                self.mismatches.append((index, expected, line))
+
+    def flush(self):
+        '''
+        Nothing is buffered.
+        '''
+
+    def close(self):
+        '''
+        Nothing to close.
+        '''
+
+
+def read_transcript(filename):
+    '''
+    Splits a transcript into the messages sent to the player and its recorded responses.
+    '''
+    messages = []
+    responses = []
+    with open(filename, 'r') as transcript:
+        for line in transcript:
+            if line.startswith('S '):
+                if line[2:].strip() == 'Q':
+                    break
+                messages.append(line[2:])
+            elif line.startswith('R '):
+                responses.append(line[2:].rstrip('\n'))
+    return messages, responses
+
+
+def percentile(ordered, fraction):
+    '''
+    Returns the value at a fraction of the way through a sorted list.
+    '''
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def replay(bot_path, transcript_filename, seed=None, quiet=True):
+    '''
+    Replays a transcript into the pokerbot in bot_path.
+
+    Returns:
+    The ReplaySocketFile holding the latencies and mismatched responses.
+    '''
+    messages, responses = read_transcript(transcript_filename)
+    socketfile = ReplaySocketFile(messages, responses)
+    working_directory = os.getcwd()
+    os.chdir(bot_path)
+    sys.path.insert(0, os.getcwd())
+    try:
+        if seed is not None:
+            random.seed(seed)
+        player_module = importlib.import_module('player')
+        runner_module = importlib.import_module('skeleton.runner')
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+                runner_module.Runner(player_module.Player(), socketfile).run()
+    finally:
+        sys.path.pop(0)
+        os.chdir(working_directory)
+    return socketfile
+
+
+def main():
+    '''
+    Replays a transcript from the command line and reports mismatches and latencies.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 replay.py')
+    parser.add_argument('bot_path', type=str, help='Directory of the Python pokerbot')
+    parser.add_argument('transcript', type=str, help='Transcript recorded by the engine')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the random module')
+    parser.add_argument('--verbose', action='store_true', help="Show the pokerbot's output")
+    args = parser.parse_args()
+    socketfile = replay(args.bot_path, args.transcript, args.seed, not args.verbose)
+    latencies = sorted(socketfile.latencies)
+    print('{} responses, {} mismatched'.format(len(latencies), len(socketfile.mismatches)))
+    for index, expected, actual in socketfile.mismatches[:10]:
+        print('  message {}: expected {}, got {}'.format(index + 1, expected, actual))
+    if latencies:
+        print('latency total {:.4f}s, mean {:.1f}us, p50 {:.1f}us, p90 {:.1f}us, p99 {:.1f}us, max {:.1f}us'.format(
+            sum(latencies), 1e6 * sum(latencies) / len(latencies), 1e6 * percentile(latencies, 0.5),
+            1e6 * percentile(latencies, 0.9), 1e6 * percentile(latencies, 0.99), 1e6 * latencies[-1]))
+
+
+if __name__ == '__main__':
+    main()
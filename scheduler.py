@@ -0,0 +1,157 @@
+'''
+Plays engine matches between the two configured pokerbots until one is clearly better.
+
+After every round, the scheduler updates a sequential probability ratio test on the
+per-round bankroll difference between PLAYER_1 and PLAYER_2. It tests whether PLAYER_1
+wins at least EFFECT chips per round more than PLAYER_2 against the reverse, and stops
+as soon as either hypothesis is accepted at the configured error rates. Matches of
+NUM_ROUNDS rounds are repeated until the test decides or MAX_MATCHES is reached.
+Every round's deltas and the running test statistic are appended to a results file.
+With --luck-adjusted, the test runs on the deltas corrected by match_evaluator, which
+usually decides from several times fewer rounds.
+
+Run with python3 scheduler.py from the directory containing config.py.
+'''
+import argparse
+import math
+import engine
+from match_evaluator import luck_corrections
+
+ALPHA = 0.05  # probability of declaring PLAYER_1 better when PLAYER_2 is
+BETA = 0.05  # probability of declaring PLAYER_2 better when PLAYER_1 is
+EFFECT = 2.  # chips per round which are worth detecting
+MIN_ROUNDS = 50  # rounds before the variance estimate is trusted
+MAX_MATCHES = 10
+RESULTS_FILENAME = 'results.csv'
+
+
+class SequentialTest():
+    '''
+    A Gaussian sequential probability ratio test of mean EFFECT against mean -EFFECT,
+    with the variance estimated from the observations so far.
+    '''
+
+    def __init__(self, alpha=ALPHA, beta=BETA, effect=EFFECT, min_rounds=MIN_ROUNDS):
+        self.effect = effect
+        self.min_rounds = min_rounds
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.count = 0
+        self.total = 0.
+        self.mean = 0.
+        self.squares = 0.  # sum of squared deviations from the mean, updated with Welford's method
+
+    def update(self, difference):
+        '''
+        Adds one round's bankroll difference.
+        '''
+        self.count += 1
+        self.total += difference
+        previous_mean = self.mean
+        self.mean += (difference - previous_mean) / self.count
+        self.squares += (difference - previous_mean) * (difference - self.mean)
+
+    def log_likelihood_ratio(self):
+        '''
+        Returns the log likelihood ratio of PLAYER_1 being better against PLAYER_2 being better.
+        '''
+        if self.count < 2:
+            return 0.
+        variance = max(self.squares / (self.count - 1), 1e-9)
+        return 2 * self.effect * self.total / variance
+
+    def decision(self):
+        '''
+        Returns 1 if PLAYER_1 is better, 2 if PLAYER_2 is better, or None if undecided.
+        '''
+        if self.count < self.min_rounds:
+            return None
+        llr = self.log_likelihood_ratio()
+        if llr >= self.upper:
+            return 1
+        if llr <= self.lower:
+            return 2
+        return None
+
+
+class Scheduler():
+    '''
+    Runs matches and feeds their rounds to a SequentialTest.
+    '''
+
+    def __init__(self, test, results_filename=RESULTS_FILENAME, luck_adjusted=False):
+        self.test = test
+        self.luck_adjusted = luck_adjusted
+        self.results_filename = results_filename
+        self.results_file = None
+        self.match_num = 0
+        self.bankrolls = {}
+
+    def on_round(self, round_num, players, terminal_state):
+        '''
+        Round listener for engine.Game, returning True once the test has decided.
+        '''
+        deltas = {player.name: player.bankroll - self.bankrolls.get(player.name, 0) for player in players}
+        self.bankrolls = {player.name: player.bankroll for player in players}
+        delta_1 = deltas[engine.PLAYER_1_NAME]
+        delta_2 = deltas[engine.PLAYER_2_NAME]
+        if self.luck_adjusted:
+            corrections = luck_corrections(terminal_state)
+            seat_1 = 0 if players[0].name == engine.PLAYER_1_NAME else 1
+            delta_1 += corrections[seat_1]
+            delta_2 += corrections[1-seat_1]
+        self.test.update((delta_1 - delta_2) / 2)
+        self.results_file.write('{},{},{:.2f},{:.2f},{:.4f},{:.4f}\n'.format(self.match_num, round_num, delta_1, delta_2,
+                                                                 self.test.mean, self.test.log_likelihood_ratio()))
+        self.results_file.flush()
+        return self.test.decision() is not None
+
+    def run(self, max_matches=MAX_MATCHES):
+        '''
+        Plays matches until the test decides or max_matches have been played.
+
+        Returns:
+        1 if PLAYER_1 is better, 2 if PLAYER_2 is better, or None if undecided.
+        '''
+        log_filename = engine.GAME_LOG_FILENAME
+        with open(self.results_filename, 'w') as results_file:
+            self.results_file = results_file
+            results_file.write('match,round,delta_1,delta_2,mean_difference,log_likelihood_ratio\n')
+            for match_num in range(1, max_matches + 1):
+                self.match_num = match_num
+                self.bankrolls = {}
+                engine.GAME_LOG_FILENAME = '{}_{}'.format(log_filename, match_num)
+                game = engine.Game()
+                game.round_listeners.append(self.on_round)
+                game.run()
+                if self.test.decision() is not None:
+                    break
+        engine.GAME_LOG_FILENAME = log_filename
+        return self.test.decision()
+
+
+def main():
+    '''
+    Runs the scheduler from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 scheduler.py')
+    parser.add_argument('--alpha', type=float, default=ALPHA, help='Error rate for declaring PLAYER_1 better')
+    parser.add_argument('--beta', type=float, default=BETA, help='Error rate for declaring PLAYER_2 better')
+    parser.add_argument('--effect', type=float, default=EFFECT, help='Chips per round worth detecting')
+    parser.add_argument('--min-rounds', type=int, default=MIN_ROUNDS, help='Rounds before the test may stop')
+    parser.add_argument('--max-matches', type=int, default=MAX_MATCHES, help='Most matches to play')
+    parser.add_argument('--luck-adjusted', action='store_true', help='Test luck-adjusted deltas')
+    parser.add_argument('--results', type=str, default=RESULTS_FILENAME, help='File to stream per-round results to')
+    args = parser.parse_args()
+    test = SequentialTest(args.alpha, args.beta, args.effect, args.min_rounds)
+    scheduler = Scheduler(test, args.results, args.luck_adjusted)
+    winner = scheduler.run(args.max_matches)
+    names = {1: engine.PLAYER_1_NAME, 2: engine.PLAYER_2_NAME}
+    if winner is None:
+        print('No decision after {} rounds, mean difference {:.3f}'.format(test.count, test.mean))
+    else:
+        print('{} is better after {} rounds, mean difference {:.3f}'.format(names[winner], test.count, test.mean))
+
+
+if __name__ == '__main__':
+    main()
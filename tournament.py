@@ -0,0 +1,539 @@
+'''
+Spreads engine matches across machines with a coordinator and a simple TCP work queue.
+
+The coordinator holds a queue of match specs, each naming the two players and their
+pokerbot paths, the seed for the engine's random deals and config.py overrides such as
+NUM_ROUNDS. Workers connect to it, pull one spec at a time, play the match with the local
+engine in a fresh process and a directory of its own, and send back the final bankrolls
+followed by the gzipped gamelog and player logs.
+
+The protocol is one JSON message per line, optionally followed by a binary payload whose
+length the message gives. While a match runs, the worker sends a heartbeat every
+HEARTBEAT_INTERVAL seconds. A worker which disconnects or misses heartbeats for
+HEARTBEAT_TIMEOUT seconds is considered lost, and its match goes back on the queue, up to
+MAX_ATTEMPTS attempts in all. A worker which loses its connection mid-match finishes the
+match and sends the result once it reconnects, so a match can complete twice. The
+coordinator keeps the first result for each match id and acknowledges duplicates without
+recording them.
+
+Completed matches are appended to <out>/results.jsonl as they come in, and a coordinator
+restarted with the same --out skips every match found there, so only unfinished matches
+are played again. With --set CHECKPOINT_ROUNDS=N, a match retried on the worker which lost
+it resumes from the engine's last checkpoint in its directory.
+
+Parallel matches on one machine compete for its cores, so timing is only fair with
+--set GAME_CLOCK_MODE="'cpu'", which charges bots CPU time, or with each match pinned to
+cores of its own. A worker started with --cpus E A B runs its engine on core E and the two
+pokerbots on cores A and B, and the coordinator's --pin gives each local worker three
+consecutive cores.
+
+A coordinator started with --metrics-port P serves live counters of the matches, the
+bankrolls so far and the time since each running match's last heartbeat at
+http://localhost:P/metrics, as described in metrics.py.
+
+On one host, from the directory containing engine.py:
+    python3 tournament.py coordinator --bots A=./python_skeleton B=./week-2-bot --seeds 1 2 3 \\
+        --set NUM_ROUNDS=100 --local-workers 3
+or run the coordinator without --local-workers and start workers on any machine holding
+the engine and the pokerbots at the same relative paths with
+    python3 tournament.py worker --host COORDINATOR_HOST
+'''
+import argparse
+import ast
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from metrics import EngineMetrics, MetricsServer
+
+PORT = 5180
+HEARTBEAT_INTERVAL = 5.  # seconds
+HEARTBEAT_TIMEOUT = 30.  # seconds
+MAX_ATTEMPTS = 3
+WAIT = 1.  # seconds a worker waits when every remaining match is running elsewhere
+RECONNECT_ATTEMPTS = 10
+OUT_DIRECTORY = 'tournament'
+RESULTS_FILENAME = 'results.jsonl'
+
+
+def send_message(stream, message, payload=b''):
+    '''
+    Writes a JSON message line followed by its payload.
+    '''
+    message['payload'] = len(payload)
+    stream.write(json.dumps(message).encode() + b'\n' + payload)
+    stream.flush()
+
+
+def receive_message(stream):
+    '''
+    Reads a JSON message line and its payload.
+
+    Returns:
+    The message and the payload bytes.
+    '''
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('connection closed')
+    message = json.loads(line)
+    payload = stream.read(message.get('payload', 0))
+    if len(payload) != message.get('payload', 0):
+        raise ConnectionError('connection closed mid-payload')
+    return message, payload
+
+
+def play_match(spec, root, directory, cpus=None):
+    '''
+    Plays the match described by spec with the engine, writing its logs to directory.
+
+    This patches the engine's globals and changes the working directory, so it must run in
+    a process of its own.
+
+    Arguments:
+    spec: a dict with the match 'id', the two [name, path] 'players', the 'seed' for the
+    engine's random deals, and a 'config' dict of config.py overrides.
+    root: the directory which the pokerbot paths are relative to.
+    directory: the directory to play the match in.
+    cpus: None, or the cores to pin the engine, the first and the second pokerbot to.
+
+    Returns:
+    A dict with the 'rounds' played and dicts mapping each player's name to their final
+    'bankrolls', remaining 'game_clocks' and 'connect_times' in seconds, and the wall time
+    in seconds of each of their answers to the engine's queries as 'decision_times'.
+    '''
+    sys.path.insert(0, root)
+    import engine
+    for name, value in spec.get('config', {}).items():
+        if not name.isupper() or not hasattr(engine, name):
+            raise ValueError('unknown config override ' + name)
+        setattr(engine, name, value)
+    (engine.PLAYER_1_NAME, path_1), (engine.PLAYER_2_NAME, path_2) = spec['players']
+    engine.PLAYER_1_PATH = os.path.join(root, path_1)
+    engine.PLAYER_2_PATH = os.path.join(root, path_2)
+    if cpus is not None:
+        os.sched_setaffinity(0, {cpus[0]})
+        engine.PLAYER_1_CPUS = {cpus[1 % len(cpus)]}
+        engine.PLAYER_2_CPUS = {cpus[2 % len(cpus)]}
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    random.seed(spec['seed'])  # eval7 shuffles with the random module
+    result = {'rounds': 0, 'bankrolls': {}, 'game_clocks': {}, 'connect_times': {}, 'decision_times': {}}
+
+    def record_result(round_num, players, terminal_state):
+        result['rounds'] = round_num
+        result['bankrolls'].update((player.name, player.bankroll) for player in players)
+        result['game_clocks'].update((player.name, player.game_clock) for player in players)
+        result['connect_times'].update((player.name, player.connect_time) for player in players)
+
+    game = engine.Game()
+    if game.metrics is None:  # the players time their queries into it, served or not
+        game.metrics = EngineMetrics(latency_window=None)
+    game.round_listeners.append(record_result)
+    game.run()
+    with game.metrics.lock:
+        result['decision_times'] = {name: list(times) for name, times in game.metrics.decisions.items()}
+    return result
+
+
+def play_match_process(spec, root, directory, cpus=None):
+    '''
+    Plays a match with play_match in a child process, sending the engine's output to
+    directory/engine.txt and writing the result to directory/result.json.
+
+    Returns:
+    The result, with the match 'id' added.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'engine.txt'), 'w') as engine_output:
+        sys.stdout = engine_output
+        result = play_match(spec, root, directory, cpus)
+    result['id'] = spec['id']
+    with open(os.path.join(directory, 'result.json'), 'w') as result_file:
+        json.dump(result, result_file)
+    return result
+
+
+class Coordinator():
+    '''
+    Hands out match specs to workers and collects their results.
+    '''
+
+    def __init__(self, specs, out=OUT_DIRECTORY, max_attempts=MAX_ATTEMPTS):
+        self.specs = {spec['id']: spec for spec in specs}
+        self.out = out
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.pending = deque(spec['id'] for spec in specs)
+        self.attempts = {match_id: 0 for match_id in self.specs}
+        self.running = {}  # match id -> worker
+        self.results = {}  # match id -> bankrolls
+        self.failures = {}  # match id -> last error
+        self.heartbeats = {}  # match id -> time.time() its worker last reported it running
+        self.completed = 0  # matches completed since the coordinator started
+        self.start_time = time.time()
+        self.finished = threading.Event()
+        os.makedirs(out, exist_ok=True)
+        self.resume(os.path.join(out, RESULTS_FILENAME))
+        self.pending = deque(match_id for match_id in self.pending if match_id not in self.results)
+        self._check_finished()
+        self.results_file = open(os.path.join(out, RESULTS_FILENAME), 'a')
+
+    def resume(self, results_filename):
+        '''
+        Marks the matches recorded in a results file by an earlier run as completed.
+        '''
+        try:
+            with open(results_filename, 'r') as results_file:
+                for line in results_file:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:  # cut off by a crash
+                        continue
+                    if result['id'] in self.specs:
+                        self.results[result['id']] = result['bankrolls']
+        except FileNotFoundError:
+            return
+        if self.results:
+            print('Resuming with {} of {} matches completed'.format(len(self.results), len(self.specs)))
+
+    def assign(self, worker):
+        '''
+        Returns the next match spec for a worker, 'wait' if every remaining match is
+        running, or None if the tournament is over.
+        '''
+        with self.lock:
+            while self.pending:
+                match_id = self.pending.popleft()
+                if match_id in self.results:  # completed by a worker presumed lost
+                    continue
+                self.attempts[match_id] += 1
+                self.running[match_id] = worker
+                self.heartbeats[match_id] = time.time()
+                return self.specs[match_id]
+            return 'wait' if self.running else None
+
+    def lose(self, match_id, error):
+        '''
+        Puts a match which failed or whose worker was lost back on the queue, until it has
+        used up its attempts.
+        '''
+        with self.lock:
+            if match_id not in self.running or match_id in self.results:
+                return
+            del self.running[match_id]
+            if self.attempts[match_id] < self.max_attempts:
+                self.pending.append(match_id)
+            else:
+                self.failures[match_id] = error
+                print('Giving up on {} after {} attempts: {}'.format(match_id, self.attempts[match_id], error))
+            self._check_finished()
+
+    def complete(self, match_id, bankrolls, logs):
+        '''
+        Records a match's result and writes its gzipped logs, ignoring duplicates.
+
+        Returns:
+        True if the result was recorded.
+        '''
+        with self.lock:
+            if match_id in self.results or match_id not in self.specs:
+                return False
+            self.results[match_id] = bankrolls
+            self.completed += 1
+            self.running.pop(match_id, None)
+            self.failures.pop(match_id, None)
+            directory = os.path.join(self.out, match_id)
+            os.makedirs(directory, exist_ok=True)
+            for filename, data in logs:
+                with open(os.path.join(directory, os.path.basename(filename) + '.gz'), 'wb') as log_file:
+                    log_file.write(data)
+            self.results_file.write(json.dumps({'id': match_id, 'bankrolls': bankrolls}) + '\n')
+            self.results_file.flush()
+            print('Completed {}: {}'.format(match_id, ', '.join('{} {}'.format(*item) for item in bankrolls.items())))
+            self._check_finished()
+            return True
+
+    def beat(self, match_id):
+        '''
+        Records a heartbeat of a running match.
+        '''
+        with self.lock:
+            if match_id in self.running:
+                self.heartbeats[match_id] = time.time()
+
+    def collect(self):
+        '''
+        Returns the coordinator's metric families, for exposition by metrics.MetricsServer.
+        '''
+        with self.lock:
+            now = time.time()
+            totals = {}
+            for bankrolls in self.results.values():
+                for name, bankroll in bankrolls.items():
+                    totals[name] = totals.get(name, 0) + bankroll
+            states = {'pending': len(self.pending), 'running': len(self.running),
+                      'completed': len(self.results), 'failed': len(self.failures)}
+            return [
+                ('tournament_matches', 'gauge', 'Matches in each state.',
+                 [({'state': state}, count) for state, count in states.items()]),
+                ('tournament_match_attempts_total', 'counter', 'Matches handed out to workers, counting retries.',
+                 [({}, sum(self.attempts.values()))]),
+                ('tournament_matches_per_second', 'gauge', 'Matches completed per second since the coordinator started.',
+                 [({}, self.completed / max(now - self.start_time, 1e-3))]),
+                ('tournament_bankroll', 'gauge', 'Bankroll of each pokerbot summed over its completed matches.',
+                 [({'player': name}, total) for name, total in sorted(totals.items())]),
+                ('tournament_heartbeat_age_seconds', 'gauge', 'Time since each running match was last reported running.',
+                 [({'match': match_id, 'worker': worker}, now - self.heartbeats.get(match_id, now))
+                  for match_id, worker in sorted(self.running.items())]),
+            ]
+
+    def _check_finished(self):
+        if not self.pending and not self.running:
+            self.finished.set()
+
+    def handle(self, connection, address):
+        '''
+        Serves one worker connection until it closes or misses its heartbeats.
+        '''
+        worker = '{}:{}'.format(*address)
+        match_id = None
+        connection.settimeout(HEARTBEAT_TIMEOUT)
+        try:
+            with connection, connection.makefile('rwb') as stream:
+                while True:
+                    message, payload = receive_message(stream)
+                    if message['type'] == 'hello':
+                        worker = message.get('worker', worker)
+                    elif message['type'] == 'request':
+                        spec = self.assign(worker)
+                        if spec is None:
+                            send_message(stream, {'type': 'done'})
+                            return
+                        if spec == 'wait':
+                            send_message(stream, {'type': 'wait', 'seconds': WAIT})
+                        else:
+                            match_id = spec['id']
+                            send_message(stream, {'type': 'match', 'spec': spec})
+                    elif message['type'] == 'result':
+                        logs = []
+                        offset = 0
+                        for filename, length in message['logs']:
+                            logs.append((filename, payload[offset:offset + length]))
+                            offset += length
+                        self.complete(message['id'], message['bankrolls'], logs)
+                        if message['id'] == match_id:
+                            match_id = None
+                        send_message(stream, {'type': 'ack', 'id': message['id']})
+                    elif message['type'] == 'heartbeat':
+                        self.beat(message['id'])
+                    elif message['type'] == 'failed':
+                        self.lose(message['id'], message['error'])
+                        if message['id'] == match_id:
+                            match_id = None
+        except (OSError, ValueError, ConnectionError) as error:
+            if match_id is not None:
+                print('Lost {} running {}: {}'.format(worker, match_id, error))
+                self.lose(match_id, 'worker lost: {}'.format(error))
+
+    def serve(self, port=PORT):
+        '''
+        Accepts workers until every match has completed or failed.
+
+        Returns:
+        A dict mapping each completed match id to its bankrolls.
+        '''
+        self._check_finished()
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        with server_socket:
+            server_socket.bind(('', port))
+            server_socket.listen()
+            server_socket.settimeout(1.)
+            while not self.finished.is_set():
+                try:
+                    connection, address = server_socket.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self.handle, args=(connection, address), daemon=True).start()
+        self.results_file.close()
+        return self.results
+
+
+def run_worker(host='localhost', port=PORT, workdir='worker', name=None, cpus=None):
+    '''
+    Pulls and plays matches from the coordinator until it reports the tournament is over,
+    pinned to cpus as in play_match if they are given.
+    '''
+    name = name if name is not None else '{}-{}'.format(socket.gethostname(), os.getpid())
+    root = os.getcwd()
+    unsent = None  # a result whose acknowledgement never arrived
+    failures = 0
+    while True:
+        try:
+            connection = socket.create_connection((host, port))
+        except OSError:
+            failures += 1
+            if failures > RECONNECT_ATTEMPTS:
+                print('Could not reach the coordinator at {}:{}'.format(host, port))
+                return
+            time.sleep(min(2 ** failures, 30))
+            continue
+        failures = 0
+        try:
+            with connection, connection.makefile('rwb') as stream:
+                send_message(stream, {'type': 'hello', 'worker': name})
+                if unsent is not None:
+                    send_message(stream, *unsent)
+                    receive_message(stream)
+                    unsent = None
+                while True:
+                    send_message(stream, {'type': 'request'})
+                    message, _ = receive_message(stream)
+                    if message['type'] == 'done':
+                        return
+                    if message['type'] == 'wait':
+                        time.sleep(message['seconds'])
+                        continue
+                    spec = message['spec']
+                    directory = os.path.abspath(os.path.join(workdir, spec['id']))
+                    process = multiprocessing.Process(target=play_match_process, args=(spec, root, directory, cpus))
+                    process.start()
+                    connected = True
+                    while process.is_alive():
+                        process.join(HEARTBEAT_INTERVAL)
+                        if connected and process.is_alive():
+                            try:
+                                send_message(stream, {'type': 'heartbeat', 'id': spec['id']})
+                            except OSError:
+                                connected = False  # finish the match and send the result after reconnecting
+                    unsent = match_result(spec, directory, process.exitcode)
+                    if not connected:
+                        break
+                    send_message(stream, *unsent)
+                    if unsent[0]['type'] == 'result':
+                        receive_message(stream)
+                    unsent = None
+        except (OSError, ValueError, ConnectionError) as error:
+            print('Connection to the coordinator lost: {}'.format(error))
+
+
+def match_result(spec, directory, exitcode):
+    '''
+    Returns the result message and payload of the gzipped logs for a match played in directory.
+    '''
+    try:
+        with open(os.path.join(directory, 'result.json'), 'r') as result_file:
+            result = json.load(result_file)
+    except (OSError, ValueError):
+        return ({'type': 'failed', 'id': spec['id'], 'error': 'match exited with code {}'.format(exitcode)},)
+    logs = []
+    payload = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.txt') or filename.endswith('.csv'):
+            with open(os.path.join(directory, filename), 'rb') as log_file:
+                data = gzip.compress(log_file.read())
+            logs.append([filename, len(data)])
+            payload.append(data)
+    return ({'type': 'result', 'id': spec['id'], 'bankrolls': result['bankrolls'], 'logs': logs}, b''.join(payload))
+
+
+def core_groups(num_workers, group_size=3):
+    '''
+    Splits the cores this process may run on into a group of group_size cores per worker,
+    reusing cores if there are too few.
+    '''
+    cores = sorted(os.sched_getaffinity(0))
+    if num_workers * group_size > len(cores):
+        print('Only {} cores for {} workers, so some cores are shared'.format(len(cores), num_workers))
+    return [[cores[(group_size * i + j) % len(cores)] for j in range(group_size)] for i in range(num_workers)]
+
+
+def round_robin(bots, seeds, config):
+    '''
+    Returns the specs of one match per pair of bots per seed.
+
+    Arguments:
+    bots: a list of (name, path) pairs.
+    seeds: the seeds to play each pair with.
+    config: config.py overrides shared by every match.
+    '''
+    return [{'id': '{}-vs-{}-{}'.format(bot_1[0], bot_2[0], seed), 'players': [list(bot_1), list(bot_2)],
+             'seed': seed, 'config': config}
+            for bot_1, bot_2 in itertools.combinations(bots, 2) for seed in seeds]
+
+
+def parse_override(text):
+    '''
+    Parses a NAME=VALUE config override, reading VALUE as a Python literal where possible.
+    '''
+    name, value = text.split('=', 1)
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def main():
+    '''
+    Runs the coordinator or a worker from the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 tournament.py')
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--host', type=str, default='localhost', help='Coordinator host, for workers')
+    parser.add_argument('--port', type=int, default=PORT, help='Coordinator port')
+    parser.add_argument('--bots', nargs='+', default=[], help='NAME=PATH of each pokerbot, for a round robin')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help='Seeds to play each pair with')
+    parser.add_argument('--set', nargs='+', default=[], help='NAME=VALUE config.py overrides for every match')
+    parser.add_argument('--specs', type=str, default=None, help='JSON file with a list of match specs')
+    parser.add_argument('--out', type=str, default=OUT_DIRECTORY, help='Directory for results and logs')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts per match')
+    parser.add_argument('--local-workers', type=int, default=0, help='Worker processes to start on this host')
+    parser.add_argument('--workdir', type=str, default='worker', help='Directory workers play matches in')
+    parser.add_argument('--cpus', type=int, nargs=3, default=None, help='Cores for the engine and the two pokerbots, for workers')
+    parser.add_argument('--pin', action='store_true', help='Pin each local worker to cores of its own')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Port to serve live coordinator metrics on')
+    args = parser.parse_args()
+    if args.role == 'worker':
+        run_worker(args.host, args.port, args.workdir, cpus=args.cpus)
+        return
+    if args.specs is not None:
+        with open(args.specs, 'r') as specs_file:
+            specs = json.load(specs_file)
+    else:
+        bots = [bot.split('=', 1) for bot in args.bots]
+        specs = round_robin(bots, args.seeds, dict(parse_override(text) for text in args.set))
+    coordinator = Coordinator(specs, args.out, args.max_attempts)
+    metrics_server = MetricsServer(args.metrics_port, coordinator.collect) if args.metrics_port is not None else None
+    num_workers = 0 if coordinator.finished.is_set() else args.local_workers
+    groups = core_groups(num_workers) if args.pin else [None] * num_workers
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '--port', str(args.port),
+                                 '--workdir', os.path.join(args.out, 'worker_{}'.format(i))] +
+                                (['--cpus'] + [str(core) for core in group] if group is not None else []))
+               for i, group in enumerate(groups)]
+    results = coordinator.serve(args.port)
+    if metrics_server is not None:
+        metrics_server.close()
+    for worker in workers:
+        try:
+            worker.wait(HEARTBEAT_TIMEOUT)
+        except subprocess.TimeoutExpired:  # still waiting to connect to the closed coordinator
+            worker.terminate()
+    totals = {}
+    for bankrolls in results.values():
+        for name, bankroll in bankrolls.items():
+            totals[name] = totals.get(name, 0) + bankroll
+    print('{} matches completed, {} failed'.format(len(results), len(coordinator.failures)))
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]):
+        print('{}: {}'.format(name, total))
+
+
+if __name__ == '__main__':
+    main()
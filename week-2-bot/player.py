@@ -6,11 +6,42 @@ from skeleton.states import GameState, TerminalState, RoundState, BoardState
 from skeleton.states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
 from skeleton.bot import Bot
 from skeleton.runner import parse_args, run_bot
+from skeleton.flop_table import FlopTable
+from skeleton.opponent_stats import OpponentStats
+from skeleton.equity import joint_strengths
+from skeleton.equity_cache import open_cache
+from skeleton import snapshot
 
-import eval7
+import json
 from constants import hand_to_strength
 import random 
 
+PARAMETERS_FILENAME = 'params.json' #read from the bot's directory at startup, tuned by param_search.py
+DEFAULT_PARAMETERS = {
+    'PREFLOP_RAISE': 0.4, #raise sizes as fractions of the pot after calling
+    'POSTFLOP_RAISE': 0.75,
+    'INTIMIDATION': 0.15, #strength we discount when facing a big raise
+    'INTIMIDATION_COST': 5, #continue cost from which a raise counts as big
+    'MONTE_CARLO_ITERS': 50, #samples joint_strengths takes per refresh_strengths call
+}
+
+
+def load_parameters(filename=PARAMETERS_FILENAME):
+    '''
+    Returns DEFAULT_PARAMETERS updated with those in the parameter file, if it exists.
+    '''
+    parameters = dict(DEFAULT_PARAMETERS)
+    try:
+        with open(filename, 'r') as parameters_file:
+            overrides = json.load(parameters_file)
+    except FileNotFoundError:
+        return parameters
+    unknown = set(overrides) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError('unknown parameters ' + ', '.join(sorted(unknown)))
+    parameters.update(overrides)
+    return parameters
+
 
 
 class Player(Bot):
@@ -30,6 +61,17 @@ class Player(Bot):
         '''
         self.board_allocations = [[], [], []]
         self.hole_strengths = [0, 0, 0]
+        self.params = load_parameters()
+        snapshot.load() #maps the evaluator's tables if skeleton/snapshot.py built them, instead of building them in round 1
+        try:
+            self.flop_table = FlopTable() #precomputed offline, see skeleton/flop_table.py
+        except (OSError, ValueError):
+            self.flop_table = None
+        try:
+            self.opponent_stats = OpponentStats() #per opponent, persisted across matches, see skeleton/opponent_stats.py
+        except (OSError, ValueError):
+            self.opponent_stats = None
+        self.equity_cache = open_cache() #shared across matches and bots, None without a usable file, see skeleton/equity_cache.py
 
     def allocate(self, cards): 
         card_ranks = [c[0] for c in cards]
@@ -77,59 +119,28 @@ class Player(Bot):
         self.board_allocations.reverse()
         self.hole_strengths.reverse()
 
-    def calculate_strength(self, hole, board_cards, iters): 
+    def refresh_strengths(self, board_cards, iters=None): 
         '''
-        A Monte Carlo method meant to estimate the win probability of a pair of 
-        hole cards. Simlulates 'iters' games and determines the win rates of our cards
-        Arguments:
-        hole: a list of our two hole cards
-        iters: a integer that determines how many Monte Carlo samples to take
+        Re-estimates the strength of our hole cards on all three boards at once, with our
+        other hole cards dead, see joint_strengths in skeleton/equity.py
+        board_cards: a list of each board's cards, or None for boards which are over
         '''
-        deck = eval7.Deck() #eval7 object!
-        hole_cards = [eval7.Card(card) for card in hole] #card objects, used to evaliate hands
-        board_cards = [eval7.Card(card) for card in board_cards if card]
-
-        for card in board_cards: 
-            deck.cards.remove(card)
-        for card in hole_cards: 
-            deck.cards.remove(card)
-        
-        score = 0
-
-        for _ in range(iters): #take 'iters' samples
-            deck.shuffle() #make sure our samples are random
-
-            _COMM = 5 - len(board_cards) #the number of cards we need to draw
-            _OPP = 2
-
-            draw = deck.peek(_COMM + _OPP)
-
-            opp_hole = draw[: _OPP]
-            community = draw[_OPP: ]
-
-            our_hand = hole_cards + community + board_cards #the two showdown hands
-            opp_hand = opp_hole + community + board_cards
-
-            our_hand_value = eval7.evaluate(our_hand) #the ranks of our hands (only useful for comparisons)
-            opp_hand_value = eval7.evaluate(opp_hand)
-
-            if our_hand_value > opp_hand_value: #we win!
-                score += 2
-            
-            elif our_hand_value == opp_hand_value: #we tie.
-                score += 1
-            
-            else: #we lost....
-                score += 0
-        
-        hand_strength = score / (2 * iters) #this is our win probability!
-
-        return hand_strength
-    
-    def refresh_strengths(self, board_cards, iters): 
+        if iters is None:
+            iters = self.params['MONTE_CARLO_ITERS']
+        board_cards = list(board_cards)
+        if self.equity_cache is not None: #boards the cache already knows need no sampling
+            for i in range(3): 
+                if board_cards[i] is not None:
+                    cached = self.equity_cache.get(self.board_allocations[i], board_cards[i], iters)
+                    if cached is not None:
+                        self.hole_strengths[i] = cached
+                        board_cards[i] = None
+        strengths = joint_strengths(self.board_allocations, board_cards, iters)
         for i in range(3): 
-            strength = self.calculate_strength(self.board_allocations[i], board_cards, iters)
-            self.hole_strengths[i] = strength
+            if strengths[i] is not None:
+                self.hole_strengths[i] = strengths[i]
+                if self.equity_cache is not None and not self.equity_cache.readonly:
+                    self.equity_cache.put(self.board_allocations[i], board_cards[i], strengths[i], iters)
             
 
     def handle_round_over(self, game_state, terminal_state, active):
@@ -152,6 +163,8 @@ class Player(Bot):
             previous_board_state = terminal_board_state.previous_state
             my_cards = previous_board_state.hands[active]  # your cards
             opp_cards = previous_board_state.hands[1-active]  # opponent's cards or [] if not revealed
+        if self.opponent_stats is not None:
+            self.opponent_stats.observe_round_over(terminal_state, active, self.action_log)
         self.board_allocations = [[], [], []]
         self.hole_strengths = [0, 0, 0]
 
@@ -168,6 +181,8 @@ class Player(Bot):
         Returns:
         Your actions.
         '''
+        if self.opponent_stats is not None:
+            self.opponent_stats.observe(round_state, active, self.action_log)
         legal_actions = round_state.legal_actions()  # the actions you are allowed to take
         street = round_state.street  # 0, 3, 4, or 5 representing pre-flop, flop, turn, or river respectively
         my_cards = round_state.hands[active]  # your cards across all boards
@@ -182,9 +197,15 @@ class Player(Bot):
         net_cost = 0 # keep track of the net additional amount you are spending across boards this round
         my_actions = [None] * NUM_BOARDS
 
+        if street == 3 and self.flop_table is not None: #exact flop equities are a cheap lookup
+            for i in range(NUM_BOARDS):
+                if isinstance(round_state.board_states[i], BoardState):
+                    self.hole_strengths[i] = self.flop_table.lookup(self.board_allocations[i], board_cards[i][:3]).equity
+
+        if street > 3 or (street == 3 and self.flop_table is None): #re-estimate the boards still being played
+            self.refresh_strengths([board_cards[i] if isinstance(round_state.board_states[i], BoardState) else None for i in range(NUM_BOARDS)])
         my_actions = [None] * NUM_BOARDS
         for i in range(NUM_BOARDS):
-            #self.refresh_strengths(board_cards[i], 50)
             if AssignAction in legal_actions[i]:
                 cards = self.board_allocations[i] #assign our cards that we made earlier
                 my_actions[i] = AssignAction(cards) #add to our actions
@@ -201,9 +222,9 @@ class Player(Bot):
 
 
                 if street < 3: #pre-flop
-                    raise_ammount = int(my_pips[i] + board_cont_cost + 0.4 * (pot_total + board_cont_cost)) #play a little conservatively pre-flop
+                    raise_ammount = int(my_pips[i] + board_cont_cost + self.params['PREFLOP_RAISE'] * (pot_total + board_cont_cost)) #play a little conservatively pre-flop
                 else:
-                    raise_ammount = int(my_pips[i] + board_cont_cost + 0.75 * (pot_total + board_cont_cost)) #raise the stakes deeper into the game
+                    raise_ammount = int(my_pips[i] + board_cont_cost + self.params['POSTFLOP_RAISE'] * (pot_total + board_cont_cost)) #raise the stakes deeper into the game
                 
                 raise_ammount = max([min_raise, raise_ammount]) #make sure we have a valid raise
                 raise_ammount = min([max_raise, raise_ammount])
@@ -229,9 +250,8 @@ class Player(Bot):
 
                 if board_cont_cost > 0: #our opp raised!!! we must respond
 
-                    if board_cont_cost > 5: #<--- parameters to tweak. 
-                        _INTIMIDATION = 0.15
-                        strength = max([0, strength - _INTIMIDATION]) #if our opp raises a lot, be cautious!
+                    if board_cont_cost > self.params['INTIMIDATION_COST']: #<--- parameters to tweak in params.json
+                        strength = max([0, strength - self.params['INTIMIDATION']]) #if our opp raises a lot, be cautious!
                     
 
                     pot_odds = board_cont_cost / (pot_total + board_cont_cost)
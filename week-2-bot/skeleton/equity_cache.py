@@ -0,0 +1,291 @@
+'''
+A persistent, memory-mapped equity cache shared across matches and pokerbot processes.
+
+The cache file is a fixed-size, set-associative hash table keyed by the canonical
+(hole, board) pair. Readers never take locks: every slot carries a sequence counter
+which writers make odd while they update the slot, so readers retry torn reads.
+Writers serialize on an exclusive flock of the cache file. When a bucket is full,
+the least frequently hit entry is evicted and the remaining hit counts are halved,
+so that textures which stop coming up eventually make room for new ones.
+
+Warm the cache offline with
+    python3 -m skeleton.equity_cache [--path PATH] [--iters N] [gamelog.txt ...]
+which stores every preflop holding plus each (hole, board) pair seen in the gamelogs, and
+open it in a pokerbot's __init__ with open_cache().
+'''
+import argparse
+import fcntl
+import mmap
+import os
+import re
+import struct
+from .equity import canonical_key, canonicalize, int_to_card, monte_carlo_strength, RANKS, SUITS
+
+EQUITY_CACHE_PATH = 'equity_cache.bin'
+NUM_BUCKETS = 1 << 14
+WAYS = 4
+
+MAGIC = b'EQC1'
+HEADER = struct.Struct('<4sIII')  # magic, format version, number of buckets, ways per bucket
+HEADER_SIZE = 64
+SLOT = struct.Struct('<IIQdII')  # sequence, samples, key, equity, hits, padding
+SLOT_SIZE = SLOT.size
+SEQUENCE = struct.Struct('<I')
+HITS_OFFSET = 24
+MAX_COUNT = 0xFFFFFFFF
+READ_RETRIES = 16
+
+
+class EquityCache():
+    '''
+    A memory-mapped table from canonical (hole, board) pairs to equities.
+    '''
+
+    def __init__(self, path=EQUITY_CACHE_PATH, num_buckets=NUM_BUCKETS, readonly=False):
+        '''
+        Opens the cache file at path, creating it if it does not exist yet.
+
+        Arguments:
+        path: the location of the cache file.
+        num_buckets: the number of buckets used if the file is created, must be a power of two.
+        readonly: if True, the file is never written to and hit counts are not updated.
+        '''
+        assert num_buckets & (num_buckets - 1) == 0
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            self.fd = os.open(path, os.O_RDONLY)
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            with self.lock():
+                if os.fstat(self.fd).st_size == 0:
+                    os.ftruncate(self.fd, HEADER_SIZE + num_buckets * WAYS * SLOT_SIZE)
+                    os.pwrite(self.fd, HEADER.pack(MAGIC, 1, num_buckets, WAYS), 0)
+        self.mm = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        magic, _, self.num_buckets, self.ways = HEADER.unpack_from(self.mm, 0) if len(self.mm) >= HEADER_SIZE else (None, 0, 0, 0)
+        if magic != MAGIC or len(self.mm) != HEADER_SIZE + self.num_buckets * self.ways * SLOT_SIZE:
+            self.close()
+            raise ValueError('{} is not an equity cache file'.format(path))
+
+    def close(self):
+        '''
+        Unmaps and closes the cache file.
+        '''
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def lock(self):
+        '''
+        Returns a context manager holding the exclusive writer lock on the cache file.
+        '''
+        return _FileLock(self.fd)
+
+    def _offsets(self, key):
+        '''
+        Returns the byte offsets of the slots in the bucket for key.
+        '''
+        bucket = ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32
+        start = HEADER_SIZE + (bucket & (self.num_buckets - 1)) * self.ways * SLOT_SIZE
+        return range(start, start + self.ways * SLOT_SIZE, SLOT_SIZE)
+
+    def _read(self, offset):
+        '''
+        Reads a consistent snapshot of one slot, or returns None if a writer keeps it busy.
+        '''
+        for _ in range(READ_RETRIES):
+            slot = SLOT.unpack_from(self.mm, offset)
+            if slot[0] % 2 == 0 and SEQUENCE.unpack_from(self.mm, offset)[0] == slot[0]:
+                return slot
+        return None
+
+    def _write(self, offset, sequence, samples, key, equity, hits):
+        '''
+        Overwrites one slot, bracketing the update with odd and even sequence numbers.
+        '''
+        SEQUENCE.pack_into(self.mm, offset, (sequence + 1) & MAX_COUNT)
+        SLOT.pack_into(self.mm, offset, (sequence + 1) & MAX_COUNT, samples, key, equity, hits, 0)
+        SEQUENCE.pack_into(self.mm, offset, (sequence + 2) & MAX_COUNT)
+
+    def get(self, hole, board, min_samples=1):
+        '''
+        Looks up the equity of hole cards on a board.
+
+        Arguments:
+        hole: a list of two card strings.
+        board: a list of board card strings, empty strings are ignored.
+        min_samples: the number of Monte Carlo samples the cached estimate must be based on.
+
+        Returns:
+        The cached equity, or None on a miss.
+        '''
+        key = canonical_key(hole, board)
+        for offset in self._offsets(key):
+            slot = self._read(offset)
+            if slot is not None and slot[2] == key:
+                if slot[1] < min_samples:
+                    return None
+                if not self.readonly and slot[4] < MAX_COUNT:
+                    # hit counts only guide eviction, so an occasional lost update is harmless
+                    struct.pack_into('<I', self.mm, offset + HITS_OFFSET, slot[4] + 1)
+                return slot[3]
+        return None
+
+    def put(self, hole, board, equity, samples):
+        '''
+        Stores an equity estimate, merging it with any estimate already cached for the same key.
+
+        Arguments:
+        hole: a list of two card strings.
+        board: a list of board card strings, empty strings are ignored.
+        equity: the estimated equity.
+        samples: the number of Monte Carlo samples the estimate is based on.
+        '''
+        assert not self.readonly
+        key = canonical_key(hole, board)
+        with self.lock():
+            slots = [(offset, SLOT.unpack_from(self.mm, offset)) for offset in self._offsets(key)]
+            for offset, slot in slots:
+                if slot[2] == key:
+                    total = min(slot[1] + samples, MAX_COUNT)
+                    merged = (slot[3] * slot[1] + equity * samples) / (slot[1] + samples)
+                    self._write(offset, slot[0], total, key, merged, slot[4])
+                    return
+            empty = [(offset, slot) for offset, slot in slots if slot[2] == 0]
+            if empty:
+                offset, slot = empty[0]
+            else:
+                offset, slot = min(slots, key=lambda item: (item[1][4], item[1][1]))
+                for other_offset, other in slots:
+                    if other_offset != offset:
+                        self._write(other_offset, other[0], other[1], other[2], other[3], other[4] // 2)
+            self._write(offset, slot[0], min(samples, MAX_COUNT), key, equity, 0)
+
+    def strength(self, hole, board, iters):
+        '''
+        Returns the equity of hole cards on a board, running Monte Carlo only on a cache miss.
+        '''
+        equity = self.get(hole, board, iters)
+        if equity is None:
+            equity = monte_carlo_strength(hole, board, iters)
+            if not self.readonly:
+                self.put(hole, board, equity, iters)
+        return equity
+
+    def __len__(self):
+        return sum(1 for offset in range(HEADER_SIZE, len(self.mm), SLOT_SIZE)
+                   if SLOT.unpack_from(self.mm, offset)[2] != 0)
+
+
+def open_cache(path=EQUITY_CACHE_PATH):
+    '''
+    Opens the cache for a pokerbot, read-only if the file can not be written.
+
+    Returns:
+    The EquityCache, or None if there is no usable cache file at path and none can be created.
+    '''
+    try:
+        return EquityCache(path)
+    except OSError:
+        pass
+    except ValueError:
+        return None
+    try:
+        return EquityCache(path, readonly=True)
+    except (OSError, ValueError):
+        return None
+
+
+class _FileLock():
+    '''
+    Holds an exclusive flock on a file descriptor for the duration of a with block.
+    '''
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+ASSIGN_PATTERN = re.compile(r'^(\S+) assigns \[(\S+) (\S+)\] to board (\d+)$')
+STREET_PATTERN = re.compile(r'^(?:Flop|Turn|River) \[([^\]]*)\].* on board (\d+)$')
+
+
+def gamelog_situations(filename):
+    '''
+    Yields every (hole, board) pair that reached a street in an engine gamelog.
+    '''
+    holes = {}
+    with open(filename, 'r') as log_file:
+        for line in log_file:
+            line = line.strip()
+            if line.startswith('Round #'):
+                holes = {}
+                continue
+            match = ASSIGN_PATTERN.match(line)
+            if match:
+                holes.setdefault(match.group(4), []).append([match.group(2), match.group(3)])
+                continue
+            match = STREET_PATTERN.match(line)
+            if match:
+                board = match.group(1).split(' ')
+                for hole in holes.get(match.group(2), []):
+                    yield hole, board
+
+
+def preflop_situations():
+    '''
+    Yields one representative of each of the 169 suit-canonical preflop holdings.
+    '''
+    deck = [rank + suit for rank in RANKS for suit in SUITS]
+    seen = set()
+    for i in range(len(deck)):
+        for j in range(i + 1, len(deck)):
+            canonical_hole, _ = canonicalize([deck[i], deck[j]], [])
+            if canonical_hole not in seen:
+                seen.add(canonical_hole)
+                yield [int_to_card(card) for card in canonical_hole], []
+
+
+def warm(cache, situations, iters):
+    '''
+    Computes and stores equities for situations which are not cached with at least iters samples.
+
+    Returns:
+    The number of equities computed.
+    '''
+    computed = 0
+    for hole, board in situations:
+        if cache.get(hole, board, iters) is None:
+            cache.put(hole, board, monte_carlo_strength(hole, board, iters), iters)
+            computed += 1
+    return computed
+
+
+def main():
+    '''
+    Warms the equity cache from the preflop holdings and any gamelogs given on the command line.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 -m skeleton.equity_cache')
+    parser.add_argument('--path', type=str, default=EQUITY_CACHE_PATH, help='Cache file to warm')
+    parser.add_argument('--iters', type=int, default=2000, help='Monte Carlo samples per equity')
+    parser.add_argument('gamelogs', nargs='*', help='Engine gamelogs whose situations should be cached')
+    args = parser.parse_args()
+    cache = EquityCache(args.path)
+    computed = warm(cache, preflop_situations(), args.iters)
+    for filename in args.gamelogs:
+        computed += warm(cache, gamelog_situations(filename), args.iters)
+    print('Computed {} equities, {} cached in {}'.format(computed, len(cache), args.path))
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+'''
+Precomputed flop features for every suit-canonical flop crossed with every hole holding.
+
+For each of the 1,755 canonical flops and each of the 1,176 holdings that can be held
+with it, the table stores
+    hand_strength: the share of opponent holdings beaten on the flop (ties count half),
+    equity: the expected river hand strength, i.e. the equity against a random hand,
+    ehs2: the expected squared river hand strength, which rewards drawing potential,
+    histogram: the distribution of the river hand strength over NUM_BINS equal bins.
+Hand strengths are exact over opponent holdings. River hand strengths are averaged over
+sampled turn and river runouts which are shared by all holdings on a flop.
+
+Build the table offline with
+    python3 -m skeleton.flop_table [--out PATH] [--runouts N] [--workers N]
+'''
+import argparse
+import bisect
+import itertools
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+from collections import namedtuple
+from .equity import card_to_int, int_to_card, SUIT_PERMUTATIONS
+
+FLOP_TABLE_PATH = 'flop_table.bin'
+NUM_BINS = 8
+NUM_FLOPS = 1755
+HOLES_PER_FLOP = 1176  # 49 choose 2
+
+MAGIC = b'FLP1'
+HEADER = struct.Struct('<4sIIIII')  # magic, format version, flops, holes per flop, bins, runouts
+HEADER_SIZE = 32
+RECORD = struct.Struct('<HHH{}B'.format(NUM_BINS))
+QUANTUM = 65535
+
+FlopFeatures = namedtuple('FlopFeatures', ['hand_strength', 'equity', 'ehs2', 'histogram'])
+
+
+def canonical_flops():
+    '''
+    Returns the sorted list of suit-canonical flops as tuples of integer card codes.
+    '''
+    flops = set()
+    for flop in itertools.combinations(range(52), 3):
+        flops.add(min(tuple(sorted(c - c % 4 + perm[c % 4] for c in flop)) for perm in SUIT_PERMUTATIONS))
+    return sorted(flops)
+
+
+def hole_index(flop, hole):
+    '''
+    Returns the position of a holding among the 1,176 holdings which can be held with a flop.
+
+    Arguments:
+    flop: a sorted tuple of three integer card codes.
+    hole: two integer card codes which are not on the flop.
+    '''
+    low, high = sorted(hole)
+    low -= sum(1 for card in flop if card < low)
+    high -= sum(1 for card in flop if card < high)
+    return low * (97 - low) // 2 + high - low - 1  # rank of the pair among 49 choose 2
+
+
+def _strengths(hands, values):
+    '''
+    Computes the hand strength of every hand against all hands disjoint from it.
+
+    Arguments:
+    hands: a list of pairs of integer card codes.
+    values: the evaluated strength of each hand on the same board.
+
+    Returns:
+    A list of hand strengths, counting ties as half a win.
+    '''
+    ordered = sorted(values)
+    by_card = {}
+    for hand, value in zip(hands, values):
+        for card in hand:
+            by_card.setdefault(card, []).append(value)
+    for card_values in by_card.values():
+        card_values.sort()
+    total = len(hands)
+    strengths = []
+    for (a, b), value in zip(hands, values):
+        card_a, card_b = by_card[a], by_card[b]
+        below = (bisect.bisect_left(ordered, value) - bisect.bisect_left(card_a, value)
+                 - bisect.bisect_left(card_b, value))
+        ties = (bisect.bisect_right(ordered, value) - bisect.bisect_left(ordered, value)
+                - bisect.bisect_right(card_a, value) + bisect.bisect_left(card_a, value)
+                - bisect.bisect_right(card_b, value) + bisect.bisect_left(card_b, value) + 1)
+        opponents = total - len(card_a) - len(card_b) + 1
+        strengths.append((below + ties / 2) / opponents)
+    return strengths
+
+
+def compute_flop(args):
+    '''
+    Computes the table records for every holding on one flop.
+
+    Arguments:
+    args: a tuple (flop, runouts, seed) of the flop as integer card codes, the number of
+    turn and river runouts to sample, and the seed for the runout sampler.
+
+    Returns:
+    The packed records of the flop's holdings in hole_index order.
+    '''
+    import eval7
+    flop, runouts, seed = args
+    cards = [eval7.Card(int_to_card(code)) for code in range(52)]
+    board = [cards[code] for code in flop]
+    remaining = [code for code in range(52) if code not in flop]
+    holes = list(itertools.combinations(remaining, 2))
+    flop_strengths = _strengths(holes, [eval7.evaluate([cards[a], cards[b]] + board) for a, b in holes])
+    sums = [0.] * len(holes)
+    squares = [0.] * len(holes)
+    counts = [0] * len(holes)
+    histograms = [[0] * NUM_BINS for _ in holes]
+    rng = random.Random(seed)
+    for _ in range(runouts):
+        turn, river = rng.sample(remaining, 2)
+        runout = board + [cards[turn], cards[river]]
+        indices = [k for k, hole in enumerate(holes) if turn not in hole and river not in hole]
+        hands = [holes[k] for k in indices]
+        river_strengths = _strengths(hands, [eval7.evaluate([cards[a], cards[b]] + runout) for a, b in hands])
+        for k, strength in zip(indices, river_strengths):
+            sums[k] += strength
+            squares[k] += strength * strength
+            counts[k] += 1
+            histograms[k][min(int(strength * NUM_BINS), NUM_BINS - 1)] += 1
+    records = bytearray()
+    for k in range(len(holes)):
+        count = max(counts[k], 1)
+        records += RECORD.pack(round(flop_strengths[k] * QUANTUM), round(sums[k] / count * QUANTUM),
+                               round(squares[k] / count * QUANTUM),
+                               *[round(bucket * 255 / count) for bucket in histograms[k]])
+    return bytes(records)
+
+
+def build(path, runouts, workers, seed=0):
+    '''
+    Computes the whole table with a pool of worker processes and writes it to path.
+    '''
+    flops = canonical_flops()
+    assert len(flops) == NUM_FLOPS
+    jobs = [(flop, runouts, seed * NUM_FLOPS + i) for i, flop in enumerate(flops)]
+    with open(path + '.tmp', 'wb') as table_file:
+        header = HEADER.pack(MAGIC, 1, NUM_FLOPS, HOLES_PER_FLOP, NUM_BINS, runouts)
+        table_file.write(header + bytes(HEADER_SIZE - len(header)))
+        table_file.write(bytes(card for flop in flops for card in flop))
+        with multiprocessing.Pool(workers) as pool:
+            for i, records in enumerate(pool.imap(compute_flop, jobs, chunksize=4)):
+                table_file.write(records)
+                if (i + 1) % 100 == 0:
+                    print('Computed {} of {} flops'.format(i + 1, NUM_FLOPS))
+    os.replace(path + '.tmp', path)
+
+
+class FlopTable():
+    '''
+    Read-only, memory-mapped access to a precomputed flop table.
+    '''
+
+    def __init__(self, path=FLOP_TABLE_PATH):
+        with open(path, 'rb') as table_file:
+            self.mm = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, num_flops, holes_per_flop, num_bins, self.runouts = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or holes_per_flop != HOLES_PER_FLOP or num_bins != NUM_BINS:
+            self.mm.close()
+            raise ValueError('{} is not a flop table file'.format(path))
+        flop_bytes = self.mm[HEADER_SIZE:HEADER_SIZE + 3 * num_flops]
+        self.flop_indices = {tuple(flop_bytes[3*i:3*i + 3]): i for i in range(num_flops)}
+        self.records_offset = HEADER_SIZE + 3 * num_flops
+
+    def close(self):
+        '''
+        Unmaps the table file.
+        '''
+        self.mm.close()
+
+    def lookup(self, hole, flop):
+        '''
+        Looks up the features of a holding on a flop.
+
+        Arguments:
+        hole: a list of two card strings.
+        flop: a list of the three flop card strings.
+
+        Returns:
+        A FlopFeatures tuple.
+        '''
+        hole = [card_to_int(card) for card in hole]
+        flop = [card_to_int(card) for card in flop]
+        best = None
+        for perm in SUIT_PERMUTATIONS:
+            candidate = tuple(sorted(c - c % 4 + perm[c % 4] for c in flop))
+            if best is None or candidate < best[0]:
+                best = (candidate, perm)
+        canonical, perm = best
+        index = self.flop_indices[canonical] * HOLES_PER_FLOP + hole_index(canonical, [c - c % 4 + perm[c % 4] for c in hole])
+        record = RECORD.unpack_from(self.mm, self.records_offset + index * RECORD.size)
+        return FlopFeatures(record[0] / QUANTUM, record[1] / QUANTUM, record[2] / QUANTUM,
+                            [bucket / 255 for bucket in record[3:]])
+
+
+def main():
+    '''
+    Builds the flop table.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 -m skeleton.flop_table')
+    parser.add_argument('--out', type=str, default=FLOP_TABLE_PATH, help='Table file to write')
+    parser.add_argument('--runouts', type=int, default=64, help='Turn and river runouts sampled per flop')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the runout samplers')
+    args = parser.parse_args()
+    build(args.out, args.runouts, args.workers, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+'''
+Incremental opponent statistics kept per opponent in a fixed-size, memory-mapped counter file.
+
+The store reads the opponent's actions off the previous_state links of the states the
+Runner hands to the pokerbot, or, when the runner passes states without history
+(--compact), replays the round from the pokerbot's action_log. Every call to observe only
+walks back to the last state it saw, so each opponent action is classified once and
+updates its counters in O(1). The
+counters live in a file of 32 bit integers which is mapped into memory, so they persist
+between matches and reads such as fold_to_raise are a couple of lookups.
+
+The file holds a slot of counters per opponent name. The engine gives a pokerbot its
+opponent's name in the POKERBOTS_OPPONENT environment variable; pokerbots started without
+it share one unnamed slot. Pokerbots playing from the same directory at once, such as the
+candidate's matches in the gauntlet, update the counters under an exclusive flock of the
+file, so no increment is lost, while reads take no lock.
+'''
+import mmap
+import os
+import struct
+from .states import BoardState, RoundState, TerminalState
+from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND, NUM_BOARDS
+from .equity_cache import _FileLock
+
+OPPONENT_STATS_PATH = 'opponent_stats.bin'
+OPPONENT_ENV = 'POKERBOTS_OPPONENT'
+NUM_OPPONENTS = 64
+
+STREETS = {0: 0, 3: 1, 4: 2, 5: 3}
+FOLD, CHECK, CALL, RAISE = range(4)
+BET_SIZES = [0.5, 1.0]  # upper edges of the bet size buckets, as fractions of the pot
+HAND_TYPES = ['High Card', 'Pair', 'Two Pair', 'Trips', 'Straight', 'Flush', 'Full House', 'Quads', 'Straight Flush']
+
+# counter layout: actions by street, then raises faced and folds to them by street,
+# then showdowns by the opponent's biggest bet size bucket (no bet first) and hand type
+ACTIONS_OFFSET = 0
+FACING_OFFSET = ACTIONS_OFFSET + 4 * 4
+SHOWDOWN_OFFSET = FACING_OFFSET + 4 * 2
+NUM_COUNTERS = SHOWDOWN_OFFSET + (len(BET_SIZES) + 2) * len(HAND_TYPES)
+MAGIC = b'OPS2'
+HEADER = struct.Struct('<4sII')  # magic, counters per opponent, number of opponent slots
+HEADER_SIZE = 16
+NAME_SIZE = 32  # bytes of the opponent name heading each slot, empty in a free slot
+SLOT_SIZE = NAME_SIZE + 4 * NUM_COUNTERS
+
+
+class OpponentStats():
+    '''
+    Counts one opponent's actions and showdowns across matches.
+    '''
+
+    def __init__(self, opponent=None, path=OPPONENT_STATS_PATH):
+        '''
+        Opens the counter file at path, creating it if it does not exist yet, and the slot
+        of the opponent in it, raising ValueError if the file has no slot left for them.
+
+        Arguments:
+        opponent: the opponent's name, by default the one the engine gives in OPPONENT_ENV.
+        path: the location of the counter file.
+        '''
+        if opponent is None:
+            opponent = os.environ.get(OPPONENT_ENV, '')
+        name = opponent.encode()[:NAME_SIZE].ljust(NAME_SIZE, b'\0')
+        self.opponent = opponent
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.mm = None
+        self.counters = None
+        try:
+            with self.lock():
+                if os.fstat(self.fd).st_size == 0:
+                    os.ftruncate(self.fd, HEADER_SIZE + NUM_OPPONENTS * SLOT_SIZE)
+                    os.pwrite(self.fd, HEADER.pack(MAGIC, NUM_COUNTERS, NUM_OPPONENTS), 0)
+                self.mm = mmap.mmap(self.fd, 0)
+                magic, num_counters, num_slots = HEADER.unpack_from(self.mm, 0)
+                if magic != MAGIC or num_counters != NUM_COUNTERS or len(self.mm) != HEADER_SIZE + num_slots * SLOT_SIZE:
+                    raise ValueError('{} is not an opponent statistics file'.format(path))
+                # the last slot is the unnamed one, and named opponents take the others in turn
+                offsets = range(HEADER_SIZE, len(self.mm), SLOT_SIZE)
+                if not opponent:
+                    offset = offsets[-1]
+                else:
+                    offset = next((offset for offset in offsets[:-1] if self.mm[offset:offset + NAME_SIZE] == name), None)
+                    if offset is None:
+                        offset = next((offset for offset in offsets[:-1] if self.mm[offset] == 0), None)
+                        if offset is None:
+                            raise ValueError('{} has no slot left for {}'.format(path, opponent))
+                        self.mm[offset:offset + NAME_SIZE] = name
+        except ValueError:
+            self.close()
+            raise
+        self.counters = memoryview(self.mm)[offset + NAME_SIZE:offset + SLOT_SIZE].cast('I')
+        self.last_state = None
+        self.biggest_bets = [None] * 3  # the opponent's biggest bet on each board this round, relative to the pot
+        self.replayed = (0, 0)  # the action log round and entries replayed into replay_state
+        self.replay_state = None
+
+    def close(self):
+        '''
+        Flushes the counters to disk, unmaps and closes the file.
+        '''
+        if self.counters is not None:
+            self.counters.release()
+            self.counters = None
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm.close()
+            self.mm = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def lock(self):
+        '''
+        Returns a context manager holding the exclusive writer lock on the counter file.
+        '''
+        return _FileLock(self.fd)
+
+    def observe(self, state, active, action_log=None):
+        '''
+        Counts every opponent action since the last observed state.
+
+        Arguments:
+        state: the latest RoundState or TerminalState handed to the pokerbot.
+        active: your player's index.
+        action_log: the pokerbot's action_log, which must be given when the runner passes
+        states without history.
+        '''
+        if action_log is not None:
+            state = self._replay(action_log)
+        latest = state
+        transitions = []
+        while state is not None and state is not self.last_state:
+            previous = state.previous_state
+            if isinstance(previous, RoundState) and isinstance(state, RoundState) and \
+                    state.button == previous.button + 1 and state.street == previous.street:
+                transitions.append((previous, state))
+            if previous is None:  # a new round started since the last observation
+                self.biggest_bets = [None] * 3
+            state = previous
+        self.last_state = latest
+        transitions = [(previous, current) for previous, current in reversed(transitions) if previous.button % 2 != active]
+        if transitions:
+            with self.lock():
+                for previous, current in transitions:
+                    self._count(previous, current)
+
+    def _replay(self, action_log):
+        '''
+        Advances a replay of the round by the entries of action_log not replayed yet, and
+        returns its latest state, whose previous_state chain holds the whole round.
+        '''
+        round_num, replayed = self.replayed
+        if round_num != action_log.rounds:  # the log was cleared for a new round
+            round_num, replayed = action_log.rounds, 0
+            pips = [SMALL_BLIND, BIG_BLIND]
+            board_states = [BoardState((i+1)*BIG_BLIND, pips, [[]]*2, [''] * 5, None) for i in range(NUM_BOARDS)]
+            stacks = [STARTING_STACK - NUM_BOARDS*SMALL_BLIND, STARTING_STACK - NUM_BOARDS*BIG_BLIND]
+            self.replay_state = RoundState(-2, 0, stacks, [['']*(2*NUM_BOARDS)]*2, board_states, None)
+        state = self.replay_state
+        for index in range(replayed, len(action_log)):
+            state = state.proceed(action_log[index][2])
+        self.replayed = (round_num, len(action_log))
+        self.replay_state = state
+        return state
+
+    def _count(self, previous, current):
+        '''
+        Classifies the opponent's action on each board between two consecutive states, with
+        the lock held.
+        '''
+        opp = previous.button % 2
+        street = STREETS[previous.street]
+        counters = self.counters
+        for i, (before, after) in enumerate(zip(previous.board_states, current.board_states)):
+            if not isinstance(before, BoardState) or before.settled or before.hands is None or len(before.hands[opp]) == 0:
+                continue  # no decision on this board
+            faced_raise = before.pips[1-opp] > before.pips[opp] and not (previous.street == 0 and previous.button == 0)
+            if isinstance(after, TerminalState):
+                action = FOLD
+            elif after.pips[opp] == before.pips[opp]:
+                action = CHECK
+            elif after.pips[opp] == before.pips[1-opp]:
+                action = CALL
+            else:
+                action = RAISE
+                pot = before.pot + sum(before.pips)
+                fraction = (after.pips[opp] - before.pips[1-opp]) / max(pot, 1)
+                self.biggest_bets[i] = max(fraction, self.biggest_bets[i] or 0.)
+            counters[ACTIONS_OFFSET + 4 * street + action] += 1
+            if faced_raise:
+                counters[FACING_OFFSET + 2 * street] += 1
+                counters[FACING_OFFSET + 2 * street + 1] += action == FOLD
+
+    def observe_round_over(self, terminal_state, active, action_log=None):
+        '''
+        Counts the opponent's last actions, then their revealed hands against their biggest bet on each board.
+        '''
+        import eval7
+        self.observe(terminal_state, active, action_log)
+        for i, terminal_board_state in enumerate(terminal_state.previous_state.board_states):
+            board_state = terminal_board_state.previous_state
+            opp_cards = board_state.hands[1-active] if board_state is not None else []
+            board_cards = [card for card in board_state.deck if card] if board_state is not None else []
+            if len(opp_cards) != 2 or '' in opp_cards or len(board_cards) != 5:
+                continue
+            hand_type = eval7.handtype(eval7.evaluate([eval7.Card(card) for card in opp_cards + board_cards]))
+            biggest = self.biggest_bets[i]
+            size = 0 if biggest is None else 1 + sum(1 for edge in BET_SIZES if biggest > edge)
+            with self.lock():
+                self.counters[SHOWDOWN_OFFSET + len(HAND_TYPES) * size + HAND_TYPES.index(hand_type)] += 1
+
+    def actions(self, street):
+        '''
+        Returns the opponent's (folds, checks, calls, raises) on a street.
+        '''
+        offset = ACTIONS_OFFSET + 4 * STREETS[street]
+        return tuple(self.counters[offset:offset + 4])
+
+    def preflop_raise_frequency(self):
+        '''
+        Returns the share of preflop decisions in which the opponent raised.
+        '''
+        folds, checks, calls, raises = self.actions(0)
+        return raises / max(folds + checks + calls + raises, 1)
+
+    def aggression(self, street):
+        '''
+        Returns the opponent's aggression factor, raises per call, on a street.
+        '''
+        _, _, calls, raises = self.actions(street)
+        return raises / max(calls, 1)
+
+    def fold_to_raise(self, street):
+        '''
+        Returns the share of bets and raises on a street which the opponent folded to.
+        '''
+        offset = FACING_OFFSET + 2 * STREETS[street]
+        return self.counters[offset + 1] / max(self.counters[offset], 1)
+
+    def showdowns(self, size):
+        '''
+        Returns the counts of each hand type the opponent showed down after their biggest bet
+        on the board fell into a size bucket: 0 for no bet, then one bucket per BET_SIZES edge.
+        '''
+        offset = SHOWDOWN_OFFSET + len(HAND_TYPES) * size
+        return dict(zip(HAND_TYPES, self.counters[offset:offset + len(HAND_TYPES)]))
@@ -1,6 +1,7 @@
 '''
 Encapsulates game and round state information for the player.
 '''
+from array import array
 from collections import namedtuple
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction, AssignAction
 
@@ -12,6 +13,8 @@ STARTING_STACK = 200
 BIG_BLIND = 2
 SMALL_BLIND = 1
 NUM_BOARDS = 3
+ACTION_TYPES = (FoldAction, CallAction, CheckAction, RaiseAction, AssignAction)
+ACTION_LOG_CAPACITY = 64  # entries preallocated per round, which few rounds outgrow
 
 class BoardState(namedtuple('_BoardState', ['pot', 'pips', 'hands', 'deck', 'previous_state', 'settled', 'reveal'], defaults=[False, True])):
     '''
@@ -151,3 +154,76 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'stacks', 'hands
         settled = [(isinstance(board_state, TerminalState) or board_state.settled) for board_state in new_board_states]
         state = RoundState(self.button + 1, self.street, new_stacks, self.hands, new_board_states, self)
         return state.proceed_street() if all(settled) else state
+
+
+def detach(state):
+    '''
+    Returns a state without its history: previous_state is cut everywhere except under a
+    TerminalState, which keeps the state it ended, itself detached.
+    '''
+    if isinstance(state, TerminalState):
+        return TerminalState(state.deltas, detach(state.previous_state))
+    if isinstance(state, RoundState):
+        return state._replace(board_states=[detach(board_state) for board_state in state.board_states], previous_state=None)
+    return state._replace(previous_state=None)
+
+
+class ActionLog():
+    '''
+    A flat log of the actions taken in the current round, which the runner keeps in compact
+    mode in place of the previous_state chains.
+
+    Each entry is the street, the button, and an ACTION_TYPES index and amount per board,
+    stored as consecutive ints of one array allocated once and reused every round. Raises
+    keep their amount; assignments are logged without their cards.
+    '''
+    ENTRY_SIZE = 2 + 2 * NUM_BOARDS
+
+    def __init__(self, capacity=ACTION_LOG_CAPACITY):
+        self.entries = array('i', [0]) * (capacity * self.ENTRY_SIZE)
+        self.length = 0
+        self.rounds = 0  # rounds logged so far, which tells readers when the log was cleared
+
+    def clear(self):
+        '''
+        Empties the log for a new round, keeping its storage.
+        '''
+        self.length = 0
+        self.rounds += 1
+
+    def append(self, street, button, actions):
+        '''
+        Logs the actions taken on every board at a street and button.
+        '''
+        start = self.length * self.ENTRY_SIZE
+        if start == len(self.entries):
+            self.entries.extend(array('i', [0]) * len(self.entries))
+        entries = self.entries
+        entries[start] = street
+        entries[start + 1] = button
+        for i, action in enumerate(actions):
+            entries[start + 2 + 2*i] = ACTION_TYPES.index(type(action))
+            entries[start + 3 + 2*i] = action.amount if isinstance(action, RaiseAction) else 0
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        '''
+        Returns the street, the button and the list of actions of an entry.
+        '''
+        if not -self.length <= index < self.length:
+            raise IndexError('action log index out of range')
+        start = (index % self.length) * self.ENTRY_SIZE
+        entries = self.entries
+        actions = []
+        for i in range(NUM_BOARDS):
+            action_type = ACTION_TYPES[entries[start + 2 + 2*i]]
+            if action_type is RaiseAction:
+                actions.append(RaiseAction(entries[start + 3 + 2*i]))
+            elif action_type is AssignAction:
+                actions.append(AssignAction(['', '']))
+            else:
+                actions.append(action_type())
+        return entries[start], entries[start + 1], actions